@@ -6,7 +6,8 @@ import threading
 import webbrowser
 import os
 from polair.utils import get_logger
-from polair import api, db, repository as repo, services, plotting, map as mapmod
+from polair.series import MeasurementSeries
+from polair import api, archive, db, parsing, repository as repo, services, plotting, map as mapmod
 
 logger = get_logger(__name__)
 
@@ -288,18 +289,13 @@ class PolAirApp(tk.Tk):
             for r in rows:
                 dt_str = r.get("Data")
                 val = r.get("Wartość")
-                if val is None:
-                    val = ""
 
-                self.measure_tree.insert("", "end", values=(dt_str, val))
+                self.measure_tree.insert("", "end", values=(dt_str, "" if val is None else val))
 
-                # cache
-                try:
-                    dt_py = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S") if dt_str else None
-                except Exception:
-                    dt_py = None
+                # cache – brak wartości jako None (w bazie NULL, nie pusty tekst)
+                dt_py = parsing.parse_dt(dt_str)
 
-                cache.append(SimpleNamespace(sensor_id=int(sid), dt=dt_py, value=val))
+                cache.append(SimpleNamespace(sensor_id=int(sid), dt=dt_py, value=None if val == "" else val))
                 inserted += 1
 
             self._measure_cache = cache
@@ -312,7 +308,6 @@ class PolAirApp(tk.Tk):
         @self.threaded
         def worker():
             from datetime import datetime, timedelta
-            import requests
 
             try:
                 self.set_status("Pobieranie pomiarów (REST)...")
@@ -326,19 +321,16 @@ class PolAirApp(tk.Tk):
                     messagebox.showinfo("Brak danych", "Brak wartości - należy skorzystać z archiwum")
                     self.set_status("Pobieranie danych archiwalnych...")
 
-                    # początkowo 5 tygodni wstecz
+                    # najpierw ostatnie 5 tygodni, a gdy puste – tygodnie 5-10 (bez ponownego pobierania 0-5)
                     date_to = datetime.now()
-                    date_from = date_to - timedelta(weeks=5)
-                    for weeks_back in (5, 10):
-                        date_from = date_to - timedelta(weeks=weeks_back)
-                        url = (
-                            f"https://api.gios.gov.pl/pjp-api/v1/rest/archivalData/getDataBySensor/"
-                            f"{sid}?page=0&size=30&dateFrom={date_from.strftime('%Y-%m-%d')}%2000%3A00"
-                            f"&dateTo={date_to.strftime('%Y-%m-%d')}%2000%3A00"
-                        )
-                        archival = requests.get(url).json()
-                        rows = archival.get("Lista archiwalnych wyników pomiarów", [])
-                        if rows:
+                    rows = []
+                    for weeks_from, weeks_to in ((5, 0), (10, 5)):
+                        ms = list(archive.iter_archival(int(sid), date_to - timedelta(weeks=weeks_from),
+                                                        date_to - timedelta(weeks=weeks_to)))
+                        if ms:
+                            # najnowsze na górze, jak w danych bieżących
+                            rows = [{"Data": m.dt.strftime("%Y-%m-%d %H:%M:%S"), "Wartość": m.value}
+                                    for m in reversed(ms)]
                             break  # znaleziono dane, kończymy pętlę
 
                     if not rows:
@@ -361,24 +353,11 @@ class PolAirApp(tk.Tk):
 
                 inserted = _update_measurements_table(rows, sid)
 
-                # Indeks powietrza
-                idx_data = api.get_air_index(int(sid))
-                aq = idx_data.get("AqIndex")
-                if isinstance(aq, list) and len(aq) > 0:
-                    aq = aq[0]
-                from polair.models import AirIndex
+                # Indeks powietrza (getIndex przyjmuje ID stacji); zapisujemy w bazie – z niej mapa bierze kolory
                 indexes = []
-
-                for key, val in aq.items():
-                    if key.startswith("Wartość indeksu dla wskaźnika"):
-                        param = key.split("dla wskaźnika ")[-1]
-                        value = val
-                        cat_key = f"Nazwa kategorii indeksu dla wskażnika {param}"
-                        category = aq.get(cat_key)
-                        date_key = f"Data wykonania obliczeń indeksu dla wskaźnika {param}"
-                        calc_date = aq.get(date_key)
-                        calc_dt = datetime.fromisoformat(calc_date) if calc_date else None
-                        indexes.append(AirIndex(station_id=station_id, param=param, value=value, category=category, calc_date=calc_dt))
+                if station_id is not None:
+                    indexes = services.parse_air_index(api.get_air_index(int(station_id)), station_id)
+                    repo.upsert_air_index(self.conn, indexes)
 
                 self._index_cache = indexes
                 self.aqindex_tree.delete(*self.aqindex_tree.get_children())
@@ -397,10 +376,7 @@ class PolAirApp(tk.Tk):
                 cache = []
                 for r in rows:
                     dt_str = r.get("Data")
-                    try:
-                        dt_py = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S") if dt_str else None
-                    except Exception:
-                        dt_py = None
+                    dt_py = parsing.parse_dt(dt_str)
                     cache.append(SimpleNamespace(
                         sensor_id=int(sid),
                         dt=dt_py,
@@ -443,10 +419,7 @@ class PolAirApp(tk.Tk):
                 cache = []
                 for r in rows:
                     dt_str = r.get("Data")
-                    try:
-                        dt_py = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S") if dt_str else None
-                    except Exception:
-                        dt_py = None
+                    dt_py = parsing.parse_dt(dt_str)
                     cache.append(SimpleNamespace(
                         sensor_id=int(sid),
                         dt=dt_py,
@@ -468,68 +441,23 @@ class PolAirApp(tk.Tk):
         repo.upsert_measurements(self.conn, self._measure_cache)
         self.set_status("Zapisano pomiary do bazy.")
 
-    def _get_measurements_from_cache(self):
-
+    def _get_measurements_from_cache(self) -> MeasurementSeries:
+        """Pomiary z pamięci podręcznej (słowniki z API lub obiekty) jako szereg posortowany po czasie."""
         raw = getattr(self, "_measure_cache", None)
-        if not raw:
-            return []
-
-        out = []
-        for item in raw:
-
-            if isinstance(item, dict):
-                dt_raw = item.get("dt") or item.get("Data") or item.get("date") or item.get("Date")
-                val_raw = (item.get("value") if "value" in item else
-                           item.get("Wartość") if "Wartość" in item else
-                           item.get("val") if "val" in item else None)
-                sid = item.get("sensor_id") or item.get("sensorId") or item.get("id")
-            else:
-                dt_raw = getattr(item, "dt", None)
-                val_raw = getattr(item, "value", None) if getattr(item, "value", None) is not None else getattr(item,"val",None)
-                sid = getattr(item, "sensor_id", None) or getattr(item, "sensorId", None) or getattr(item, "id", None)
-
-            # konwersja daty
-            dt_parsed = None
-            if isinstance(dt_raw, datetime):
-                dt_parsed = dt_raw
-            elif isinstance(dt_raw, str):
-                # próbujemy kilka formatów
-                for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M"):
-                    try:
-                        dt_parsed = datetime.fromisoformat(dt_raw)
-                        break
-                    except Exception:
-                        try:
-                            dt_parsed = datetime.strptime(dt_raw, fmt)
-                            break
-                        except Exception:
-                            dt_parsed = None
-
-            # wartość jako float
-            val = None
-            if val_raw is not None:
-                try:
-                    val = float(val_raw)
-                except Exception:
-                    val = None
-
-            out.append({"dt": dt_parsed, "value": val, "sensor_id": sid})
-
-        # sortujemy rosnąco wg daty i zwracamy tylko te z datą
-        out = [r for r in out if r["dt"] is not None]
-        out.sort(key=lambda x: x["dt"])
-        return out
+        if not raw or not isinstance(raw, list):
+            return MeasurementSeries.empty()
+        return MeasurementSeries.from_records(raw)
 
     def plot_measurements(self):
 
         ms = self._get_measurements_from_cache()
-        if not ms:
+        if not len(ms):
             messagebox.showinfo("Info", "Najpierw pobierz pomiary.")
             return
 
-        xs = [r["dt"] for r in ms if r["value"] is not None]
-        ys = [r["value"] for r in ms if r["value"] is not None]
-        if not xs:
+        vals = ms.dropna()
+        xs, ys = vals.times, vals.values
+        if not len(vals):
             messagebox.showinfo("Info", "Brak wartości liczbowych do wyświetlenia na wykresie.")
             return
 
@@ -564,35 +492,20 @@ class PolAirApp(tk.Tk):
     def analyze_measurements(self):
 
         ms = self._get_measurements_from_cache()
-        if not ms:
+        if not len(ms):
             messagebox.showinfo("Info", "Najpierw pobierz pomiary.")
             return
 
-        vals = [(r["dt"], r["value"]) for r in ms if r["value"] is not None]
-        if not vals:
+        vals = ms.dropna()
+        if not len(vals):
             messagebox.showinfo("Info", "Brak wartości liczbowych do analizy.")
             return
 
-        dates = [d for d, v in vals]
-        values = [v for d, v in vals]
-
-        # min/max
-        min_v = min(values)
-        max_v = max(values)
-        # find times
-        min_at = next(d for d, v in vals if v == min_v)
-        max_at = next(d for d, v in vals if v == max_v)
-        avg = sum(values) / len(values)
-
-        # trend: regresja liniowa (slope) na timestamp -> wartości
-        xs = [d.timestamp() for d in dates]
-        ys = values
-        n = len(xs)
-        mean_x = sum(xs) / n
-        mean_y = sum(ys) / n
-        num = sum((xs[i] - mean_x) * (ys[i] - mean_y) for i in range(n))
-        den = sum((xs[i] - mean_x) ** 2 for i in range(n))
-        slope = (num / den) if den != 0 else 0.0
+        # min/max, średnia i trend (regresja liniowa wartości względem czasu) – wektorowo
+        st = vals.stats(slope_unit="second")
+        min_v, max_v = st["min"], st["max"]
+        min_at, max_at = st["min_at"], st["max_at"]
+        avg, slope = st["avg"], st["trend_slope"]
 
         # formatowanie wyników
         msg = (
@@ -626,7 +539,7 @@ class PolAirApp(tk.Tk):
             messagebox.showinfo("Mapa", "Brak stacji do pokazania na mapie")
             return
 
-        outfile = mapmod.render_map(items)
+        outfile = mapmod.render_map(items, mode="geojson", categories=repo.station_categories(self.conn))
         webbrowser.open(f"file://{os.path.abspath(outfile)}")
 
     def on_sensor_selected(self, event):
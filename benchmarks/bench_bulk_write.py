@@ -0,0 +1,65 @@
+"""
+Pomiar przepustowości zapisu pomiarów do SQLite (wiersze/s).
+
+    python benchmarks/bench_bulk_write.py [--rows 10000000] [--sensors 1000]
+                                          [--batch 10000] [--synchronous OFF]
+
+Pomiary generowane są strumieniowo (generator), więc zużycie pamięci nie
+zależy od liczby wierszy. Baza tworzona jest w katalogu tymczasowym.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from polair import db, repository  # noqa: E402
+from polair.models import Measurement, Sensor, Station  # noqa: E402
+
+
+def generate(rows: int, sensors: int, start: datetime):
+    # kolejne godziny dla kolejnych czujników – tak jak przy backfillu archiwum
+    per_sensor = -(-rows // sensors)
+    n = 0
+    for sid in range(1, sensors + 1):
+        for h in range(per_sensor):
+            if n >= rows:
+                return
+            yield Measurement(sensor_id=sid, dt=start + timedelta(hours=h), value=float((sid * 7 + h) % 150))
+            n += 1
+
+
+def run(rows: int, sensors: int, batch: int, synchronous: str) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = db.get_conn(path)
+        db.init_db(conn)
+        repository.upsert_stations(conn, [Station(1, "B", "bench", 52.0, 21.0, None, None, None, None, None, None)])
+        repository.upsert_sensors(conn, (Sensor(i, 1, "PM10", "PM10", "PM10", 3) for i in range(1, sensors + 1)))
+        t0 = time.perf_counter()
+        with db.bulk_load(conn, synchronous=synchronous):
+            written = repository.upsert_measurements(conn, generate(rows, sensors, datetime(2015, 1, 1)), batch)
+        elapsed = time.perf_counter() - t0
+        size = os.path.getsize(path)
+        conn.close()
+    print(f"{written:,} wierszy w {elapsed:.1f} s -> {written / elapsed:,.0f} wierszy/s "
+          f"(batch={batch}, synchronous={synchronous}, plik {size / 2**20:.0f} MB)")
+    return written / elapsed
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--rows", type=int, default=10_000_000)
+    p.add_argument("--sensors", type=int, default=1000)
+    p.add_argument("--batch", type=int, default=db.BATCH_SIZE)
+    p.add_argument("--synchronous", default="OFF", choices=["OFF", "NORMAL", "FULL"])
+    a = p.parse_args()
+    run(a.rows, a.sensors, a.batch, a.synchronous)
+
+
+if __name__ == "__main__":
+    main()
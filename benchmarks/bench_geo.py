@@ -0,0 +1,97 @@
+"""
+Wyszukiwanie stacji w pobliżu: pełny przegląd z geodesic vs geo.StationIndex.
+
+    python benchmarks/bench_geo.py [--stations 300] [--queries 100] [--radius 30] [--k 5] [--points 5000]
+
+Losowe stacje i punkty zapytań w obrysie Polski; wyniki obu metod są porównywane.
+Na koniec odległości wsadowe: --points punktów do wszystkich stacji (geo.distance_matrix/nearest_k)
+wobec pętli z geodesic (mierzonej na próbce i przeliczonej na wszystkie punkty).
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from geopy.distance import geodesic  # noqa: E402
+from polair import geo  # noqa: E402
+from polair.models import Station  # noqa: E402
+
+
+def stations(n: int, rnd: random.Random) -> list[Station]:
+    return [Station(i, f"ST{i}", f"Stacja {i}", rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1),
+                    None, None, None, None, None, None) for i in range(n)]
+
+
+def linear_knn(sts: list[Station], center, k: int) -> list[Station]:
+    return [s for _, s in sorted(((geodesic((s.lat, s.lon), center).km, s) for s in sts), key=lambda t: t[0])[:k]]
+
+
+def linear_within(sts: list[Station], center, radius_km: float) -> list[Station]:
+    """Dotychczasowe geo.nearest_within: geodesic do każdej stacji i sortowanie całej listy."""
+    out = []
+    for s in sts:
+        d = geodesic((s.lat, s.lon), center).km
+        if d <= radius_km:
+            out.append((d, s))
+    out.sort(key=lambda t: t[0])
+    return [s for _, s in out]
+
+
+def timed(label: str, fn, queries: list) -> tuple[float, list]:
+    t0 = time.perf_counter()
+    res = [fn(q) for q in queries]
+    dt = time.perf_counter() - t0
+    print(f"{label:<34} {dt:7.3f} s  {len(queries) / dt:>10,.0f} zapytań/s")
+    return dt, res
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--stations", type=int, default=300)
+    p.add_argument("--queries", type=int, default=100)
+    p.add_argument("--radius", type=float, default=30.0)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--points", type=int, default=5000)
+    a = p.parse_args()
+    rnd = random.Random(0)
+    sts = stations(a.stations, rnd)
+    queries = [(rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1)) for _ in range(a.queries)]
+
+    t0 = time.perf_counter()
+    index = geo.StationIndex(sts)
+    print(f"budowa indeksu ({len(index)} stacji)        {time.perf_counter() - t0:7.3f} s")
+
+    base, expected = timed(f"nearest_within (lista, {a.radius:g} km)", lambda q: linear_within(sts, q, a.radius), queries)
+    fast, got = timed(f"StationIndex.within ({a.radius:g} km)", lambda q: [s for _, s in index.within(q, a.radius)], queries)
+    assert [{s.id for s in r} for r in expected] == [{s.id for s in r} for r in got], "różne wyniki (promień)"
+    print(f"przyspieszenie (promień): {base / fast:.1f}x")
+
+    base, expected = timed(f"pełny przegląd, k={a.k}", lambda q: linear_knn(sts, q, a.k), queries)
+    fast, got = timed(f"StationIndex.nearest, k={a.k}", lambda q: [s for _, s in index.nearest(q, a.k)], queries)
+    assert [{s.id for s in r} for r in expected] == [{s.id for s in r} for r in got], "różne wyniki (kNN)"
+    print(f"przyspieszenie (kNN): {base / fast:.1f}x")
+
+    pts = [(rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1)) for _ in range(a.points)]
+    sample = pts[:max(1, min(a.points, 20))]
+    t0 = time.perf_counter()
+    for q in sample:
+        [geodesic(q, (s.lat, s.lon)).km for s in sts]
+    base = (time.perf_counter() - t0) * a.points / len(sample)
+    print(f"{f'pętla geodesic {a.points}x{len(sts)} (szac.)':<34} {base:7.3f} s")
+    for method in ("equirectangular", "haversine"):
+        t0 = time.perf_counter()
+        index.distances(pts, method=method)
+        dt = time.perf_counter() - t0
+        print(f"{f'distance_matrix ({method})':<34} {dt:7.3f} s  przyspieszenie {base / dt:,.0f}x")
+    for method in ("haversine", "geodesic"):
+        t0 = time.perf_counter()
+        index.nearest_many(pts, a.k, method=method)
+        print(f"{f'nearest_many k={a.k} ({method})':<34} {time.perf_counter() - t0:7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
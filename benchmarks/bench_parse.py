@@ -0,0 +1,64 @@
+"""
+Parsowanie odpowiedzi GIOŚ: strptime na wiersz vs polair.parsing.
+
+    python benchmarks/bench_parse.py [--rows 1000000]
+
+Syntetyczna odpowiedź getData z kolejnymi godzinami (co 20. wiersz bez wartości).
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from polair import parsing  # noqa: E402
+from polair.models import Measurement  # noqa: E402
+
+
+def payload(rows: int) -> dict:
+    start = datetime(2015, 1, 1)
+    return {"Lista danych pomiarowych": [
+        {"Kod stanowiska": "MzWarAlNiepo-PM10", "Data": (start + timedelta(hours=h)).strftime("%Y-%m-%d %H:%M:%S"),
+         "Wartość": None if h % 20 == 0 else round((h * 7) % 150 + 0.25, 2)}
+        for h in range(rows)]}
+
+
+def strptime_baseline(data: dict, sensor_id: int) -> list:
+    out = []
+    for r in data["Lista danych pomiarowych"]:
+        val = r.get("Wartość")
+        if val is None or val == "":
+            continue
+        try:
+            dt = datetime.strptime(r.get("Data"), "%Y-%m-%d %H:%M:%S")
+            val = float(val)
+        except Exception:
+            continue
+        out.append(Measurement(sensor_id=sensor_id, dt=dt, value=val))
+    return out
+
+
+def timed(label: str, fn, rows: int) -> float:
+    t0 = time.perf_counter()
+    res = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<28} {dt:6.2f} s  {rows / dt:>12,.0f} wierszy/s  ({len(res[0]) if isinstance(res, tuple) else len(res):,} pomiarów)")
+    return dt
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--rows", type=int, default=1_000_000)
+    a = p.parse_args()
+    data = payload(a.rows)
+    base = timed("strptime -> Measurement", lambda: strptime_baseline(data, 1), a.rows)
+    fast = timed("parsing.parse -> Measurement", lambda: parsing.parse(data, 1), a.rows)
+    arr = timed("parsing.parse_arrays", lambda: parsing.parse_arrays(data), a.rows)
+    print(f"przyspieszenie: {base / fast:.1f}x (obiekty), {base / arr:.1f}x (tablice)")
+
+
+if __name__ == "__main__":
+    main()
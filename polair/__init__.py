@@ -1,4 +1,4 @@
 """
 PolAir — pakiet monitoringu jakości powietrza (GIOŚ).
 """
-__all__ = ["api", "db", "models", "repository", "services", "plotting", "geo", "map", "utils"]
+__all__ = ["api", "db", "models", "repository", "services", "plotting", "geo", "map", "utils", "bulk", "aio", "ratelimit", "cache", "archive", "sync", "cli", "scheduler", "analytics", "series", "parsing", "jsonstream", "pipeline", "interpolate"]
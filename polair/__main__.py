@@ -0,0 +1,4 @@
+import sys
+from polair.cli import main
+
+sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Asynchroniczny klient REST GIOŚ (asyncio + aiohttp).
+
+Wszystkie zapytania idą przez jedną sesję i jeden semafor, więc tysiące
+zapytań mogą czekać na jednej pętli zdarzeń bez wątku na każde z nich.
+Zwraca te same surowe odpowiedzi co polair.api – parsowanie robi polair.services.
+"""
+from __future__ import annotations
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterable, List
+from polair import api, services
+from polair.api import ApiError, gios_retry, _throttled
+from polair.ratelimit import RateLimiter, get_limiter, parse_retry_after
+from polair.models import Measurement
+from polair.utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+CONCURRENCY = env_int("POLAIR_ASYNC_CONCURRENCY", 64)
+
+
+class AsyncGiosClient:
+    def __init__(self, base: str = api.BASE, timeout: float = api.TIMEOUT,
+                 concurrency: int = CONCURRENCY, limit_per_host: int = api.POOL_MAXSIZE,
+                 limiter: RateLimiter | None = None):
+        self.base = base.rstrip("/")
+        self.limiter = limiter
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self._session = None
+        self._sem: asyncio.Semaphore | None = None
+
+    async def __aenter__(self) -> "AsyncGiosClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def _ensure_session(self):
+        if self._session is None:
+            try:
+                import aiohttp
+            except ImportError as e:
+                raise RuntimeError("Klient asynchroniczny wymaga pakietu aiohttp: pip install aiohttp") from e
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.limit_per_host)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Accept": "application/json"},
+            )
+            self._sem = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, url: str, params: dict | None = None, check: bool = True):
+        """Zwraca (status, json). Błędy transportu zamieniane są na ApiError (podlegają ponowieniom)."""
+        import aiohttp
+        session = self._ensure_session()
+        logger.info("GET %s %s", url, params or "")
+        limiter = self.limiter or get_limiter()
+        async with self._sem, limiter.aslot():
+            try:
+                async with session.get(url, params=params or {}) as resp:
+                    if _throttled(resp.status):
+                        ra = parse_retry_after(resp.headers.get("Retry-After"))
+                        limiter.on_throttle(ra)
+                        text = await resp.text()
+                        raise ApiError(f"HTTP {resp.status}: {text[:200]}", status=resp.status, retry_after=ra)
+                    if check and resp.status >= 400:
+                        text = await resp.text()
+                        raise ApiError(f"HTTP {resp.status}: {text[:200]}", status=resp.status)
+                    data = await resp.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                limiter.on_error()
+                raise ApiError(f"{type(e).__name__}: {e}") from e
+        limiter.on_success()
+        return resp.status, data
+
+    @gios_retry
+    async def get_stations_page(self, page: int = 0, size: int = 200) -> dict:
+        _, data = await self._request(f"{self.base}/station/findAll", {"page": page, "size": size})
+        return data
+
+    async def iter_all_stations(self) -> AsyncIterator[dict]:
+        page = 0
+        while True:
+            items, more = api._stations_page(await self.get_stations_page(page=page, size=200))
+            for it in items:
+                yield it
+            if not more:
+                break
+            page += 1
+
+    @gios_retry
+    async def get_sensors(self, station_id: int) -> List[Dict[str, Any]]:
+        page = 0
+        out = []
+        while True:
+            _, data = await self._request(f"{self.base}/station/sensors/{station_id}", {"page": page, "size": 200})
+            chunk, more = api._sensors_page(data, page)
+            out.extend(chunk)
+            if not more:
+                break
+            page += 1
+        return out
+
+    @gios_retry
+    async def get_measurements(self, sensor_id: int):
+        # jak w wersji synchronicznej: przy błędzie zwracamy treść ("error_result")
+        _, data = await self._request(f"{self.base}/data/getData/{sensor_id}", check=False)
+        return data
+
+    @gios_retry
+    async def get_air_index(self, station_id: int) -> dict:
+        """Indeks jakości powietrza stacji (aqindex/getIndex przyjmuje ID stacji)."""
+        _, data = await self._request(f"{self.base}/aqindex/getIndex/{station_id}")
+        return data
+
+    @gios_retry
+    async def get_archival_measurements(self, sensor_id: int, date_from, date_to, page: int = 0, size: int = 30):
+        """
+        Pobiera jedną stronę danych archiwalnych z API GIOS.
+        date_from, date_to w formacie 'YYYY-MM-DD' albo datetime
+        """
+        _, data = await self._request(f"{self.base}/archivalData/getDataBySensor/{sensor_id}",
+                                      api._archival_params(date_from, date_to, page, size))
+        return data
+
+    async def iter_measurements(self, sensor_ids: Iterable[int]) -> AsyncIterator[Measurement]:
+        """
+        Pobiera bieżące pomiary wielu czujników naraz (limit: semafor klienta)
+        i zwraca sparsowane Measurement w kolejności ukończenia zapytań.
+        """
+        async def one(sid):
+            return sid, await self.get_measurements(sid)
+
+        tasks = [asyncio.ensure_future(one(int(s))) for s in sensor_ids]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                try:
+                    sid, data = await fut
+                except Exception as e:
+                    logger.warning("get_measurements: %s", e)
+                    continue
+                for m in services.parse_data_rows(data, sid):
+                    yield m
+        finally:
+            for t in tasks:
+                t.cancel()
@@ -0,0 +1,137 @@
+"""
+Wektorowe statystyki pomiarów (NumPy/pandas).
+
+Dane w postaci kolumnowej: znaczniki czasu jako int64 (sekundy epoki, db.to_epoch),
+wartości jako float64 z NaN w miejscu braków. Funkcje działają na tablicach
+jednego czujnika (describe, rolling_mean, percentiles, exceedances) albo na
+wielu czujnikach naraz (describe_many).
+"""
+from __future__ import annotations
+import sqlite3
+from typing import Dict, Iterable, Optional, Sequence
+import numpy as np
+import pandas as pd
+from polair import db, repository
+
+# jednostka czasu nachylenia trendu: "reading" – na kolejny pomiar (jak services.simple_stats),
+# "second" – na sekundę (jak analiza w GUI), "hour" – na godzinę (jak repository.range_stats)
+SLOPE_UNITS = {"reading": None, "second": 1, "hour": 3600}
+
+
+def to_arrays(ms: Iterable) -> tuple[np.ndarray, np.ndarray]:
+    """Measurement-y (dt jako datetime lub tekst ISO) -> (ts int64, values float64 z NaN)."""
+    ts, vs = [], []
+    for m in ms:
+        if m.dt is None:
+            continue
+        ts.append(db.to_epoch(m.dt))
+        vs.append(np.nan if m.value is None else m.value)
+    return np.asarray(ts, dtype=np.int64), np.asarray(vs, dtype=np.float64)
+
+
+def slope(values: np.ndarray, ts: Optional[np.ndarray] = None, unit: str = "reading") -> float:
+    """Nachylenie prostej najmniejszych kwadratów; braki (NaN) pomijane."""
+    values = np.asarray(values, dtype=np.float64)
+    ok = ~np.isnan(values)
+    y = values[ok]
+    if unit == "reading" or ts is None:
+        x = np.arange(y.size, dtype=np.float64)
+    else:
+        x = np.asarray(ts, dtype=np.float64)[ok] / SLOPE_UNITS[unit]
+    if y.size < 2:
+        return 0.0
+    x = x - x.mean()
+    den = np.dot(x, x)
+    return float(np.dot(x, y - y.mean()) / den) if den != 0 else 0.0
+
+
+def describe(values: np.ndarray, ts: Optional[np.ndarray] = None, slope_unit: str = "reading") -> dict:
+    """
+    count, min/max (z pozycją argmin/argmax i – gdy podano ts – czasem min_at/max_at),
+    avg, std i trend_slope. Przy remisie wskazywany jest pierwszy pomiar.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = int(np.count_nonzero(~np.isnan(values)))
+    if not n:
+        return {"count": 0, "min": None, "min_at": None, "argmin": None, "max": None, "max_at": None,
+                "argmax": None, "avg": None, "std": None, "trend_slope": None}
+    imin, imax = int(np.nanargmin(values)), int(np.nanargmax(values))
+    out = {
+        "count": n,
+        "min": float(values[imin]), "argmin": imin,
+        "max": float(values[imax]), "argmax": imax,
+        "avg": float(np.nanmean(values)), "std": float(np.nanstd(values)),
+        "trend_slope": slope(values, ts, slope_unit),
+        "min_at": None, "max_at": None,
+    }
+    if ts is not None:
+        out["min_at"], out["max_at"] = db.from_epoch(int(ts[imin])), db.from_epoch(int(ts[imax]))
+    return out
+
+
+def rolling_mean(ts: np.ndarray, values: np.ndarray, window_hours: int = 24, min_periods: int = 1) -> np.ndarray:
+    """Średnia krocząca z okna czasowego (np. 24 h), braki pomijane; wynik wyrównany do `ts`."""
+    s = pd.Series(np.asarray(values, dtype=np.float64), index=pd.to_datetime(np.asarray(ts, dtype=np.int64), unit="s"))
+    return s.rolling(f"{window_hours}h", min_periods=min_periods).mean().to_numpy()
+
+
+def percentiles(values: np.ndarray, qs: Sequence[float] = (0.5, 0.9, 0.98)) -> Dict[float, Optional[float]]:
+    values = np.asarray(values, dtype=np.float64)
+    if np.isnan(values).all():
+        return {q: None for q in qs}
+    return dict(zip(qs, np.nanpercentile(values, [q * 100 for q in qs]).tolist()))
+
+
+def exceedances(values: np.ndarray, threshold: float) -> int:
+    """Liczba pomiarów powyżej progu (np. normy)."""
+    return int(np.count_nonzero(np.asarray(values, dtype=np.float64) > threshold))
+
+
+def describe_many(sensor_ids: np.ndarray, ts: np.ndarray, values: np.ndarray,
+                  qs: Sequence[float] = (0.5, 0.9, 0.98), threshold: float | Dict[int, float] | None = None,
+                  slope_unit: str = "reading") -> pd.DataFrame:
+    """
+    Statystyki wielu czujników naraz (dane w formacie długim, posortowane po czasie
+    w obrębie czujnika – np. z repository.iter_range). Wiersz na czujnik: count, min, min_at,
+    max, max_at, avg, std, trend_slope, p50/p90/..., exceedances (gdy podano próg).
+    """
+    df = pd.DataFrame({"sensor_id": np.asarray(sensor_ids, dtype=np.int64),
+                       "ts": np.asarray(ts, dtype=np.int64),
+                       "value": np.asarray(values, dtype=np.float64)}).dropna(subset=["value"])
+    if df.empty:
+        return pd.DataFrame(columns=["count", "min", "min_at", "max", "max_at", "avg", "std", "trend_slope"])
+    g = df.groupby("sensor_id", sort=True)
+    if slope_unit == "reading":
+        df["x"] = g.cumcount().astype(np.float64)
+    else:
+        df["x"] = df["ts"] / SLOPE_UNITS[slope_unit]
+    # nachylenie z sum po odjęciu średnich grup (stabilniej numerycznie)
+    df["xc"] = df["x"] - g["x"].transform("mean")
+    df["yc"] = df["value"] - g["value"].transform("mean")
+    df["xy"], df["xx"] = df["xc"] * df["yc"], df["xc"] * df["xc"]
+    sums = g[["xy", "xx"]].sum()
+
+    out = g["value"].agg(["count", "min", "max", "mean", "std"]).rename(columns={"mean": "avg"})
+    out["std"] = g["value"].std(ddof=0)
+    out["min_at"] = pd.to_datetime(df.loc[g["value"].idxmin(), "ts"].to_numpy(), unit="s")
+    out["max_at"] = pd.to_datetime(df.loc[g["value"].idxmax(), "ts"].to_numpy(), unit="s")
+    out["trend_slope"] = (sums["xy"] / sums["xx"].where(sums["xx"] != 0)).fillna(0.0)
+    for q in qs:
+        out[f"p{q * 100:g}"] = g["value"].quantile(q)
+    if threshold is not None:
+        thr = df["sensor_id"].map(threshold) if isinstance(threshold, dict) else threshold
+        out["exceedances"] = (df["value"] > thr).groupby(df["sensor_id"]).sum().astype(np.int64)
+    return out[["count", "min", "min_at", "max", "max_at", "avg", "std", "trend_slope",
+                *[c for c in out.columns if c.startswith("p") or c == "exceedances"]]]
+
+
+def load_columns(conn: sqlite3.Connection, sensor_ids: Optional[Iterable[int]] = None, start=None, end=None,
+                 batch_size: int = db.READ_BATCH_SIZE) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(sensor_ids, ts, values) z bazy – czytane porcjami kolumnowymi, bez obiektów Measurement."""
+    parts = list(repository.iter_range(conn, sensor_ids, start, end, batch_size=batch_size, mode="columns"))
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float64)
+    sids, ts, vs = zip(*parts)
+    return (np.concatenate([np.asarray(p, dtype=np.int64) for p in sids]),
+            np.concatenate([np.asarray(p, dtype=np.int64) for p in ts]),
+            np.concatenate([np.asarray(p, dtype=np.float64) for p in vs]))
@@ -1,148 +1,374 @@
 from __future__ import annotations
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Iterable, Dict, Any, List
 from polair.utils import env_int, get_logger
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from polair.ratelimit import RateLimiter, get_limiter, parse_retry_after, RETRY_AFTER_MAX
+from polair.cache import ResponseCache, CacheEntry, get_cache
+from polair.jsonstream import StreamedObject
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
 
 logger = get_logger(__name__)
 
 BASE = "https://api.gios.gov.pl/pjp-api/v1/rest"
 TIMEOUT = env_int("POLAIR_HTTP_TIMEOUT", 15)
+# liczba pul połączeń (hostów) i maksymalna liczba połączeń keep-alive na host
+POOL_CONNECTIONS = env_int("POLAIR_HTTP_POOL_CONNECTIONS", 4)
+POOL_MAXSIZE = env_int("POLAIR_HTTP_POOL_MAXSIZE", 32)
+# strumieniowe pobieranie archiwum: rozmiar strony (wierszy) i porcji czytanej z gniazda (bajtów)
+STREAM_PAGE_SIZE = env_int("POLAIR_STREAM_PAGE_SIZE", 5000)
+STREAM_CHUNK = env_int("POLAIR_STREAM_CHUNK", 64 * 1024)
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=1, max=8),
-    retry=retry_if_exception_type((requests.RequestException,))
-)
 
+class ApiError(RuntimeError):
+    def __init__(self, msg: str, status: int | None = None, retry_after: float | None = None):
+        super().__init__(msg)
+        self.status = status
+        self.retry_after = retry_after
 
 
-def _get_json(url, params=None, timeout=15):
-    r = requests.get(url, params=params or {}, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
+def _throttled(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def _retryable(exc: BaseException) -> bool:
+    """Ponawiamy błędy sieci, 429 i 5xx – pozostałe 4xx nic nie zmienią przy kolejnej próbie."""
+    if isinstance(exc, ApiError):
+        return exc.status is None or _throttled(exc.status)
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return _throttled(exc.response.status_code)
+    return isinstance(exc, requests.RequestException)
+
+
+def _wait(retry_state) -> float:
+    """Retry-After od serwera, a gdy go brak – wykładniczo 1..8 s."""
+    exc = retry_state.outcome.exception()
+    ra = getattr(exc, "retry_after", None)
+    if ra is not None:
+        return min(ra, RETRY_AFTER_MAX)
+    return _backoff(retry_state)
+
+
+_backoff = wait_exponential(multiplier=1, min=1, max=8)
+
+# wspólna polityka ponowień dla klienta synchronicznego i asynchronicznego (polair.aio)
+gios_retry = retry(stop=stop_after_attempt(3), wait=_wait, retry=retry_if_exception(_retryable))
 
-class ApiError(RuntimeError):
-    pass
 
 def _check(resp: requests.Response) -> dict:
     if resp.status_code >= 400:
-        raise ApiError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+        raise ApiError(f"HTTP {resp.status_code}: {resp.text[:200]}", status=resp.status_code)
     return resp.json()
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8),
-       retry=retry_if_exception_type((requests.RequestException, ApiError)))
-def get_stations_page(page: int=0, size: int=200) -> dict:
-    url = f"{BASE}/station/findAll?page={page}&size={size}"
-    logger.info("GET %s", url)
-    resp = requests.get(url, timeout=TIMEOUT)
-    return _check(resp)
 
-def iter_all_stations() -> Iterable[dict]:
-    page = 0
-    while True:
-        data = get_stations_page(page=page, size=200)
-        items = data.get("Lista stacji pomiarowych") or data.get("Lista stacji pomiarów") or []
-        for it in items:
-            yield it
-        links = data.get("links") or {}
-        if not links or "next" not in links or links["next"] == links.get("self"):
-            break
-        page += 1
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8),
-       retry=retry_if_exception_type((requests.RequestException, ApiError)))
-def get_sensors(station_id: int):
+def _stations_page(data: dict) -> tuple[list, bool]:
+    """Wyciąga listę stacji ze strony station/findAll; drugi element – czy jest następna strona."""
+    items = data.get("Lista stacji pomiarowych") or data.get("Lista stacji pomiarów") or []
+    links = data.get("links") or {}
+    more = bool(links) and "next" in links and links["next"] != links.get("self")
+    return items, more
 
 
-    page = 0
-    size = 200
-    out = []
-    while True:
-        url = f"{BASE}/station/sensors/{station_id}"
-        data = _get_json(url, params={"page": page, "size": size})
-        # <<< KLUCZ: bierzemy właściwą listę z wnętrza JSON-a >>>
-        chunk = data.get("Lista stanowisk pomiarowych dla podanej stacji", [])
-        if not isinstance(chunk, list):
-            chunk = []
-        out.extend(chunk)
+def _sensors_page(data: dict, page: int) -> tuple[list, bool]:
+    # <<< KLUCZ: bierzemy właściwą listę z wnętrza JSON-a >>>
+    chunk = data.get("Lista stanowisk pomiarowych dla podanej stacji", [])
+    if not isinstance(chunk, list):
+        chunk = []
+    nxt = (data.get("links") or {}).get("next")
+    return chunk, bool(nxt) and page < data.get("totalPages", 1) - 1
 
-        links = data.get("links", {})
-        nxt = links.get("next")
-        if not nxt or page >= data.get("totalPages", 1) - 1:
-            break
-        page += 1
-        self.notebook.select(self.tab_measurements)
 
+ARCHIVE_KEY = "Lista archiwalnych wyników pomiarów"
 
 
-    return out
+def _archival_date(d) -> str:
+    # 'YYYY-MM-DD' -> północ tego dnia; datetime -> z dokładnością do minuty
+    if isinstance(d, datetime):
+        return d.strftime("%Y-%m-%d %H:%M")
+    return f"{d} 00:00"
+
+
+def _archival_params(date_from, date_to, page: int = 0, size: int = 30) -> dict:
+    return {"page": page, "size": size, "dateFrom": _archival_date(date_from), "dateTo": _archival_date(date_to)}
+
+
+def _archival_page(data: dict, page: int) -> tuple[list, bool]:
+    rows = data.get(ARCHIVE_KEY) or []
+    if "totalPages" in data:
+        return rows, page < (data.get("totalPages") or 1) - 1
+    links = data.get("links") or {}
+    return rows, bool(links.get("next")) and links.get("next") != links.get("self")
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8),
-       retry=retry_if_exception_type((requests.RequestException, ApiError)))
-def get_measurements(sensor_id: int) -> List[Dict[str, Any]]:
 
-    url = f"{BASE}/data/getData/{sensor_id}"
-    out: List[Dict[str, Any]] = []
-    r = requests.get(url, timeout=15)
-    if not r.ok:
-        try:
-            return r.json()  # tu często przychodzi ten "error_result"
-        except Exception:
-            r.raise_for_status()
+def _closing_chunks(r: requests.Response, chunk_size: int = STREAM_CHUNK):
+    try:
+        yield from r.iter_content(chunk_size=chunk_size)
+    finally:
+        r.close()
 
-    return r.json()
 
-    while True:
-        r = requests.get(url, timeout=TIMEOUT)
+class GiosClient:
+    """
+    Klient REST GIOŚ ze wspólną sesją HTTP (pula połączeń keep-alive).
+    Jedna instancja może być używana równolegle z wielu wątków.
+    Z podanym `cache` odpowiedzi są zapamiętywane wg polityki polair.cache.
+    """
+
+    def __init__(self, base: str = BASE, timeout: float = TIMEOUT,
+                 pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE,
+                 pool_block: bool = True, limiter: RateLimiter | None = None,
+                 cache: ResponseCache | None = None, stale_while_revalidate: bool = True):
+        self.base = base.rstrip("/")
+        # None – wspólny ogranicznik procesu (polair.ratelimit.get_limiter)
+        self.limiter = limiter
+        self.cache = cache
+        self.stale_while_revalidate = stale_while_revalidate
+        self._bg: ThreadPoolExecutor | None = None
+        self._revalidating: set[str] = set()
+        self.timeout = timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self._session: requests.Session | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    s = requests.Session()
+                    # pool_block=True: przy wyczerpaniu puli wątek czeka na wolne połączenie
+                    # zamiast otwierać kolejne (limit połączeń na host)
+                    adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                          pool_maxsize=self.pool_maxsize,
+                                          pool_block=self.pool_block)
+                    s.mount("https://", adapter)
+                    s.mount("http://", adapter)
+                    s.headers.update({"Accept": "application/json"})
+                    self._session = s
+        return self._session
+
+    def close(self) -> None:
+        with self._lock:
+            bg, self._bg = self._bg, None
+        if bg is not None:
+            bg.shutdown(wait=True)
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def __enter__(self) -> "GiosClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _get(self, url: str, params: dict | None = None, timeout: float | None = None) -> requests.Response:
+        cache = self.cache
+        if cache is None or cache.policy(url) is None:
+            return self._fetch(url, params, timeout)
+        key = cache.key(url, params)
+        entry = cache.get(key)
+        if entry is not None:
+            if entry.fresh:
+                cache.note("hits")
+                return entry.response()
+            if self.stale_while_revalidate and entry.usable_stale:
+                cache.note("stale_hits")
+                self._revalidate_later(url, params, timeout, key, entry)
+                return entry.response()
+        return self._fetch_and_store(url, params, timeout, key, entry)
+
+    def _fetch_and_store(self, url, params, timeout, key: str, entry: CacheEntry | None) -> requests.Response:
+        r = self._fetch(url, params, timeout, headers=entry.validators() if entry else None)
+        if r.status_code == 304 and entry is not None:
+            self.cache.refresh(entry)
+            return entry.response()
+        if r.status_code == 200:
+            self.cache.put(key, r)
+        return r
+
+    def _revalidate_later(self, url, params, timeout, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            if self._bg is None:
+                self._bg = ThreadPoolExecutor(max_workers=2, thread_name_prefix="polair-revalidate")
+
+        def job():
+            try:
+                self._fetch_and_store(url, params, timeout, key, entry)
+            except Exception as e:
+                logger.warning("Odświeżenie %s nie powiodło się: %s", url, e)
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        self._bg.submit(job)
+
+    def _fetch(self, url: str, params: dict | None = None, timeout: float | None = None,
+               headers: dict | None = None, stream: bool = False) -> requests.Response:
+        limiter = self.limiter or get_limiter()
+        logger.info("GET %s %s", url, params or "")
+        with limiter.slot():
+            try:
+                r = self.session.get(url, params=params or {}, timeout=timeout or self.timeout, headers=headers,
+                                     stream=stream)
+            except requests.RequestException:
+                limiter.on_error()
+                raise
+        if _throttled(r.status_code):
+            ra = parse_retry_after(r.headers.get("Retry-After"))
+            limiter.on_throttle(ra)
+            raise ApiError(f"HTTP {r.status_code}: {r.text[:200]}", status=r.status_code, retry_after=ra)
+        limiter.on_success()
+        return r
+
+    @gios_retry
+    def _get_json(self, url: str, params: dict | None = None, timeout: float | None = None):
+        r = self._get(url, params, timeout)
         r.raise_for_status()
-        data = r.json()
-
-        # Jeśli API zwróci już listę – zwracamy ją
-        if isinstance(data, list):
-            out.extend(data)
-            break
-
-        # Format jak w Twoim zrzucie:
-        if isinstance(data, dict):
-            chunk = data.get("Lista danych pomiarowych", []) or []
-            if isinstance(chunk, list):
-                out.extend(chunk)
-
-            links = data.get("links") or {}
-            nxt = links.get("next")
-            # Stop gdy nie ma next albo next == self
-            if not nxt or nxt == links.get("self"):
+        return r.json()
+
+    @gios_retry
+    def get_stations_page(self, page: int = 0, size: int = 200) -> dict:
+        return _check(self._get(f"{self.base}/station/findAll", {"page": page, "size": size}))
+
+    def iter_all_stations(self) -> Iterable[dict]:
+        page = 0
+        while True:
+            items, more = _stations_page(self.get_stations_page(page=page, size=200))
+            yield from items
+            if not more:
                 break
+            page += 1
+
+    @gios_retry
+    def get_sensors(self, station_id: int) -> List[Dict[str, Any]]:
+        page = 0
+        size = 200
+        out = []
+        while True:
+            data = self._get_json(f"{self.base}/station/sensors/{station_id}", {"page": page, "size": size})
+            chunk, more = _sensors_page(data, page)
+            out.extend(chunk)
+            if not more:
+                break
+            page += 1
+        return out
+
+    @gios_retry
+    def get_measurements(self, sensor_id: int) -> List[Dict[str, Any]]:
+        r = self._fetch(f"{self.base}/data/getData/{sensor_id}")  # bez cache – zawsze świeże pomiary
+        if not r.ok:
+            try:
+                return r.json()  # tu często przychodzi ten "error_result"
+            except Exception:
+                r.raise_for_status()
+        return r.json()
+
+    @gios_retry
+    def get_air_index(self, station_id: int) -> dict:
+        """Indeks jakości powietrza stacji (aqindex/getIndex przyjmuje ID stacji)."""
+        return _check(self._fetch(f"{self.base}/aqindex/getIndex/{station_id}"))
+
+    @gios_retry
+    def get_archival_measurements(self, sensor_id: int, date_from, date_to, page: int = 0, size: int = 30):
+        """
+        Pobiera jedną stronę danych archiwalnych z API GIOS.
+        date_from, date_to w formacie 'YYYY-MM-DD' albo datetime.
+        Cały zakres (wszystkie strony) – polair.archive.iter_archival.
+        """
+        r = self._fetch(f"{self.base}/archivalData/getDataBySensor/{sensor_id}",
+                        _archival_params(date_from, date_to, page, size))
+        r.raise_for_status()
+        return r.json()
 
+    @gios_retry
+    def get_archival_raw(self, sensor_id: int, date_from, date_to, page: int = 0, size: int = 30) -> bytes:
+        """Jak get_archival_measurements, ale zwraca surowe bajty odpowiedzi (dekodowanie np. w innym procesie)."""
+        r = self._fetch(f"{self.base}/archivalData/getDataBySensor/{sensor_id}",
+                        _archival_params(date_from, date_to, page, size))
+        r.raise_for_status()
+        return r.content
+
+    @gios_retry
+    def _open_stream(self, url: str, params: dict | None = None) -> requests.Response:
+        r = self._fetch(url, params, stream=True)
+        if not r.ok:
+            r.close()
+        r.raise_for_status()
+        return r
+
+    def stream_archival_measurements(self, sensor_id: int, date_from, date_to, page: int = 0,
+                                     size: int = STREAM_PAGE_SIZE) -> StreamedObject:
+        """
+        Jedna strona archiwum dekodowana przyrostowo ze strumienia HTTP: iteracja zwraca
+        wiersze {"Data", "Wartość"} po jednym, a po jej zakończeniu `.meta` zawiera
+        totalPages/links (do _archival_page). Z pominięciem cache – odpowiedź nie jest
+        buforowana w całości. Ponawiane jest tylko otwarcie połączenia.
+        """
+        r = self._open_stream(f"{self.base}/archivalData/getDataBySensor/{sensor_id}",
+                              _archival_params(date_from, date_to, page, size))
+        return StreamedObject(_closing_chunks(r), ARCHIVE_KEY)
+
+
+_default_client: GiosClient | None = None
+_default_lock = threading.Lock()
 
-            url = nxt
-            continue
 
+def get_client() -> GiosClient:
+    """Zwraca współdzielonego (procesowego) klienta używanego przez funkcje modułu."""
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = GiosClient(cache=get_cache())
+    return _default_client
 
-        break
 
-    return out
+def set_client(client: GiosClient | None) -> None:
+    """Podmienia klienta domyślnego (np. inny BASE lub rozmiar puli)."""
+    global _default_client
+    with _default_lock:
+        old, _default_client = _default_client, client
+    if old is not None and old is not client:
+        old.close()
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8),
-       retry=retry_if_exception_type((requests.RequestException, ApiError)))
-def get_air_index(sensor_id: int) -> dict:
 
-    url = f"{BASE}/aqindex/getIndex/{sensor_id}"
-    logger.info("GET %s", url)
-    resp = requests.get(url, timeout=TIMEOUT)
-    return _check(resp)
+def _get_json(url, params=None, timeout=15):
+    return get_client()._get_json(url, params, timeout)
+
+
+def get_stations_page(page: int=0, size: int=200) -> dict:
+    return get_client().get_stations_page(page=page, size=size)
+
 
-def get_archival_measurements(sensor_id: int, date_from: str, date_to: str):
+def iter_all_stations() -> Iterable[dict]:
+    return get_client().iter_all_stations()
+
+
+def get_sensors(station_id: int):
+    return get_client().get_sensors(station_id)
+
+
+def get_measurements(sensor_id: int) -> List[Dict[str, Any]]:
+    return get_client().get_measurements(sensor_id)
+
+
+def get_air_index(station_id: int) -> dict:
+    return get_client().get_air_index(station_id)
+
+
+def get_archival_measurements(sensor_id: int, date_from, date_to, page: int = 0, size: int = 30):
     """
     Pobiera dane archiwalne z API GIOS.
-    date_from, date_to w formacie 'YYYY-MM-DD'
+    date_from, date_to w formacie 'YYYY-MM-DD' albo datetime
     """
-    url = (
-        f"https://api.gios.gov.pl/pjp-api/v1/rest/archivalData/getDataBySensor/{sensor_id}"
-        f"?page=0&size=30&dateFrom={date_from}%2000%3A00&dateTo={date_to}%2000%3A00"
-    )
-    r = requests.get(url, timeout=15)
-    r.raise_for_status()
-    return r.json()
-
+    return get_client().get_archival_measurements(sensor_id, date_from, date_to, page, size)
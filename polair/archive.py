@@ -0,0 +1,131 @@
+"""
+Strumieniowe pobieranie danych archiwalnych (archivalData/getDataBySensor).
+
+Zakres dat dzielony jest na rozłączne okna, okna pobierane są równolegle,
+a w każdym oknie przechodzimy przez wszystkie strony wyników. Pomiary
+wychodzą z generatora okno po oknie – w pamięci są tylko okna w locie.
+"""
+from __future__ import annotations
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Iterator, List
+from polair import api, parsing, services, repository
+from polair.models import Measurement
+from polair.utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+PAGE_SIZE = env_int("POLAIR_ARCHIVE_PAGE_SIZE", 500)
+CHUNK_DAYS = env_int("POLAIR_ARCHIVE_CHUNK_DAYS", 7)
+WORKERS = env_int("POLAIR_ARCHIVE_WORKERS", 4)
+
+
+def _as_datetime(d) -> datetime:
+    if isinstance(d, datetime):
+        return d
+    if isinstance(d, date):
+        return datetime(d.year, d.month, d.day)
+    return datetime.fromisoformat(str(d))
+
+
+def split_range(date_from, date_to, chunk: timedelta) -> List[tuple[datetime, datetime]]:
+    """Dzieli [date_from, date_to] na kolejne okna o długości `chunk` (ostatnie może być krótsze)."""
+    start, end = _as_datetime(date_from), _as_datetime(date_to)
+    out = []
+    while start < end:
+        stop = min(start + chunk, end)
+        out.append((start, stop))
+        start = stop
+    return out
+
+
+def fetch_window(sensor_id: int, start: datetime, end: datetime, page_size: int = PAGE_SIZE,
+                 client: api.GiosClient | None = None) -> List[Measurement]:
+    """Wszystkie strony archiwum dla jednego okna czasowego."""
+    client = client or api.get_client()
+    out: List[Measurement] = []
+    page = 0
+    while True:
+        data = client.get_archival_measurements(sensor_id, start, end, page=page, size=page_size)
+        rows, more = api._archival_page(data, page)
+        out.extend(services.parse_data_rows(rows, sensor_id))
+        if not more or not rows:
+            break
+        page += 1
+    return out
+
+
+def iter_archival(sensor_id: int, date_from, date_to, chunk_days: int = CHUNK_DAYS,
+                  page_size: int = PAGE_SIZE, workers: int = WORKERS,
+                  client: api.GiosClient | None = None) -> Iterator[Measurement]:
+    """
+    Pomiary archiwalne czujnika z zakresu [date_from, date_to], okno po oknie
+    (chronologicznie). Pomiary na styku okien (API zwraca oba końce) nie są powtarzane.
+    """
+    client = client or api.get_client()
+    windows = split_range(date_from, date_to, timedelta(days=chunk_days))
+    prev_seen: set[datetime] = set()
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="polair-archive")
+    try:
+        it = iter(windows)
+        inflight = deque()
+        # przesuwne okno zadań: nie więcej niż `workers` okien w pamięci naraz
+        for w in it:
+            inflight.append(pool.submit(fetch_window, sensor_id, w[0], w[1], page_size, client))
+            if len(inflight) >= workers:
+                break
+        while inflight:
+            ms = inflight.popleft().result()
+            nxt = next(it, None)
+            if nxt is not None:
+                inflight.append(pool.submit(fetch_window, sensor_id, nxt[0], nxt[1], page_size, client))
+            seen: set[datetime] = set()
+            for m in sorted(ms, key=lambda m: m.dt):
+                if m.dt in seen or m.dt in prev_seen:
+                    continue
+                seen.add(m.dt)
+                yield m
+            prev_seen = seen
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def stream_archival(sensor_id: int, date_from, date_to, chunk_days: int = CHUNK_DAYS,
+                    page_size: int = api.STREAM_PAGE_SIZE, client: api.GiosClient | None = None) -> Iterator[Measurement]:
+    """
+    Jak iter_archival, ale bez buforowania: strony dekodowane przyrostowo (polair.jsonstream),
+    pomiary wychodzą wiersz po wierszu w kolejności API. Pamięć nie zależy od rozmiaru strony.
+    """
+    client = client or api.get_client()
+    for i, (start, end) in enumerate(split_range(date_from, date_to, timedelta(days=chunk_days))):
+        page = 0
+        while True:
+            doc = client.stream_archival_measurements(sensor_id, start, end, page=page, size=page_size)
+            n = 0
+            for rec in doc:
+                n += 1
+                m = parsing.parse_row(rec, sensor_id)
+                # początek okna (poza pierwszym) był już końcem poprzedniego
+                if m is None or (i and m.dt == start):
+                    continue
+                yield m
+            _, more = api._archival_page(doc.meta, page)
+            if not more or not n:
+                break
+            page += 1
+
+
+def backfill(conn: sqlite3.Connection, sensor_id: int, date_from, date_to, batch_size: int = 1000,
+             stream: bool = False, **kw) -> int:
+    """
+    Zapisuje archiwum czujnika do bazy porcjami po `batch_size`; zwraca liczbę zapisanych pomiarów.
+    stream=True – pobieranie sekwencyjne z dekodowaniem przyrostowym (stream_archival).
+    """
+    source = stream_archival if stream else iter_archival
+    if stream:
+        kw.pop("workers", None)
+    total = repository.upsert_measurements(conn, source(sensor_id, date_from, date_to, **kw), batch_size)
+    logger.info("Archiwum czujnika %s: zapisano %d pomiarów", sensor_id, total)
+    return total
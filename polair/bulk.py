@@ -0,0 +1,106 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, Future
+from typing import Iterable, Iterator, Union, Callable, Any
+from polair import api, services
+from polair.models import AirIndex, Sensor, Measurement
+from polair.utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+WORKERS = env_int("POLAIR_BULK_WORKERS", 16)
+ALL = "all"
+
+
+def _station_ids(station_ids, client: api.GiosClient) -> Iterable[int]:
+    if station_ids == ALL:
+        return [int(services.parse_station(r).id) for r in client.iter_all_stations()]
+    return [int(s) for s in station_ids]
+
+
+def _as_completed(pool: ThreadPoolExecutor, tasks: Iterable[tuple[Callable, int]],
+                  follow: Callable[[Callable, Any], Iterable[tuple[Callable, int]]] | None = None) -> Iterator[Any]:
+    """
+    Zwraca wyniki zadań w kolejności ukończenia. `follow(fn, wynik)` może
+    dołożyć kolejne zadania do tej samej puli. Błędy pojedynczych zadań są logowane.
+    """
+    pending: dict[Future, tuple[Callable, int]] = {pool.submit(fn, arg): (fn, arg) for fn, arg in tasks}
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            fn, arg = pending.pop(fut)
+            try:
+                res = fut.result()
+            except Exception as e:
+                logger.warning("%s(%s): %s", fn.__name__, arg, e)
+                continue
+            if follow:
+                for nfn, narg in follow(fn, res):
+                    pending[pool.submit(nfn, narg)] = (nfn, narg)
+            yield res
+
+
+def fetch_network(station_ids: Union[str, Iterable[int]] = ALL, measurements: bool = True,
+                  workers: int = WORKERS, client: api.GiosClient | None = None) -> Iterator[Union[Sensor, Measurement]]:
+    """
+    Pobiera równolegle czujniki wszystkich podanych stacji (lub ALL – całej sieci)
+    i, opcjonalnie, bieżące pomiary każdego czujnika.
+    Zwraca obiekty Sensor/Measurement w miarę ich napływania.
+    """
+    client = client or api.get_client()
+    ids = _station_ids(station_ids, client)
+
+    def sensors_of(station_id):
+        return [services.parse_sensor(r) for r in client.get_sensors(station_id)]
+
+    def measurements_of(sensor_id):
+        return services.parse_data_rows(client.get_measurements(sensor_id), sensor_id)
+
+    def follow(fn, res):
+        if fn is sensors_of and measurements:
+            return [(measurements_of, s.id) for s in res]
+        return ()
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="polair-bulk")
+    try:
+        for res in _as_completed(pool, [(sensors_of, sid) for sid in ids], follow):
+            yield from res
+    finally:
+        # przerwana iteracja nie czeka na resztę kolejki
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def fetch_sensors(station_ids: Union[str, Iterable[int]] = ALL, workers: int = WORKERS,
+                  client: api.GiosClient | None = None) -> Iterator[Sensor]:
+    return fetch_network(station_ids, measurements=False, workers=workers, client=client)
+
+
+def fetch_measurements(sensor_ids: Iterable[int], workers: int = WORKERS,
+                       client: api.GiosClient | None = None) -> Iterator[Measurement]:
+    """Pobiera równolegle bieżące pomiary podanych czujników."""
+    client = client or api.get_client()
+
+    def measurements_of(sensor_id):
+        return services.parse_data_rows(client.get_measurements(sensor_id), sensor_id)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="polair-bulk")
+    try:
+        for res in _as_completed(pool, [(measurements_of, int(s)) for s in sensor_ids]):
+            yield from res
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def fetch_air_indexes(station_ids: Union[str, Iterable[int]] = ALL, workers: int = WORKERS,
+                      client: api.GiosClient | None = None) -> Iterator[AirIndex]:
+    """Pobiera równolegle indeks jakości powietrza podanych stacji (lub ALL)."""
+    client = client or api.get_client()
+
+    def index_of(station_id):
+        return services.parse_air_index(client.get_air_index(station_id), station_id)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="polair-bulk")
+    try:
+        for res in _as_completed(pool, [(index_of, sid) for sid in _station_ids(station_ids, client)]):
+            yield from res
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,207 @@
+"""
+Trwały cache odpowiedzi HTTP (SQLite) dla klienta polair.api.
+
+Klucz: URL + posortowane parametry. Każdy endpoint ma własny TTL i okno
+"stale-while-revalidate" (w którym zwracamy starą odpowiedź od razu, a odświeżamy
+ją w tle). Po wygaśnięciu odpowiedź jest rewalidowana przez ETag/Last-Modified.
+Rozmiar pliku ograniczony – najdawniej używane wpisy są usuwane (LRU).
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlencode
+import requests
+from polair.utils import env_int, env_str, get_logger
+
+logger = get_logger(__name__)
+
+MAX_BYTES = env_int("POLAIR_CACHE_MAX_MB", 64) * 1024 * 1024
+
+# fragment ścieżki -> (TTL, okno stale-while-revalidate) w sekundach. Tylko metadane (stacje,
+# czujniki): pomiary, indeks i archiwum zawsze idą do API – inaczej synchronizacja w tej samej
+# godzinie dostałaby starą odpowiedź, a backfill zapychałby cache stronami archiwum
+CACHE_TTLS: dict[str, tuple[int, int]] = {
+    "/station/findAll": (7 * 86400, 30 * 86400),
+    "/station/sensors/": (86400, 7 * 86400),
+}
+
+DDL = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_http_cache_accessed ON http_cache(accessed_at);
+"""
+
+
+def default_path() -> str:
+    """Plik cache obok bazy polair.db (POLAIR_DB_PATH), chyba że podano POLAIR_CACHE_PATH."""
+    db_path = env_str("POLAIR_DB_PATH", "polair.db")
+    return env_str("POLAIR_CACHE_PATH", os.path.join(os.path.dirname(db_path), "polair_cache.db"))
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    key: str
+    url: str
+    status: int
+    body: bytes
+    content_type: str | None
+    etag: str | None
+    last_modified: str | None
+    expires_at: float
+    stale_until: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    @property
+    def usable_stale(self) -> bool:
+        return time.time() < self.stale_until
+
+    def validators(self) -> dict:
+        h = {}
+        if self.etag:
+            h["If-None-Match"] = self.etag
+        if self.last_modified:
+            h["If-Modified-Since"] = self.last_modified
+        return h
+
+    def response(self) -> requests.Response:
+        r = requests.Response()
+        r.status_code = self.status
+        r._content = self.body
+        r.url = self.url
+        r.encoding = "utf-8"
+        if self.content_type:
+            r.headers["Content-Type"] = self.content_type
+        r.headers["X-Polair-Cache"] = "fresh" if self.fresh else "stale"
+        return r
+
+
+class ResponseCache:
+    def __init__(self, path: str | None = None, max_bytes: int = MAX_BYTES,
+                 ttls: dict[str, tuple[int, int]] | None = None):
+        self.path = path or default_path()
+        self.max_bytes = max_bytes
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.executescript(DDL)
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "revalidated": 0, "evicted": 0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def key(url: str, params: dict | None = None) -> str:
+        return f"{url}?{urlencode(sorted((params or {}).items()))}"
+
+    def policy(self, url: str) -> tuple[int, int] | None:
+        for fragment, ttl in self.ttls.items():
+            if fragment in url:
+                return ttl
+        return None
+
+    def note(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, url, status, body, content_type, etag, last_modified, expires_at, stale_until "
+                "FROM http_cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self._conn.execute("UPDATE http_cache SET accessed_at=? WHERE key=?", (time.time(), key))
+            self._conn.commit()
+        return CacheEntry(*row)
+
+    def put(self, key: str, resp: requests.Response) -> None:
+        ttl, stale = self.policy(resp.url or key) or (0, 0)
+        now = time.time()
+        body = resp.content
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO http_cache (key, url, status, body, content_type, etag, last_modified,
+                                        stored_at, expires_at, stale_until, accessed_at, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    url=excluded.url, status=excluded.status, body=excluded.body,
+                    content_type=excluded.content_type, etag=excluded.etag,
+                    last_modified=excluded.last_modified, stored_at=excluded.stored_at,
+                    expires_at=excluded.expires_at, stale_until=excluded.stale_until,
+                    accessed_at=excluded.accessed_at, size=excluded.size
+                """,
+                (key, resp.url or key, resp.status_code, body, resp.headers.get("Content-Type"),
+                 resp.headers.get("ETag"), resp.headers.get("Last-Modified"),
+                 now, now + ttl, now + ttl + stale, now, len(body)))
+            self._evict()
+            self._conn.commit()
+
+    def refresh(self, entry: CacheEntry) -> None:
+        """Odpowiedź 304 – treść aktualna, przedłużamy ważność."""
+        ttl, stale = self.policy(entry.url) or (0, 0)
+        now = time.time()
+        entry.expires_at, entry.stale_until = now + ttl, now + ttl + stale
+        with self._lock:
+            self.counters["revalidated"] += 1
+            self._conn.execute("UPDATE http_cache SET expires_at=?, stale_until=?, accessed_at=? WHERE key=?",
+                               (entry.expires_at, entry.stale_until, now, entry.key))
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM http_cache ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM http_cache WHERE key=?", (key,))
+            self.counters["evicted"] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM http_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM http_cache").fetchone()
+            return dict(self.counters, entries=n, bytes=size)
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache | None:
+    """Wspólny cache procesu; POLAIR_HTTP_CACHE=0 wyłącza cache."""
+    global _cache
+    if not env_int("POLAIR_HTTP_CACHE", 1):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
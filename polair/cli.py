@@ -0,0 +1,160 @@
+"""
+Wiersz poleceń PolAir – pobieranie danych bez interfejsu Tkinter (cron/systemd).
+
+    python -m polair sync-stations
+    python -m polair sync-sensors [--station ID ...]
+    python -m polair sync-index [--station ID ...]
+    python -m polair sync-measurements [--since 2025-08-01] [--sensor ID ...]
+    python -m polair backfill --from 2024-01-01 --to 2025-01-01 [--sensor ID ...] [--parse-workers N | --stream]
+    python -m polair schedule [--minute 20] [--once]
+"""
+from __future__ import annotations
+import argparse
+import sys
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+from polair import api, archive, bulk, db, pipeline, repository, scheduler, services, sync
+from polair.utils import env_int, get_logger
+
+logger = get_logger("polair.cli")
+
+
+def _date(s: str) -> datetime:
+    try:
+        return datetime.fromisoformat(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Niepoprawna data: {s} (oczekiwano YYYY-MM-DD[ HH:MM])")
+
+
+def cmd_sync_stations(conn, args) -> int:
+    stations = [services.parse_station(r) for r in api.iter_all_stations()]
+    repository.upsert_stations(conn, stations)
+    print(f"Zapisano {len(stations)} stacji")
+    return 0
+
+
+def cmd_sync_sensors(conn, args) -> int:
+    ids = args.station or [s.id for s in repository.get_stations(conn)] or bulk.ALL
+    sensors = list(bulk.fetch_sensors(ids, workers=args.workers))
+    repository.upsert_sensors(conn, sensors)
+    print(f"Zapisano {len(sensors)} czujników")
+    return 0
+
+
+def cmd_sync_index(conn, args) -> int:
+    ids = args.station or [s.id for s in repository.get_stations(conn)] or bulk.ALL
+    n = repository.upsert_air_index(conn, bulk.fetch_air_indexes(ids, workers=args.workers))
+    print(f"Zapisano {n} wartości indeksu jakości powietrza")
+    return 0
+
+
+def cmd_sync_measurements(conn, args) -> int:
+    ids = args.sensor or repository.get_sensor_ids(conn)
+    if not ids:
+        print("Brak czujników w bazie – uruchom najpierw sync-sensors", file=sys.stderr)
+        return 1
+    results = sync.sync_sensors(conn, ids, since=args.since, workers=args.workers)
+    failed = [r for r in results if r.error]
+    print(f"Czujników: {len(results)}, nowych pomiarów: {sum(r.new for r in results)}, "
+          f"zmienionych: {sum(r.updated for r in results)}, błędów: {len(failed)}")
+    return 1 if failed and len(failed) == len(results) else 0
+
+
+def cmd_backfill(conn, args) -> int:
+    ids = args.sensor or repository.get_sensor_ids(conn)
+    date_to = args.date_to or datetime.now()
+    with db.bulk_load(conn, synchronous="NORMAL"):
+        if not args.stream:
+            m = pipeline.backfill_many(conn, ids, args.date_from, date_to, io_workers=args.workers,
+                                       parse_workers=args.parse_workers)
+            print(m.report())
+            print(f"Zapisano {m.write.rows} pomiarów archiwalnych dla {len(ids)} czujników")
+            return 1 if m.download.errors + m.parse.errors and not m.write.rows else 0
+        total = failed = 0
+        for sid in ids:
+            try:
+                total += archive.backfill(conn, sid, args.date_from, date_to, stream=True)
+            except Exception as e:
+                failed += 1
+                logger.warning("Archiwum czujnika %s: %s", sid, e)
+    print(f"Zapisano {total} pomiarów archiwalnych dla {len(ids)} czujników, błędów: {failed}")
+    return 1 if failed and failed == len(ids) else 0
+
+
+def cmd_schedule(conn, args) -> int:
+    """
+    Pętla: każdy czujnik odpytywany chwilę po spodziewanej publikacji jego danych
+    (polair.scheduler), stacje i czujniki odświeżane co args.sensors_every h.
+    """
+    sched = scheduler.Scheduler(conn, workers=args.workers, default_lag=args.minute * 60)
+
+    def refresh():
+        try:
+            cmd_sync_stations(conn, args)
+            cmd_sync_sensors(conn, argparse.Namespace(station=None, workers=args.workers))
+        except Exception as e:
+            logger.warning("Odświeżenie stacji/czujników nie powiodło się: %s", e)
+        return repository.get_sensor_ids(conn)
+
+    try:
+        sched.run_forever(refresh=refresh, refresh_every=timedelta(hours=args.sensors_every), once=args.once)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    # --db/--workers działają zarówno przed, jak i po nazwie polecenia
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=argparse.SUPPRESS,
+                        help="ścieżka bazy SQLite (domyślnie POLAIR_DB_PATH lub polair.db)")
+    common.add_argument("--workers", type=int, default=argparse.SUPPRESS, help="liczba równoległych zapytań")
+
+    p = argparse.ArgumentParser(prog="python -m polair", description="PolAir – pobieranie danych GIOŚ")
+    p.add_argument("--db", help="ścieżka bazy SQLite (domyślnie POLAIR_DB_PATH lub polair.db)")
+    p.add_argument("--workers", type=int, default=env_int("POLAIR_WORKERS", 8), help="liczba równoległych zapytań")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    s = sub.add_parser("sync-stations", parents=[common], help="pobierz listę stacji")
+    s.set_defaults(func=cmd_sync_stations)
+
+    s = sub.add_parser("sync-sensors", parents=[common], help="pobierz czujniki stacji (domyślnie wszystkich z bazy)")
+    s.add_argument("--station", type=int, action="append", help="ID stacji (można powtarzać)")
+    s.set_defaults(func=cmd_sync_sensors)
+
+    s = sub.add_parser("sync-index", parents=[common], help="pobierz indeks jakości powietrza stacji (kolory mapy)")
+    s.add_argument("--station", type=int, action="append", help="ID stacji (można powtarzać)")
+    s.set_defaults(func=cmd_sync_index)
+
+    s = sub.add_parser("sync-measurements", parents=[common], help="dociągnij brakujące pomiary (przyrostowo)")
+    s.add_argument("--since", type=_date, help="pobierz od tej chwili zamiast od ostatniego zapisanego pomiaru")
+    s.add_argument("--sensor", type=int, action="append", help="ID czujnika (można powtarzać)")
+    s.set_defaults(func=cmd_sync_measurements)
+
+    s = sub.add_parser("backfill", parents=[common], help="pobierz archiwum z zakresu dat")
+    s.add_argument("--from", dest="date_from", type=_date, required=True)
+    s.add_argument("--to", dest="date_to", type=_date, help="koniec zakresu (domyślnie teraz)")
+    s.add_argument("--sensor", type=int, action="append", help="ID czujnika (można powtarzać)")
+    s.add_argument("--parse-workers", type=int, default=pipeline.PARSE_WORKERS,
+                   help="liczba procesów dekodujących odpowiedzi (0 – w wątku)")
+    s.add_argument("--stream", action="store_true",
+                   help="duże strony dekodowane przyrostowo – stałe zużycie pamięci, pobieranie sekwencyjne")
+    s.set_defaults(func=cmd_backfill)
+
+    s = sub.add_parser("schedule", parents=[common], help="działaj w pętli i odpytuj czujniki po publikacji danych")
+    s.add_argument("--minute", type=int, default=scheduler.DEFAULT_LAG // 60,
+                   help="początkowe opóźnienie publikacji (min po pełnej godzinie), potem uczone per czujnik")
+    s.add_argument("--sensors-every", type=int, default=24, help="co ile godzin odświeżać stacje i czujniki")
+    s.add_argument("--once", action="store_true", help="wykonaj jeden przebieg i zakończ")
+    s.set_defaults(func=cmd_schedule)
+    return p
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    conn = db.get_conn(args.db)
+    db.init_db(conn)
+    try:
+        return args.func(conn, args)
+    finally:
+        conn.close()
@@ -1,11 +1,40 @@
 from __future__ import annotations
+import os
+import socket
 import sqlite3
-from typing import Iterable, Sequence, Any
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
 from polair.utils import env_int, get_logger
 from polair.utils import env_str
 
 logger = get_logger(__name__)
 
+# ile wierszy zapisujemy w jednej transakcji
+BATCH_SIZE = env_int("POLAIR_DB_BATCH_SIZE", 10_000)
+# ile wierszy odczytujemy naraz (fetchmany) w czytnikach strumieniowych
+READ_BATCH_SIZE = env_int("POLAIR_DB_READ_BATCH_SIZE", 5_000)
+# rozmiar cache stron SQLite podczas ładowania masowego (MB)
+BULK_CACHE_MB = env_int("POLAIR_DB_BULK_CACHE_MB", 256)
+
+EPOCH = datetime(1970, 1, 1)
+
+def to_epoch(dt: datetime | str) -> int:
+    """
+    Znacznik czasu pomiaru -> sekundy od 1970-01-01 (INTEGER w tabeli measurements).
+    Czas bez strefy traktujemy jak czas "ścienny" UTC, tj. bez przeliczania stref –
+    odczyt przez from_epoch() zwraca dokładnie tę samą datę i godzinę.
+    """
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - EPOCH) // timedelta(seconds=1)
+
+def from_epoch(ts: int) -> datetime:
+    return EPOCH + timedelta(seconds=ts)
+
 def get_conn(path: str | None = None) -> sqlite3.Connection:
     db_path = path or env_str("POLAIR_DB_PATH", "polair.db")
     conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
@@ -43,35 +72,533 @@ DDL = [
     """
     CREATE TABLE IF NOT EXISTS measurements (
         sensor_id INTEGER NOT NULL,
-        dt TEXT NOT NULL,
+        dt INTEGER NOT NULL,              -- sekundy od 1970-01-01 (to_epoch)
         value REAL,
         PRIMARY KEY (sensor_id, dt),
         FOREIGN KEY (sensor_id) REFERENCES sensors(id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        sensor_id INTEGER PRIMARY KEY,
+        high_water TEXT,
+        last_sync_at TEXT,
+        last_new INTEGER,
+        last_updated INTEGER
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sensor_schedule (
+        sensor_id INTEGER PRIMARY KEY,
+        period_s INTEGER NOT NULL,
+        lag_s REAL NOT NULL,
+        misses INTEGER NOT NULL DEFAULT 0,
+        next_due TEXT
     );
     """
 ]
 
-def init_db(conn: sqlite3.Connection) -> None:
-    for stmt in DDL:
-        conn.execute(stmt)
+AIR_INDEX_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS air_index (
+        station_id INTEGER NOT NULL,
+        param TEXT NOT NULL,
+        value REAL,
+        category TEXT,
+        calc_date TEXT,
+        UNIQUE (station_id, param)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_sensors_station ON sensors(station_id);",
+    "CREATE INDEX IF NOT EXISTS ix_stations_city ON stations(city_name, name);",
+    "CREATE INDEX IF NOT EXISTS ix_stations_province ON stations(province, city_name, name);",
+]
+
+# trwały cache geokodowania: query = nazwa po geo.normalize_place; lat/lon NULL – nie znaleziono
+GEOCODE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        query TEXT PRIMARY KEY,
+        lat REAL,
+        lon REAL,
+        source TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    """,
+]
+
+# agregaty pomiarów per czujnik per dzień/miesiąc; t = godziny od 1970-01-01 (do regresji liniowej)
+ROLLUPS = {"day": "rollup_daily", "month": "rollup_monthly"}
+ROLLUP_TRIGGERS = ("trg_measurements_rollup_insert", "trg_measurements_rollup_update", "trg_measurements_rollup_delete")
+
+def _numeric(col: str) -> str:
+    """Tylko liczby – tekst (np. "") sortuje się w SQLite powyżej liczb i psułby min/max/średnie."""
+    return f"typeof({col}) IN ('integer', 'real')"
+
+NUMERIC_VALUE = _numeric("value")
+
+def _bucket(level: str, dt: str) -> str:
+    if level == "day":
+        return f"({dt} - {dt} % 86400)"
+    return f"CAST(strftime('%s', {dt}, 'unixepoch', 'start of month') AS INTEGER)"
+
+def _bucket_end(level: str, bucket: str) -> str:
+    if level == "day":
+        return f"({bucket} + 86400)"
+    return f"CAST(strftime('%s', {bucket}, 'unixepoch', '+1 month') AS INTEGER)"
+
+def _rollup_table(table: str) -> str:
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        sensor_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,          -- początek dnia/miesiąca (to_epoch)
+        n INTEGER NOT NULL,
+        sum REAL NOT NULL,
+        sumsq REAL NOT NULL,
+        min REAL NOT NULL,
+        min_dt INTEGER NOT NULL,
+        max REAL NOT NULL,
+        max_dt INTEGER NOT NULL,
+        sum_t REAL NOT NULL,
+        sum_tt REAL NOT NULL,
+        sum_ty REAL NOT NULL,
+        PRIMARY KEY (sensor_id, bucket)
+    ) WITHOUT ROWID;
+    """
+
+def _rollup_add(level: str) -> str:
+    """Dopisuje NEW (nowy pomiar) do kubełka – przyrostowo."""
+    t = "(NEW.dt / 3600.0)"
+    return f"""
+        INSERT INTO {ROLLUPS[level]} (sensor_id, bucket, n, sum, sumsq, min, min_dt, max, max_dt, sum_t, sum_tt, sum_ty)
+        SELECT NEW.sensor_id, {_bucket(level, "NEW.dt")}, 1, NEW.value, NEW.value * NEW.value,
+               NEW.value, NEW.dt, NEW.value, NEW.dt, {t}, {t} * {t}, {t} * NEW.value
+        WHERE {_numeric("NEW.value")}
+        ON CONFLICT(sensor_id, bucket) DO UPDATE SET
+            n = n + 1, sum = sum + excluded.sum, sumsq = sumsq + excluded.sumsq,
+            min_dt = CASE WHEN excluded.min < min THEN excluded.min_dt ELSE min_dt END,
+            min = MIN(min, excluded.min),
+            max_dt = CASE WHEN excluded.max > max THEN excluded.max_dt ELSE max_dt END,
+            max = MAX(max, excluded.max),
+            sum_t = sum_t + excluded.sum_t, sum_tt = sum_tt + excluded.sum_tt, sum_ty = sum_ty + excluded.sum_ty;
+    """
+
+def _rollup_rebuild(sensor: str, dt: str) -> str:
+    """
+    Przelicza od nowa kubełki zawierające chwilę `dt` czujnika `sensor`: dzień z surowych
+    pomiarów, miesiąc z dni. Potrzebne przy zmianie/usunięciu pomiaru (min/max nie da się "odjąć").
+    """
+    day, month = _bucket("day", dt), _bucket("month", dt)
+    day_end, month_end = _bucket_end("day", day), _bucket_end("month", month)
+    raw = f"FROM measurements WHERE sensor_id = {sensor} AND dt >= {day} AND dt < {day_end} AND {_numeric('value')}"
+    days = f"FROM rollup_daily WHERE sensor_id = {sensor} AND bucket >= {month} AND bucket < {month_end}"
+    return f"""
+        DELETE FROM rollup_daily WHERE sensor_id = {sensor} AND bucket = {day};
+        INSERT INTO rollup_daily (sensor_id, bucket, n, sum, sumsq, min, min_dt, max, max_dt, sum_t, sum_tt, sum_ty)
+        SELECT {sensor}, {day}, COUNT(value), SUM(value), SUM(value * value),
+               MIN(value), (SELECT dt {raw} ORDER BY value, dt LIMIT 1),
+               MAX(value), (SELECT dt {raw} ORDER BY value DESC, dt LIMIT 1),
+               SUM(dt / 3600.0), SUM((dt / 3600.0) * (dt / 3600.0)), SUM((dt / 3600.0) * value)
+        {raw} HAVING COUNT(value) > 0;
+        DELETE FROM rollup_monthly WHERE sensor_id = {sensor} AND bucket = {month};
+        INSERT INTO rollup_monthly (sensor_id, bucket, n, sum, sumsq, min, min_dt, max, max_dt, sum_t, sum_tt, sum_ty)
+        SELECT {sensor}, {month}, SUM(n), SUM(sum), SUM(sumsq),
+               MIN(min), (SELECT min_dt {days} ORDER BY min, min_dt LIMIT 1),
+               MAX(max), (SELECT max_dt {days} ORDER BY max DESC, max_dt LIMIT 1),
+               SUM(sum_t), SUM(sum_tt), SUM(sum_ty)
+        {days} HAVING COUNT(*) > 0;
+    """
+
+ROLLUP_DDL = [
+    _rollup_table("rollup_daily"),
+    _rollup_table("rollup_monthly"),
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_measurements_rollup_insert AFTER INSERT ON measurements
+    BEGIN
+        {_rollup_add("day")}
+        {_rollup_add("month")}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_measurements_rollup_update AFTER UPDATE ON measurements
+    WHEN OLD.value IS NOT NEW.value OR OLD.dt != NEW.dt OR OLD.sensor_id != NEW.sensor_id
+    BEGIN
+        {_rollup_rebuild("OLD.sensor_id", "OLD.dt")}
+        {_rollup_rebuild("NEW.sensor_id", "NEW.dt")}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_measurements_rollup_delete AFTER DELETE ON measurements
+    BEGIN
+        {_rollup_rebuild("OLD.sensor_id", "OLD.dt")}
+    END;
+    """,
+]
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """Odtwarza tabele agregatów z surowych pomiarów (np. po imporcie z wyłączonymi triggerami)."""
+    with conn:
+        conn.execute("DELETE FROM rollup_daily")
+        conn.execute("DELETE FROM rollup_monthly")
+        for level in ("day", "month"):
+            b = _bucket(level, "m.dt")
+            conn.execute(f"""
+                INSERT INTO {ROLLUPS[level]} (sensor_id, bucket, n, sum, sumsq, min, min_dt, max, max_dt,
+                                              sum_t, sum_tt, sum_ty)
+                SELECT m.sensor_id, {b}, COUNT(m.value), SUM(m.value), SUM(m.value * m.value),
+                       MIN(m.value), (SELECT x.dt FROM measurements x WHERE x.sensor_id = m.sensor_id
+                                      AND x.dt >= {b} AND x.dt < {_bucket_end(level, b)} AND {_numeric("x.value")}
+                                      ORDER BY x.value, x.dt LIMIT 1),
+                       MAX(m.value), (SELECT x.dt FROM measurements x WHERE x.sensor_id = m.sensor_id
+                                      AND x.dt >= {b} AND x.dt < {_bucket_end(level, b)} AND {_numeric("x.value")}
+                                      ORDER BY x.value DESC, x.dt LIMIT 1),
+                       SUM(m.dt / 3600.0), SUM((m.dt / 3600.0) * (m.dt / 3600.0)), SUM((m.dt / 3600.0) * m.value)
+                FROM measurements m WHERE {_numeric("m.value")}
+                GROUP BY m.sensor_id, {b}
+            """)
+
+# ładowanie masowe: dopóki w bulk_load_state jest wiersz (znacznik trwającego ładowania), triggery
+# agregatów – dla wszystkich połączeń – tylko notują dotknięte (czujnik, dzień) w rollup_dirty
+BULK_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS bulk_load_state (
+        id INTEGER PRIMARY KEY,
+        host TEXT NOT NULL,
+        pid INTEGER NOT NULL,
+        started_at TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_dirty (
+        sensor_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        PRIMARY KEY (sensor_id, day)
+    ) WITHOUT ROWID;
+    """,
+]
+# przebudowa dni z rollup_dirty porcjami – inni piszący nie czekają na całość
+REBUILD_BATCH = env_int("POLAIR_DB_REBUILD_BATCH", 20_000)
+
+_BULK = "EXISTS (SELECT 1 FROM bulk_load_state)"
+_CHANGED = "(OLD.value IS NOT NEW.value OR OLD.dt != NEW.dt OR OLD.sensor_id != NEW.sensor_id)"
+
+def _mark_dirty(sensor: str, dt: str) -> str:
+    # ON CONFLICT DO NOTHING, nie OR IGNORE – w triggerze OR IGNORE ustępuje polityce zewnętrznego UPSERT-a
+    return f"INSERT INTO rollup_dirty VALUES ({sensor}, {_bucket('day', dt)}) ON CONFLICT DO NOTHING;"
+
+def _trigger(name: str, event: str, when: str, body: str) -> str:
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON measurements
+    WHEN {when}
+    BEGIN
+        {body}
+    END;
+    """
+
+BULK_TRIGGERS = ROLLUP_TRIGGERS + tuple(f"{name}_bulk" for name in ROLLUP_TRIGGERS)
+ROLLUP_TRIGGERS_DDL = [
+    _trigger(ROLLUP_TRIGGERS[0], "INSERT", f"NOT {_BULK}", _rollup_add("day") + _rollup_add("month")),
+    _trigger(ROLLUP_TRIGGERS[1], "UPDATE", f"{_CHANGED} AND NOT {_BULK}",
+             _rollup_rebuild("OLD.sensor_id", "OLD.dt") + _rollup_rebuild("NEW.sensor_id", "NEW.dt")),
+    _trigger(ROLLUP_TRIGGERS[2], "DELETE", f"NOT {_BULK}", _rollup_rebuild("OLD.sensor_id", "OLD.dt")),
+    _trigger(BULK_TRIGGERS[3], "INSERT", _BULK, _mark_dirty("NEW.sensor_id", "NEW.dt")),
+    _trigger(BULK_TRIGGERS[4], "UPDATE", f"{_CHANGED} AND {_BULK}",
+             _mark_dirty("OLD.sensor_id", "OLD.dt") + _mark_dirty("NEW.sensor_id", "NEW.dt")),
+    _trigger(BULK_TRIGGERS[5], "DELETE", _BULK, _mark_dirty("OLD.sensor_id", "OLD.dt")),
+]
+
+def _bulk_rollups(conn: sqlite3.Connection) -> None:
+    _create(BULK_DDL)(conn)
+    for name in ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    _create(ROLLUP_TRIGGERS_DDL)(conn)
+
+def _rebuild_dirty_batch(conn: sqlite3.Connection, limit: Optional[int] = None) -> int:
+    """
+    Przelicza (w bieżącej transakcji) do `limit` dni z rollup_dirty – dni z surowych pomiarów,
+    ich miesiące z dni – i usuwa je z listy. Zwraca liczbę przeliczonych dni.
+    """
+    raw = (f"FROM measurements x WHERE x.sensor_id = d.sensor_id AND x.dt >= d.day AND x.dt < d.day + 86400 "
+           f"AND {_numeric('x.value')}")
+    month = _bucket("month", "day")
+    days = "FROM rollup_daily z WHERE z.sensor_id = mo.sensor_id AND z.bucket >= mo.bucket AND z.bucket < mo.bucket_end"
+    conn.execute("DROP TABLE IF EXISTS temp.rollup_batch")
+    conn.execute("DROP TABLE IF EXISTS temp.rollup_batch_month")
+    conn.execute("CREATE TEMP TABLE rollup_batch AS SELECT sensor_id, day FROM main.rollup_dirty LIMIT ?",
+                 (-1 if limit is None else limit,))
+    n = conn.execute("SELECT COUNT(*) FROM temp.rollup_batch").fetchone()[0]
+    if n:
+        conn.execute("DELETE FROM rollup_daily WHERE (sensor_id, bucket) IN (SELECT sensor_id, day FROM temp.rollup_batch)")
+        conn.execute(f"""
+            INSERT INTO rollup_daily (sensor_id, bucket, n, sum, sumsq, min, min_dt, max, max_dt, sum_t, sum_tt, sum_ty)
+            SELECT d.sensor_id, d.day, COUNT(m.value), SUM(m.value), SUM(m.value * m.value),
+                   MIN(m.value), (SELECT x.dt {raw} ORDER BY x.value, x.dt LIMIT 1),
+                   MAX(m.value), (SELECT x.dt {raw} ORDER BY x.value DESC, x.dt LIMIT 1),
+                   SUM(m.dt / 3600.0), SUM((m.dt / 3600.0) * (m.dt / 3600.0)), SUM((m.dt / 3600.0) * m.value)
+            FROM temp.rollup_batch d
+            JOIN measurements m ON m.sensor_id = d.sensor_id AND m.dt >= d.day AND m.dt < d.day + 86400
+            WHERE {_numeric("m.value")}
+            GROUP BY d.sensor_id, d.day
+        """)
+        conn.execute(f"""
+            CREATE TEMP TABLE rollup_batch_month AS
+            SELECT DISTINCT sensor_id, {month} AS bucket, {_bucket_end("month", month)} AS bucket_end
+            FROM temp.rollup_batch
+        """)
+        conn.execute("DELETE FROM rollup_monthly WHERE (sensor_id, bucket) IN "
+                     "(SELECT sensor_id, bucket FROM temp.rollup_batch_month)")
+        conn.execute(f"""
+            INSERT INTO rollup_monthly (sensor_id, bucket, n, sum, sumsq, min, min_dt, max, max_dt, sum_t, sum_tt, sum_ty)
+            SELECT mo.sensor_id, mo.bucket, SUM(r.n), SUM(r.sum), SUM(r.sumsq),
+                   MIN(r.min), (SELECT z.min_dt {days} ORDER BY z.min, z.min_dt LIMIT 1),
+                   MAX(r.max), (SELECT z.max_dt {days} ORDER BY z.max DESC, z.max_dt LIMIT 1),
+                   SUM(r.sum_t), SUM(r.sum_tt), SUM(r.sum_ty)
+            FROM temp.rollup_batch_month mo
+            JOIN rollup_daily r ON r.sensor_id = mo.sensor_id AND r.bucket >= mo.bucket AND r.bucket < mo.bucket_end
+            GROUP BY mo.sensor_id, mo.bucket
+        """)
+        conn.execute("DELETE FROM main.rollup_dirty WHERE (sensor_id, day) IN "
+                     "(SELECT sensor_id, day FROM temp.rollup_batch)")
+        conn.execute("DROP TABLE temp.rollup_batch_month")
+    conn.execute("DROP TABLE temp.rollup_batch")
+    return n
+
+def rebuild_dirty_rollups(conn: sqlite3.Connection, batch_size: Optional[int] = None) -> int:
+    """
+    Przelicza dni z rollup_dirty porcjami po `batch_size`, każda porcja w osobnej transakcji.
+    Miesiąc liczony z dni, więc dzień przeliczony później poprawia też swój miesiąc. Zwraca liczbę dni.
+    """
+    batch_size = max(1, batch_size or REBUILD_BATCH)
+    if conn.in_transaction:
+        conn.commit()
+    total = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            n = _rebuild_dirty_batch(conn, batch_size)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        total += n
+        if n < batch_size:
+            return total
+
+def _finish_bulk_load(conn: sqlite3.Connection, ids: Sequence[int]) -> int:
+    """
+    Usuwa znaczniki ładowań `ids`; jeśli innych nie ma – w tej samej transakcji przelicza resztę
+    rollup_dirty (triggery wracają do pracy przyrostowej dopiero z kompletnymi agregatami).
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("DELETE FROM bulk_load_state WHERE id = ?", [(i,) for i in ids])
+        active = conn.execute("SELECT COUNT(*) FROM bulk_load_state").fetchone()[0]
+        n = 0 if active else _rebuild_dirty_batch(conn)
+    except BaseException:
+        conn.rollback()
+        raise
     conn.commit()
+    return n
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)    # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        ok = kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return bool(ok) and code.value == 259                # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
 
-def executemany(conn: sqlite3.Connection, sql: str, rows: Iterable[Sequence[Any]]) -> None:
-    conn.executemany(sql, rows)
+def recover_bulk_loads(conn: sqlite3.Connection) -> int:
+    """
+    Usuwa znaczniki ładowań przerwanych (proces z tego komputera już nie działa) i dokańcza
+    za nie przeliczenie agregatów. Trwające ładowania (także z innych komputerów) zostawia.
+    Zwraca liczbę usuniętych znaczników.
+    """
+    host = socket.gethostname()
+    stale = [i for i, h, pid in conn.execute("SELECT id, host, pid FROM bulk_load_state")
+             if h == host and not _pid_alive(pid)]
+    if stale:
+        logger.warning("Przerwane ładowanie masowe (%d) – przeliczanie odłożonych agregatów", len(stale))
+        rebuild_dirty_rollups(conn)
+        _finish_bulk_load(conn, stale)
+    return len(stale)
+
+@contextmanager
+def deferred_rollups(conn: sqlite3.Connection):
+    """
+    Na czas bloku triggery agregatów (dwa UPSERT-y na wiersz) tylko notują dotknięte (czujnik, dzień) –
+    dotyczy to też zapisów innych połączeń i procesów. Po wyjściu przelicza te dni i ich miesiące;
+    gdy trwa jeszcze inne ładowanie, końcowe przeliczenie zostawia ostatniemu.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bulk_load_state'").fetchone():
+        # baza bez schematu agregatów – nic do odkładania
+        yield conn
+        return
+    if conn.in_transaction:
+        conn.commit()
+    with conn:
+        load_id = conn.execute("INSERT INTO bulk_load_state (host, pid, started_at) VALUES (?, ?, ?)",
+                               (socket.gethostname(), os.getpid(),
+                                datetime.now().isoformat(timespec="seconds"))).lastrowid
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.commit()
+        n = rebuild_dirty_rollups(conn)
+        n += _finish_bulk_load(conn, [load_id])
+        logger.info("Agregaty przeliczone dla %d dni czujników", n)
+
+def _create_rollups(conn: sqlite3.Connection) -> None:
+    _create(ROLLUP_DDL)(conn)
+    rebuild_rollups(conn)
+
+def _numeric_rollups(conn: sqlite3.Connection) -> None:
+    """Tekst w value (np. "" ze starszego GUI) -> NULL; triggery agregatów z nowym warunkiem, agregaty od nowa."""
+    for name in ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"UPDATE measurements SET value = NULL WHERE value IS NOT NULL AND NOT {NUMERIC_VALUE}")
+    _create(ROLLUP_DDL)(conn)
     conn.commit()
+    rebuild_rollups(conn)
 
-def ensure_schema(conn):
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS sensors (
-            id INTEGER PRIMARY KEY,
-            station_id INTEGER,
-            param_code TEXT,
-            param_name TEXT,
-            param_formula TEXT,
-            param_id INTEGER
+def _create(statements: Sequence[str]):
+    def migration(conn: sqlite3.Connection) -> None:
+        for stmt in statements:
+            conn.execute(stmt)
+    return migration
+
+# kolejne wersje schematu: (numer, opis, funkcja) – tylko dopisujemy na końcu, nigdy nie zmieniamy starszych
+MIGRATIONS: list[tuple[int, str, Callable[[sqlite3.Connection], Any]]] = [
+    (1, "tabele podstawowe", _create(DDL)),
+    (2, "measurements: dt INTEGER, WITHOUT ROWID", lambda conn: migrate_measurements(conn)),
+    (3, "tabela air_index i indeksy pomocnicze", _create(AIR_INDEX_DDL)),
+    (4, "agregaty dzienne/miesięczne pomiarów (rollup_*) z triggerami", lambda conn: _create_rollups(conn)),
+    (5, "cache geokodowania (geocode_cache)", _create(GEOCODE_DDL)),
+    (6, "agregaty i triggery tylko z wartości liczbowych", lambda conn: _numeric_rollups(conn)),
+    (7, "znacznik ładowania masowego i odkładanie agregatów (rollup_dirty)", lambda conn: _bulk_rollups(conn)),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT NOT NULL
         )
     """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Doprowadza bazę do najnowszej wersji schematu; gdy jest aktualna – nic nie robi."""
+    current = schema_version(conn)
     conn.commit()
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info("Migracja schematu bazy do wersji %d: %s", version, description)
+        migrate(conn)
+        conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                     (version, description, datetime.now().isoformat(timespec="seconds")))
+        conn.commit()
+    recover_bulk_loads(conn)
+
+def migrate_measurements(conn: sqlite3.Connection, vacuum: bool = True) -> bool:
+    """
+    Przebudowuje starą tabelę measurements (dt jako tekst ISO, tabela z rowid)
+    do układu z DDL: dt INTEGER (to_epoch), WITHOUT ROWID. Zwraca True, jeśli
+    migracja została wykonana. Wiersze z nieczytelną datą są pomijane.
+    """
+    cols = {r[1]: r[2].upper() for r in conn.execute("PRAGMA table_info(measurements)")}
+    if cols.get("dt") != "TEXT":
+        return False
+    n = conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+    logger.info("Migracja tabeli measurements (%d wierszy) do zwartego formatu", n)
+    new_ddl = next(stmt for stmt in DDL if "EXISTS measurements" in stmt).replace(
+        "EXISTS measurements", "EXISTS measurements_new")
+    if conn.in_transaction:
+        conn.commit()
+    # przepisujemy istniejące dane 1:1 – bez ponownego sprawdzania kluczy obcych
+    fk = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        with conn:
+            conn.execute(new_ddl)
+            conn.execute("""
+                INSERT OR REPLACE INTO measurements_new (sensor_id, dt, value)
+                SELECT sensor_id, CAST(strftime('%s', dt) AS INTEGER), value FROM measurements
+                WHERE strftime('%s', dt) IS NOT NULL
+                ORDER BY sensor_id, dt
+            """)
+            conn.execute("DROP TABLE measurements")
+            conn.execute("ALTER TABLE measurements_new RENAME TO measurements")
+    finally:
+        conn.execute(f"PRAGMA foreign_keys={fk}")
+    if vacuum:
+        conn.execute("VACUUM")
+    return True
 
+def batched(rows: Iterable[Sequence[Any]], size: int) -> Iterator[list]:
+    it = iter(rows)
+    while batch := list(islice(it, size)):
+        yield batch
 
+def executemany(conn: sqlite3.Connection, sql: str, rows: Iterable[Sequence[Any]],
+                batch_size: int = BATCH_SIZE) -> int:
+    """
+    Zapisuje wiersze porcjami po `batch_size`, każda porcja w osobnej transakcji.
+    Gdy wywołujący ma otwartą transakcję, porcje trafiają do niej – bez commitu,
+    zatwierdza (lub wycofuje) wywołujący. `rows` może być generatorem – w pamięci
+    jest naraz tylko jedna porcja. Zwraca liczbę zapisanych wierszy.
+    """
+    joined = conn.in_transaction
+    total = 0
+    for batch in batched(rows, max(1, batch_size)):
+        if joined:
+            conn.executemany(sql, batch)
+        else:
+            with conn:
+                conn.executemany(sql, batch)
+        total += len(batch)
+    return total
+
+@contextmanager
+def bulk_load(conn: sqlite3.Connection, synchronous: str = "OFF", cache_mb: int = BULK_CACHE_MB):
+    """
+    Ustawienia na czas ładowania masowego: bez fsync po każdej transakcji,
+    duży cache stron i pliki tymczasowe w pamięci. Po wyjściu przywraca poprzednie.
+    Przy synchronous=OFF awaria systemu w trakcie ładowania może uszkodzić bazę –
+    używać do importów, które da się powtórzyć. Agregaty (rollup_*) są przeliczane
+    raz, po wyjściu – patrz deferred_rollups().
+    """
+    if conn.in_transaction:
+        conn.commit()
+    saved = {name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+             for name in ("synchronous", "cache_size", "temp_store")}
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute(f"PRAGMA cache_size={-cache_mb * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    try:
+        with deferred_rollups(conn):
+            yield conn
+    finally:
+        if conn.in_transaction:
+            conn.commit()
+        for name, value in saved.items():
+            conn.execute(f"PRAGMA {name}={value}")
+
+def ensure_schema(conn):
+    return init_db(conn)
@@ -1,22 +1,449 @@
+"""
+Geokodowanie i wyszukiwanie stacji w pobliżu punktu.
+
+StationIndex to indeks przestrzenny stacji (siatka komórek lat/lon) budowany raz,
+np. z repository.get_stations. Zapytania (promień, k najbliższych) zawężają kandydatów
+do sąsiednich komórek, liczą dla nich wektorowo odległość po kuli (haversine),
+a dokładną odległość geodezyjną (geopy, elipsoida WGS84) tylko dla stacji, które
+leżą przy granicy wyniku – tam, gdzie błąd kuli mógłby zmienić odpowiedź.
+
+geocode najpierw normalizuje nazwę (normalize_place), potem szuka jej kolejno w pamięci
+procesu, w gazeterze zbudowanym z tabeli stations (miasta, gminy, powiaty, województwa),
+w trwałym cache geocode_cache w bazie, a dopiero na końcu pyta backend (domyślnie
+Nominatim; w testach np. StaticBackend – patrz set_backend).
+"""
 from __future__ import annotations
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime, timedelta
 from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
-from typing import Iterable, Tuple, List
+from typing import Callable, Dict, Iterable, Mapping, Optional, Tuple, List
+import numpy as np
+from . import repository
 from .models import Station
+from .utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088   # średni promień Ziemi (IUGG)
+# maksymalny względny błąd odległości po kuli względem elipsoidy WGS84 (ok. 0,56%)
+SPHERE_ERROR = 0.0056
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+
+# --- geokodowanie
+
+GEOCODE_MISS_TTL = timedelta(days=env_int("POLAIR_GEOCODE_MISS_TTL_DAYS", 30))  # po tylu dniach ponawiamy nieudane
+_PL_LETTERS = str.maketrans("ąćęłńóśźż", "acelnoszz")
+_PLACE_PREFIX = re.compile(r"^(?:miasto stołeczne|m\. st\.|miasto|m\.|gmina|gm\.|powiat|pow\.|województwo|woj\.)\s+")
+_COUNTRY_SUFFIX = re.compile(r"[,\s]+(?:polska|poland|pl)$")
+
+Backend = Callable[[str], Optional[Tuple[float, float]]]
+
+
+def normalize_place(q: str) -> str:
+    """
+    Klucz nazwy miejsca: małe litery bez polskich znaków, bez przedrostków typu "gmina"/"woj."
+    i dopisku ", Polska"; myślniki i wielokrotne spacje -> jedna spacja ("Bielsko-Biała" -> "bielsko biala").
+    """
+    s = unicodedata.normalize("NFKC", q or "").casefold().strip()
+    s = _COUNTRY_SUFFIX.sub("", s)
+    s = re.sub(r"[\s\-–—_]+", " ", s).strip(" .,;")
+    while True:
+        stripped = _PLACE_PREFIX.sub("", s)
+        if stripped == s:
+            break
+        s = stripped
+    # ą->a itd. na końcu, żeby przedrostki z polskimi znakami też pasowały
+    return s.translate(_PL_LETTERS)
+
+
+class NominatimBackend:
+    """Geokodowanie przez OpenStreetMap Nominatim (jeden klient na proces)."""
+    name = "nominatim"
+
+    def __init__(self, user_agent: str = "polair_app", timeout: float = 10):
+        self._geolocator = Nominatim(user_agent=user_agent, timeout=timeout)
+
+    def __call__(self, q: str) -> Optional[Tuple[float, float]]:
+        loc = self._geolocator.geocode(q, country_codes="pl")
+        return (loc.latitude, loc.longitude) if loc else None
+
+
+class StaticBackend:
+    """Lokalny backend ze stałej tablicy nazw (testy, praca bez sieci); liczy zapytania w `calls`."""
+    name = "static"
+
+    def __init__(self, places: Mapping[str, Tuple[float, float]]):
+        self.places = {normalize_place(k): (float(v[0]), float(v[1])) for k, v in places.items()}
+        self.calls = 0
+
+    def __call__(self, q: str) -> Optional[Tuple[float, float]]:
+        self.calls += 1
+        return self.places.get(normalize_place(q))
+
+
+_backend: Optional[Backend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> Backend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = NominatimBackend()
+        return _backend
+
+
+def set_backend(backend: Optional[Backend]) -> None:
+    """Podmienia backend geokodowania (None – z powrotem Nominatim) i czyści pamięć podręczną procesu."""
+    global _backend, _default_geocoder
+    with _backend_lock:
+        _backend = backend
+    with _geocoders_lock:
+        _geocoders.clear()
+        _default_geocoder = None
+
+
+def build_gazetteer(conn: sqlite3.Connection) -> Dict[str, Tuple[float, float]]:
+    """
+    Nazwa (po normalize_place) -> środek stacji. Przy powtarzającej się nazwie wygrywa miasto,
+    potem gmina, powiat i województwo, a w obrębie rodzaju – nazwa z większą liczbą stacji.
+    """
+    out: Dict[str, Tuple[float, float]] = {}
+    for _kind, name, lat, lon, _n in sorted(repository.station_places(conn),
+                                            key=lambda r: (["city_name", "commune", "district", "province"].index(r[0]), -r[4])):
+        out.setdefault(normalize_place(name), (lat, lon))
+    return out
+
+
+class Geocoder:
+    """
+    Geokodowanie z warstwami cache: pamięć procesu -> gazeter ze stacji -> tabela geocode_cache
+    -> backend. Bez `conn` działa tylko pamięć procesu i backend.
+    """
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None, backend: Optional[Backend] = None,
+                 gazetteer: Optional[Mapping[str, Tuple[float, float]]] = None):
+        self.conn = conn
+        self.backend = backend
+        self._gazetteer = dict(gazetteer) if gazetteer is not None else None
+        self._memo: Dict[str, Optional[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def gazetteer(self) -> Dict[str, Tuple[float, float]]:
+        if self._gazetteer is None:
+            self._gazetteer = build_gazetteer(self.conn) if self.conn is not None else {}
+        return self._gazetteer
+
+    def refresh(self) -> None:
+        """Przebudowuje gazeter (np. po sync-stations) i czyści pamięć procesu."""
+        with self._lock:
+            self._gazetteer = None
+            self._memo.clear()
+
+    def lookup(self, q: str) -> Optional[Tuple[float, float]]:
+        """(lat, lon) albo None, gdy miejsca nie znaleziono (brak wyniku też jest zapamiętywany)."""
+        key = normalize_place(q)
+        if not key:
+            return None
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+            hit = self.gazetteer.get(key)
+            found = hit is not None
+            if not found:
+                found, hit = self._lookup_cache(key)
+            if found:
+                self._memo[key] = hit
+                return hit
+        # zapytanie sieciowe bez blokady – inne wątki w tym czasie korzystają z cache
+        # (ta sama nazwa pytana równolegle może trafić do backendu dwa razy)
+        backend = self.backend or get_backend()
+        hit = backend(q)
+        logger.debug("Geokodowanie %r (%s): %s", q, key, hit)
+        with self._lock:
+            if self.conn is not None:
+                repository.put_geocode(self.conn, key, hit, getattr(backend, "name", type(backend).__name__))
+            self._memo[key] = hit
+        return hit
+
+    def _lookup_cache(self, key: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """(czy jest w geocode_cache, wynik); zapamiętany brak wyniku ważny przez GEOCODE_MISS_TTL."""
+        if self.conn is None:
+            return False, None
+        cached = repository.get_geocode(self.conn, key)
+        if cached is None:
+            return False, None
+        lat, lon, created = cached
+        if lat is not None:
+            return True, (lat, lon)
+        return datetime.now() - created < GEOCODE_MISS_TTL, None
+
+    def geocode(self, q: str) -> Tuple[float, float]:
+        hit = self.lookup(q)
+        if hit is None:
+            raise ValueError(f"Nie znaleziono lokalizacji: {q}")
+        return hit
+
+
+# Geocoder na połączenie z bazą (kilka ostatnich połączeń) i jeden bez bazy
+_geocoders: Dict[int, Geocoder] = {}
+_default_geocoder: Optional[Geocoder] = None
+_geocoders_lock = threading.Lock()
+_MAX_GEOCODERS = 8
+
+
+def get_geocoder(conn: Optional[sqlite3.Connection] = None) -> Geocoder:
+    global _default_geocoder
+    with _geocoders_lock:
+        if conn is None:
+            if _default_geocoder is None:
+                _default_geocoder = Geocoder()
+            return _default_geocoder
+        g = _geocoders.get(id(conn))
+        if g is None or g.conn is not conn:
+            if len(_geocoders) >= _MAX_GEOCODERS:
+                _geocoders.pop(next(iter(_geocoders)))
+            g = _geocoders[id(conn)] = Geocoder(conn)
+        return g
+
+
+def geocode(q: str, conn: Optional[sqlite3.Connection] = None) -> Tuple[float, float]:
+    """(lat, lon) miejsca; z `conn` korzysta z gazetera stacji i trwałego cache w bazie. Brak wyniku -> ValueError."""
+    return get_geocoder(conn).geocode(q)
+
+
+def haversine_km(lat0: float, lon0: float, lat, lon) -> np.ndarray:
+    """Odległość po kuli [km] od punktu (lat0, lon0) do tablic lat/lon (stopnie)."""
+    return _haversine(math.radians(lat0), math.radians(lon0),
+                      np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64)))
+
+
+def _haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Wzór haversine na radianach (z rozgłaszaniem tablic)."""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _equirectangular(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Przybliżenie płaskie (rzut równoodległościowy wokół lat1) – najszybsze, dokładne na krótkich odcinkach."""
+    x = (lon2 - lon1) * np.cos(lat1)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.sqrt(x * x + y * y)
+
+
+# dokładność odległości w obliczeniach wsadowych:
+#   "equirectangular" – ok. 2x szybsza; błąd rośnie z odległością (w Polsce < 1% do 100 km, < 2% do 300 km, do ok. 3,5% na całym obszarze),
+#   "haversine"       – kula, błąd względem WGS84 do SPHERE_ERROR,
+#   "geodesic"        – elipsoida WGS84 (geopy, punkt po punkcie); najwolniejsza
+# METHODS to tylko wzory wektorowe; "geodesic" obsługują osobno distance_matrix i nearest_k
+METHODS = {"equirectangular": _equirectangular, "haversine": _haversine}
+DISTANCE_METHODS = (*METHODS, "geodesic")
+BLOCK = 1 << 20   # maks. liczba elementów macierzy odległości liczonych naraz (pamięć: 8 MB na tablicę)
+
+
+def _check_method(method: str) -> None:
+    if method not in DISTANCE_METHODS:
+        raise ValueError(f"nieznana metoda odległości: {method} (dostępne: {', '.join(DISTANCE_METHODS)})")
+
+
+def _coords(points) -> np.ndarray:
+    pts = np.asarray(points, dtype=np.float64)
+    if pts.ndim == 1 and pts.size == 2:
+        pts = pts.reshape(1, 2)
+    if pts.ndim != 2 or pts.shape[1] != 2:
+        raise ValueError("punkty należy podać jako tablicę (n, 2) par (lat, lon)")
+    return pts
+
+
+def _blocks(n: int, m: int):
+    step = max(1, BLOCK // max(1, m))
+    for lo in range(0, n, step):
+        yield lo, min(n, lo + step)
+
+
+def distance_matrix(points, targets, method: str = "haversine") -> np.ndarray:
+    """
+    Macierz odległości [km] (n, m) od punktów (n, 2) do celów (m, 2); pary (lat, lon) w stopniach.
+    Liczona blokami wierszy, więc pamięć pomocnicza nie zależy od n.
+    """
+    pts, tgt = _coords(points), _coords(targets)
+    _check_method(method)
+    out = np.empty((pts.shape[0], tgt.shape[0]), dtype=np.float64)
+    if method == "geodesic":
+        for i, p in enumerate(pts.tolist()):
+            out[i] = [geodesic(p, t).km for t in tgt.tolist()]
+        return out
+    fn = METHODS[method]
+    tlat, tlon = np.radians(tgt[:, 0])[None, :], np.radians(tgt[:, 1])[None, :]
+    for lo, hi in _blocks(pts.shape[0], tgt.shape[0]):
+        rad = np.radians(pts[lo:hi])
+        out[lo:hi] = fn(rad[:, :1], rad[:, 1:], tlat, tlon)
+    return out
+
+
+def nearest_k(points, targets, k: int = 1, method: str = "haversine") -> tuple[np.ndarray, np.ndarray]:
+    """
+    k najbliższych celów dla każdego punktu naraz: (indeksy (n, k), odległości km (n, k)),
+    kolumny rosnąco po odległości. method="geodesic" wybiera kandydatów po haversine i liczy
+    geodezję tylko dla tych, które mieszczą się w marginesie błędu kuli od k-tego.
+    """
+    pts, tgt = _coords(points), _coords(targets)
+    _check_method(method)
+    n, m = pts.shape[0], tgt.shape[0]
+    k = min(k, m)
+    idx, dist = np.empty((n, k), dtype=np.int64), np.empty((n, k), dtype=np.float64)
+    if not k:
+        return idx, dist
+    # dla "geodesic" kandydatów wybiera haversine, geodezję liczymy niżej tylko dla nich
+    fn = METHODS.get(method, _haversine)
+    tlat, tlon = np.radians(tgt[:, 0])[None, :], np.radians(tgt[:, 1])[None, :]
+    for lo, hi in _blocks(n, m):
+        rad = np.radians(pts[lo:hi])
+        d = fn(rad[:, :1], rad[:, 1:], tlat, tlon)
+        part = np.argpartition(d, k - 1, axis=1)[:, :k] if k < m else np.broadcast_to(np.arange(m), d.shape)
+        part_d = np.take_along_axis(d, part, axis=1)
+        if method == "geodesic":
+            reach = part_d.max(axis=1) * (1 + SPHERE_ERROR) / (1 - SPHERE_ERROR)
+            for r in range(hi - lo):
+                cand = np.flatnonzero(d[r] <= reach[r])
+                p = tuple(pts[lo + r])
+                g = np.array([geodesic(p, tuple(tgt[c])).km for c in cand.tolist()])
+                best = np.argsort(g, kind="stable")[:k]
+                idx[lo + r], dist[lo + r] = cand[best], g[best]
+            continue
+        order = np.argsort(part_d, axis=1, kind="stable")
+        idx[lo:hi], dist[lo:hi] = np.take_along_axis(part, order, axis=1), np.take_along_axis(part_d, order, axis=1)
+    return idx, dist
+
+
+class StationIndex:
+    """
+    Indeks stacji do zapytań "w promieniu" i "k najbliższych". Wyniki (zbiór, odległości
+    i kolejność) są takie jak przy pełnym przeglądzie z geodesic (nearest_within), ale
+    odległość geodezyjną liczymy tylko dla zwracanych stacji i kandydatów granicznych.
+    """
+
+    def __init__(self, stations: Iterable[Station], cell_km: float = 25.0):
+        self.stations = [s for s in stations if s.lat is not None and s.lon is not None]
+        self.lat = np.array([s.lat for s in self.stations], dtype=np.float64)
+        self.lon = np.array([s.lon for s in self.stations], dtype=np.float64)
+        self.cell = cell_km / KM_PER_DEG    # bok komórki w stopniach
+        cells: dict[tuple[int, int], list[int]] = {}
+        for i, key in enumerate(zip(np.floor(self.lat / self.cell).astype(int).tolist(),
+                                    np.floor(self.lon / self.cell).astype(int).tolist())):
+            cells.setdefault(key, []).append(i)
+        self._cells = {k: np.array(v, dtype=np.int64) for k, v in cells.items()}
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection, **kw) -> "StationIndex":
+        return cls(repository.get_stations(conn), **kw)
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    @property
+    def coords(self) -> np.ndarray:
+        """Współrzędne stacji (m, 2) jako (lat, lon) – kolejność jak w self.stations."""
+        return np.column_stack([self.lat, self.lon])
+
+    def distances(self, points, method: str = "haversine") -> np.ndarray:
+        """Macierz odległości [km] (n, liczba stacji) od punktów (n, 2) do wszystkich stacji."""
+        return distance_matrix(points, self.coords, method)
+
+    def nearest_many(self, points, k: int = 1, method: str = "haversine") -> tuple[np.ndarray, np.ndarray]:
+        """k najbliższych stacji dla wielu punktów naraz: (indeksy do self.stations, odległości km)."""
+        return nearest_k(points, self.coords, k, method)
+
+    def _candidates(self, lat0: float, lon0: float, radius_km: float) -> np.ndarray:
+        """Indeksy stacji z komórek pokrywających okrąg (z zapasem na błąd kuli)."""
+        dlat = radius_km * (1 + SPHERE_ERROR) / KM_PER_DEG
+        top = min(abs(lat0) + dlat, 90.0)
+        # blisko bieguna lub przy przejściu przez południk 180° – pełny przegląd
+        if top >= 89.0 or dlat >= 90.0:
+            return np.arange(len(self.stations))
+        dlon = dlat / math.cos(math.radians(top))
+        if lon0 - dlon < -180.0 or lon0 + dlon > 180.0:
+            return np.arange(len(self.stations))
+        c = self.cell
+        rows = range(math.floor((lat0 - dlat) / c), math.floor((lat0 + dlat) / c) + 1)
+        cols = range(math.floor((lon0 - dlon) / c), math.floor((lon0 + dlon) / c) + 1)
+        if len(rows) * len(cols) > len(self._cells):
+            return np.arange(len(self.stations))
+        parts = [self._cells[k] for k in ((i, j) for i in rows for j in cols) if k in self._cells]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def _refine(self, center: Tuple[float, float], idx: np.ndarray, dist: np.ndarray, which: np.ndarray) -> None:
+        """Odległość geodezyjna (w miejscu) dla kandydatów wskazanych maską `which`."""
+        for k in np.flatnonzero(which).tolist():
+            i = int(idx[k])
+            dist[k] = geodesic((self.lat[i], self.lon[i]), center).km
+
+    def within(self, center: Tuple[float, float], radius_km: float) -> List[Tuple[float, Station]]:
+        """(odległość km, stacja) dla stacji w promieniu radius_km, rosnąco po odległości."""
+        lat0, lon0 = center
+        idx = self._candidates(lat0, lon0, radius_km)
+        dist = haversine_km(lat0, lon0, self.lat[idx], self.lon[idx])
+        keep = dist <= radius_km * (1 + SPHERE_ERROR)
+        idx, dist = idx[keep], dist[keep]
+        # wszystkie zwracane stacje dostają odległość geodezyjną – inaczej kolejność byłaby "po kuli"
+        self._refine(center, idx, dist, np.ones(dist.size, dtype=bool))
+        keep = dist <= radius_km
+        return self._sorted(idx[keep], dist[keep])
+
+    def nearest(self, center: Tuple[float, float], k: int = 1,
+                max_km: Optional[float] = None) -> List[Tuple[float, Station]]:
+        """k najbliższych stacji (opcjonalnie nie dalej niż max_km) jako (odległość km, stacja)."""
+        if k <= 0 or not self.stations:
+            return []
+        lat0, lon0 = center
+        radius = self.cell * KM_PER_DEG
+        while True:
+            idx = self._candidates(lat0, lon0, radius)
+            dist = haversine_km(lat0, lon0, self.lat[idx], self.lon[idx])
+            inside = dist <= radius
+            full = idx.size == len(self.stations)
+            if full or (max_km is not None and radius >= max_km) or np.count_nonzero(inside) >= k:
+                kth = np.partition(dist, min(k, dist.size) - 1)[min(k, dist.size) - 1] if dist.size else 0.0
+                # wszystkie stacje, które po geodezji mogą wyprzedzić k-tą, muszą być w zasięgu zapytania
+                reach = kth * (1 + SPHERE_ERROR) / (1 - SPHERE_ERROR)
+                if full or reach <= radius or (max_km is not None and radius >= max_km):
+                    break
+                radius = reach
+            else:
+                radius *= 2
+        limit = reach if max_km is None else min(reach, max_km * (1 + SPHERE_ERROR))
+        keep = dist <= limit
+        idx, dist = idx[keep], dist[keep]
+        # stacje bliżej niż lo są w wyniku niezależnie od błędu kuli – o składzie wyniku decydują
+        # tylko dalsze; bliższe liczymy geodezyjnie dopiero po wyborze k (dla odległości i kolejności)
+        lo = kth * (1 - SPHERE_ERROR) / (1 + SPHERE_ERROR)
+        if max_km is not None:
+            lo = min(lo, max_km * (1 - SPHERE_ERROR))
+        exact = dist >= lo
+        self._refine(center, idx, dist, exact)
+        if max_km is not None:
+            keep = dist <= max_km
+            idx, dist, exact = idx[keep], dist[keep], exact[keep]
+        # najpierw pewne (bliżej niż lo), potem najbliższe z granicznych
+        top = np.lexsort((dist, exact))[:k]
+        idx, dist, exact = idx[top], dist[top], exact[top]
+        self._refine(center, idx, dist, ~exact)
+        return self._sorted(idx, dist)
+
+    def _sorted(self, idx: np.ndarray, dist: np.ndarray) -> List[Tuple[float, Station]]:
+        order = np.argsort(dist, kind="stable")
+        return [(float(dist[o]), self.stations[int(idx[o])]) for o in order]
+
 
-def geocode(q: str) -> Tuple[float, float]:
-    geolocator = Nominatim(user_agent="polair_app")
-    loc = geolocator.geocode(q)
-    if not loc:
-        raise ValueError(f"Nie znaleziono lokalizacji: {q}")
-    return (loc.latitude, loc.longitude)
-
-def nearest_within(stations: Iterable[Station], center: Tuple[float, float], radius_km: float) -> List[Station]:
-    lat0, lon0 = center
-    out = []
-    for s in stations:
-        d = geodesic((s.lat, s.lon), (lat0, lon0)).km
-        if d <= radius_km:
-            out.append((d, s))
-    out.sort(key=lambda t: t[0])
-    return [s for _, s in out]
+def nearest_within(stations: Iterable[Station] | StationIndex, center: Tuple[float, float],
+                   radius_km: float) -> List[Station]:
+    """Stacje w promieniu radius_km od center, od najbliższej. Przy wielu zapytaniach podaj StationIndex."""
+    index = stations if isinstance(stations, StationIndex) else StationIndex(stations)
+    return [s for _, s in index.within(center, radius_km)]
@@ -0,0 +1,238 @@
+"""
+Interpolacja przestrzenna stężeń między stacjami: IDW i kriging zwyczajny na regularnej siatce.
+
+Interpolator buduje się raz dla zbioru stacji i siatki (domyślnie Polska co GRID_STEP_KM km):
+zapamiętuje dla każdej komórki CANDIDATES najbliższych stacji (geo.nearest_k) i macierz odległości
+stacja–stacja. Co godzinę zmieniają się tylko wartości i to, które stacje je mają – wtedy z gotowych
+list wybieramy k najbliższych stacji z wartością, wagi IDW liczymy wektorowo dla całej siatki,
+a kriging rozwiązuje naraz (np.linalg.solve na stosie macierzy) małe układy k+1 równań.
+
+Wynik to Surface (siatka + tablica wartości), którą map.render_map pokazuje jako heatmapę.
+"""
+from __future__ import annotations
+import math
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Optional, Sequence
+import numpy as np
+from polair import geo, repository
+from polair.utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+POLAND_BBOX = (49.0, 54.9, 14.1, 24.2)     # lat_min, lat_max, lon_min, lon_max
+GRID_STEP_KM = env_int("POLAIR_GRID_STEP_KM", 10)
+NEIGHBOURS = 12         # stacji z wartością użytych dla komórki
+CANDIDATES = 24         # zapamiętanych najbliższych stacji na komórkę (zapas na brakujące pomiary)
+MAX_KM = 60.0           # komórki dalej od najbliższej stacji są poza zasięgiem (NaN) – np. morze, zagranica
+METHODS = ("idw", "kriging")
+
+
+@dataclass(frozen=True, eq=False)
+class Grid:
+    """Regularna siatka; lats/lons to środki komórek (rosnąco)."""
+    lats: np.ndarray
+    lons: np.ndarray
+
+    @classmethod
+    def regular(cls, bbox: Sequence[float] = POLAND_BBOX, step_km: float = GRID_STEP_KM) -> "Grid":
+        lat0, lat1, lon0, lon1 = bbox
+        dlat = step_km / geo.KM_PER_DEG
+        dlon = dlat / math.cos(math.radians((lat0 + lat1) / 2))
+        return cls(np.arange(lat0 + dlat / 2, lat1, dlat), np.arange(lon0 + dlon / 2, lon1, dlon))
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.lats.size, self.lons.size
+
+    @property
+    def points(self) -> np.ndarray:
+        """Środki komórek (ny * nx, 2) jako (lat, lon), wierszami siatki."""
+        lat, lon = np.meshgrid(self.lats, self.lons, indexing="ij")
+        return np.column_stack([lat.ravel(), lon.ravel()])
+
+
+@dataclass(frozen=True)
+class Variogram:
+    """Wariogram wykładniczy: nugget + sill * (1 - exp(-3h / range_km)); 0 dla h = 0."""
+    nugget: float
+    sill: float
+    range_km: float
+
+    def __call__(self, h) -> np.ndarray:
+        h = np.asarray(h, dtype=np.float64)
+        return np.where(h > 0, self.nugget + self.sill * (1 - np.exp(-3 * h / self.range_km)), 0.0)
+
+
+def fit_variogram(station_km: np.ndarray, values: np.ndarray, bins: int = 12,
+                  max_km: Optional[float] = None) -> Variogram:
+    """
+    Dopasowanie wariogramu do wartości z jednej godziny: empiryczny semiwariogram w przedziałach
+    odległości, potem dla siatki zasięgów nugget i sill z ważonej MNK (wagi = liczba par).
+    """
+    ok = ~np.isnan(values)
+    v = values[ok]
+    var = float(np.var(v)) if v.size else 0.0
+    if v.size < 3 or var == 0:
+        return Variogram(0.0, max(var, 1e-9), 100.0)
+    i, j = np.triu_indices(v.size, 1)
+    h = station_km[np.ix_(ok, ok)][i, j]
+    g = 0.5 * (v[i] - v[j]) ** 2
+    max_km = max_km or float(h.max()) / 2
+    keep = (h > 0) & (h <= max_km)
+    which = np.minimum((h[keep] / max_km * bins).astype(np.int64), bins - 1)
+    counts = np.bincount(which, minlength=bins).astype(np.float64)
+    used = counts > 0
+    if used.sum() < 2:
+        return Variogram(0.0, var, max_km)
+    hb = (np.bincount(which, h[keep], bins)[used] / counts[used])
+    gb = (np.bincount(which, g[keep], bins)[used] / counts[used])
+    w = np.sqrt(counts[used])
+    best, best_err = Variogram(0.0, var, max_km), np.inf
+    for r in np.linspace(max_km / bins, 2 * max_km, 40):
+        f = 1 - np.exp(-3 * hb / r)
+        (nugget, sill), *_ = np.linalg.lstsq(np.column_stack([np.ones_like(f), f]) * w[:, None], gb * w, rcond=None)
+        if nugget < 0:
+            nugget, sill = 0.0, float(np.dot(w * f, w * gb) / np.dot(w * f, w * f))
+        if sill <= 0:
+            continue
+        err = float(np.sum((w * (nugget + sill * f - gb)) ** 2))
+        if err < best_err:
+            best, best_err = Variogram(float(nugget), float(sill), float(r)), err
+    return best
+
+
+@dataclass
+class Surface:
+    """Wynik interpolacji: values ma kształt grid.shape, NaN – poza zasięgiem stacji."""
+    grid: Grid
+    values: np.ndarray
+    param: str = ""
+    method: str = "idw"
+    at: Optional[datetime] = None
+    stations: int = 0
+    variogram: Optional[Variogram] = field(default=None, repr=False)
+
+    def to_heatmap(self, scale: Optional[float] = None) -> list[list[float]]:
+        """[[lat, lon, waga], ...] dla folium.plugins.HeatMap; waga = wartość / scale (domyślnie maksimum)."""
+        pts = self.grid.points
+        vals = self.values.ravel()
+        ok = ~np.isnan(vals)
+        if not ok.any():
+            return []
+        scale = scale or float(vals[ok].max()) or 1.0
+        return np.column_stack([pts[ok], vals[ok] / scale]).tolist()
+
+    def value_at(self, lat: float, lon: float) -> Optional[float]:
+        """Wartość komórki zawierającej punkt (None poza siatką lub zasięgiem)."""
+        i = int(np.abs(self.grid.lats - lat).argmin())
+        j = int(np.abs(self.grid.lons - lon).argmin())
+        v = float(self.values[i, j])
+        return None if math.isnan(v) else v
+
+
+class Interpolator:
+    """Stałe dla zbioru stacji i siatki: listy najbliższych stacji komórek i odległości stacja–stacja."""
+
+    def __init__(self, station_ids: Sequence[int], coords, grid: Optional[Grid] = None, k: int = NEIGHBOURS,
+                 candidates: int = CANDIDATES, max_km: Optional[float] = MAX_KM, power: float = 2.0):
+        self.station_ids = np.asarray(station_ids, dtype=np.int64)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.grid = grid or Grid.regular()
+        self.k, self.power = k, power
+        self._pos = {int(sid): i for i, sid in enumerate(self.station_ids.tolist())}
+        self.nbr, self.nbr_km = geo.nearest_k(self.grid.points, self.coords, max(k, candidates))
+        self.inside = (self.nbr_km[:, 0] <= max_km if max_km is not None and self.nbr.shape[1]
+                       else np.full(self.nbr.shape[0], bool(self.nbr.shape[1])))
+        self.station_km = geo.distance_matrix(self.coords, self.coords)
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection, grid: Optional[Grid] = None, **kw) -> "Interpolator":
+        index = geo.StationIndex.from_db(conn)
+        return cls([s.id for s in index.stations], index.coords, grid, **kw)
+
+    def align(self, rows: Iterable[Sequence]) -> np.ndarray:
+        """
+        Wiersze (station_id, lat, lon, value, ...) – np. z repository.latest_values – jako tablica
+        wartości w kolejności stacji interpolatora (NaN – brak); kilka czujników stacji jest uśrednianych.
+        """
+        total = np.zeros(len(self.station_ids))
+        count = np.zeros(len(self.station_ids))
+        for row in rows:
+            i = self._pos.get(int(row[0]))
+            if i is not None and row[3] is not None:
+                total[i] += row[3]
+                count[i] += 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    def _select(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Dla każdej komórki k najbliższych stacji z wartością: (indeksy, km, czy jest wartość)."""
+        avail = ~np.isnan(values)[self.nbr]
+        order = np.argsort(~avail, axis=1, kind="stable")[:, :self.k]   # stabilnie: z wartością, od najbliższej
+        return (np.take_along_axis(self.nbr, order, axis=1), np.take_along_axis(self.nbr_km, order, axis=1),
+                np.take_along_axis(avail, order, axis=1))
+
+    def idw(self, values: np.ndarray, power: Optional[float] = None) -> np.ndarray:
+        """Odwrotne ważenie odległością; wynik płaski (ny * nx)."""
+        sel, km, ok = self._select(values)
+        w = np.where(ok, 1.0 / np.maximum(km, 1e-3) ** (power or self.power), 0.0)
+        num = (w * np.where(ok, values[sel], 0.0)).sum(axis=1)
+        den = w.sum(axis=1)
+        out = np.full(den.shape, np.nan)
+        good = (den > 0) & self.inside
+        out[good] = num[good] / den[good]
+        return out
+
+    def kriging(self, values: np.ndarray, variogram: Optional[Variogram] = None) -> tuple[np.ndarray, Variogram]:
+        """Kriging zwyczajny z k najbliższych stacji; zwraca (wynik płaski, użyty wariogram)."""
+        variogram = variogram or fit_variogram(self.station_km, values)
+        sel, km, ok = self._select(values)
+        n, k = sel.shape
+        valid = ok.any(axis=1) & self.inside
+        sel, km, ok = sel[valid], km[valid], ok[valid]
+        both = ok[:, :, None] & ok[:, None, :]
+        a = np.zeros((sel.shape[0], k + 1, k + 1))
+        a[:, :k, :k] = np.where(both, variogram(self.station_km[sel[:, :, None], sel[:, None, :]]), 0.0)
+        # stacje bez wartości: równanie lambda_i = 0; mała poprawka na przekątnej chroni przed osobliwością
+        eye = np.eye(k, dtype=bool)[None]
+        a[:, :k, :k] += np.where(eye & ~ok[:, :, None], 1.0, 0.0) + eye * (1e-9 * (variogram.nugget + variogram.sill))
+        a[:, :k, k] = a[:, k, :k] = ok
+        b = np.zeros((sel.shape[0], k + 1))
+        b[:, :k] = np.where(ok, variogram(km), 0.0)
+        b[:, k] = 1.0
+        lam = np.linalg.solve(a, b[:, :, None])[:, :k, 0]
+        out = np.full(n, np.nan)
+        out[valid] = np.maximum((lam * np.where(ok, values[sel], 0.0)).sum(axis=1), 0.0)
+        return out, variogram
+
+    def surface(self, values: np.ndarray, param: str = "", method: str = "idw",
+                at: Optional[datetime] = None) -> Surface:
+        if method not in METHODS:
+            raise ValueError(f"nieznana metoda interpolacji: {method} (dostępne: {', '.join(METHODS)})")
+        variogram = None
+        if method == "idw":
+            flat = self.idw(values)
+        else:
+            flat, variogram = self.kriging(values)
+        return Surface(self.grid, flat.reshape(self.grid.shape), param, method, at,
+                       int(np.count_nonzero(~np.isnan(values))), variogram)
+
+
+def latest_surfaces(conn: sqlite3.Connection, params: Iterable[str], at: datetime | str | None = None,
+                    method: str = "idw", interpolator: Optional[Interpolator] = None,
+                    max_age_hours: int = 3) -> dict[str, Surface]:
+    """
+    Powierzchnie ostatnich wartości (repository.latest_values) dla kilku parametrów naraz.
+    Ten sam interpolator (siatka i sąsiedzi) służy wszystkim parametrom – warto go trzymać między godzinami.
+    """
+    interp = interpolator or Interpolator.from_db(conn)
+    at_dt = at if isinstance(at, datetime) or at is None else datetime.fromisoformat(at)
+    out = {}
+    for param in params:
+        values = interp.align(repository.latest_values(conn, param, at, max_age_hours))
+        if np.isnan(values).all():
+            logger.info("Interpolacja %s: brak aktualnych pomiarów", param)
+        out[param] = interp.surface(values, param, method, at_dt)
+    return out
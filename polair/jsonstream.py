@@ -0,0 +1,111 @@
+"""
+Przyrostowe dekodowanie dużych odpowiedzi JSON (bez wczytywania całego dokumentu).
+
+Odpowiedź archiwum ma postać {"Lista archiwalnych wyników pomiarów": [...], "totalPages": ...,
+"links": {...}}. StreamedObject czyta strumień bajtów porcjami i zwraca elementy wskazanej
+tablicy po jednym (json.JSONDecoder.raw_decode na buforze), a pozostałe – małe – pola
+obiektu najwyższego poziomu odkłada do `meta`. W pamięci jest tylko bieżąca porcja danych.
+"""
+from __future__ import annotations
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+_WS = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+class StreamedObject:
+    """
+    Elementy tablicy `key` z obiektu JSON czytanego ze strumienia `chunks` (bajty).
+    Iterować można raz; po wyczerpaniu iteratora `meta` zawiera pozostałe pola obiektu.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], key: str):
+        self.key = key
+        self.meta: dict[str, Any] = {}
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._started = False
+
+    # --- bufor
+
+    def _more(self) -> bool:
+        """Dokłada kolejną porcję do bufora; False na końcu strumienia."""
+        if self._eof:
+            return False
+        if self._pos > 65536:
+            self._buf, self._pos = self._buf[self._pos:], 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            if text:
+                self._buf += text
+                return True
+        self._buf += self._utf8.decode(b"", final=True)
+        self._eof = True
+        return True
+
+    def _skip(self, extra: str = "") -> str:
+        """Pomija białe znaki (i znaki z `extra`); zwraca następny znak ('' na końcu)."""
+        while True:
+            self._pos = _WS.match(self._buf, self._pos).end()
+            while self._pos < len(self._buf) and self._buf[self._pos] in extra:
+                self._pos = _WS.match(self._buf, self._pos + 1).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more():
+                return ""
+
+    def _expect(self, ch: str) -> None:
+        if self._skip() != ch:
+            raise ValueError(f"JSON: oczekiwano {ch!r} na pozycji {self._pos}")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        """Dekoduje jedną wartość; przy niepełnym buforze dociąga dane i próbuje ponownie."""
+        self._skip()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._more():
+                    continue
+                raise
+            # liczba/literał na samym końcu bufora może być ucięty – upewniamy się, że to koniec
+            if end == len(self._buf) and not self._eof and self._more():
+                continue
+            self._pos = end
+            return value
+
+    # --- dokument
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._started:
+            raise RuntimeError("StreamedObject można przejść tylko raz")
+        self._started = True
+        self._expect("{")
+        while True:
+            ch = self._skip(",")
+            if ch == "}":
+                self._pos += 1
+                return
+            if ch != '"':
+                raise ValueError(f"JSON: oczekiwano klucza na pozycji {self._pos}")
+            name = self._value()
+            self._expect(":")
+            if name == self.key and self._skip() == "[":
+                self._pos += 1
+                while True:
+                    ch = self._skip(",")
+                    if ch == "]":
+                        self._pos += 1
+                        break
+                    if not ch:
+                        raise ValueError("JSON: nieoczekiwany koniec tablicy")
+                    yield self._value()
+            else:
+                self.meta[name] = self._value()
@@ -1,17 +1,160 @@
+"""
+Mapa stacji (folium/Leaflet).
+
+Tryb "markers" – jeden CircleMarker na stację (dawne zachowanie). Tryb "geojson" – wszystkie
+stacje jako jedna warstwa GeoJSON z klastrowaniem po stronie przeglądarki (Leaflet.markercluster),
+kolorami wg kategorii indeksu jakości powietrza i okienkami budowanymi w JS z właściwości
+obiektów. Szablon HTML mapy w tym trybie renderujemy przez folium raz i trzymamy w pamięci;
+kolejne mapy (np. po zmianie filtra) to tylko wstawienie JSON-a w gotowy tekst.
+"""
 from __future__ import annotations
+import json
+from functools import lru_cache
+from typing import Iterable, Mapping, Optional, Sequence
 import folium
+from folium.elements import JSCSSMixin
+from folium.plugins import HeatMap, MarkerCluster
+from folium.template import Template
+from branca.element import MacroElement
+
+CENTER = (52.0, 19.0)
+ZOOM = 6
+
+# kolory kategorii indeksu jakości powietrza GIOŚ
+AQ_COLORS = {
+    "Bardzo dobry": "#57b108",
+    "Dobry": "#b0dd10",
+    "Umiarkowany": "#ffd911",
+    "Dostateczny": "#e58100",
+    "Zły": "#e50000",
+    "Bardzo zły": "#990000",
+}
+NO_INDEX_COLOR = "#808080"
+_COLORS = {k.casefold(): v for k, v in AQ_COLORS.items()}
+
+_STATIONS = "__POLAIR_STATIONS__"
+_HEAT = "__POLAIR_HEAT__"
+
+
+def category_color(category: Optional[str]) -> str:
+    return _COLORS.get((category or "").strip().casefold(), NO_INDEX_COLOR)
+
+
+def heatmap_layer(surface, name: str | None = None, radius: int = 18) -> HeatMap:
+    """Warstwa heatmapy z interpolate.Surface (wagi względem maksimum powierzchni)."""
+    label = name or f"{surface.param} ({surface.method})".strip()
+    return HeatMap(surface.to_heatmap(), name=label, radius=radius, blur=radius, min_opacity=0.2)
+
+
+class _StationLayer(JSCSSMixin, MacroElement):
+    """Skrypt warstwy stacji; dane wstawiane później w miejsce _STATIONS/_HEAT."""
+    default_js = MarkerCluster.default_js + HeatMap.default_js
+    default_css = MarkerCluster.default_css
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var stations = """ + _STATIONS + """;
+            var heat = """ + _HEAT + """;
+            if (heat) {
+                L.heatLayer(heat.points, {radius: 18, blur: 18, minOpacity: 0.2}).addTo(map);
+            }
+            var cluster = L.markerClusterGroup({chunkedLoading: true, disableClusteringAtZoom: 10});
+            L.geoJSON(stations, {
+                pointToLayer: function (f, latlng) {
+                    return L.circleMarker(latlng, {radius: 7, weight: 1, color: "#333",
+                                                   fillColor: f.properties.color, fillOpacity: 0.9});
+                },
+                onEachFeature: function (f, layer) {
+                    var p = f.properties, div = document.createElement("div"), b = document.createElement("b");
+                    b.textContent = p.name;
+                    div.appendChild(b);
+                    [p.city, p.category && ("Indeks: " + p.category), p.info].forEach(function (t) {
+                        if (t) { div.appendChild(document.createElement("br")); div.appendChild(document.createTextNode(t)); }
+                    });
+                    layer.bindPopup(div);
+                }
+            }).addTo(cluster);
+            map.addLayer(cluster);
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self):
+        super().__init__()
+        self._name = "PolairStations"
+
+
+@lru_cache(maxsize=8)
+def _template(center: tuple[float, float] = CENTER, zoom: int = ZOOM) -> str:
+    """HTML mapy z miejscami na dane – folium renderujemy raz na (środek, zoom)."""
+    m = folium.Map(location=list(center), zoom_start=zoom)
+    _StationLayer().add_to(m)
+    return m.get_root().render()
+
+
+def stations_geojson(items: Iterable[Sequence], categories: Optional[Mapping[int, str]] = None,
+                     info: Optional[Mapping[int, str]] = None) -> dict:
+    """FeatureCollection stacji (id, nazwa, miasto, lat, lon) z kategorią indeksu, kolorem i opisem do okienka."""
+    features = []
+    for id_, name, city, lat, lon in items:
+        cat = _lookup(categories, id_)
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(float(lon), 6), round(float(lat), 6)]},
+            "properties": {"id": id_, "name": str(name), "city": str(city or ""), "category": cat,
+                           "color": category_color(cat), "info": _lookup(info, id_)},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _lookup(mapping: Optional[Mapping], id_):
+    """Wartość dla id stacji – w Treeview id bywa tekstem, w bazie liczbą."""
+    if not mapping:
+        return None
+    if id_ in mapping:
+        return mapping[id_]
+    try:
+        return mapping.get(int(id_))
+    except (TypeError, ValueError):
+        return None
+
+
+def _js(data) -> str:
+    # JSON wstawiany do <script> – "</" nie może zamknąć znacznika
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+
 
+def render_map(items, surface=None, outfile: str = "map.html", mode: str = "markers",
+               categories: Optional[Mapping[int, str]] = None, info: Optional[Mapping[int, str]] = None) -> str:
+    """
+    Zapisuje mapę stacji (id, nazwa, miasto, lat, lon) do `outfile` i zwraca ścieżkę.
+    mode="geojson" – lekka mapa z klastrowaniem i kolorami kategorii indeksu (categories: id stacji -> kategoria,
+    info: id stacji -> dodatkowy tekst okienka, np. ostatnie pomiary); surface – heatmapa z polair.interpolate.
+    """
+    if mode == "geojson":
+        heat = {"points": surface.to_heatmap()} if surface is not None else None
+        # najpierw heatmapa (same liczby): nazwy stacji mogłyby zawierać tekst znacznika
+        html = _template().replace(_HEAT, _js(heat), 1)
+        html = html.replace(_STATIONS, _js(stations_geojson(items, categories, info)), 1)
+        with open(outfile, "w", encoding="utf-8") as f:
+            f.write(html)
+        return outfile
+    if mode != "markers":
+        raise ValueError(f"nieznany tryb mapy: {mode} (dostępne: markers, geojson)")
 
-def render_map(items):
-    m = folium.Map(location=[52.0, 19.0], zoom_start=6)
+    m = folium.Map(location=list(CENTER), zoom_start=ZOOM)
+    if surface is not None:
+        heatmap_layer(surface).add_to(m)
+        folium.LayerControl().add_to(m)
     for id_, name, city, lat, lon in items:
+        cat = _lookup(categories, id_)
         folium.CircleMarker(
             location=[float(lat), float(lon)],
             popup=f"{name} ({city})",
             radius=6,
-            color="blue",
+            color=category_color(cat) if categories else "blue",
             fill=True
         ).add_to(m)
-    outfile = "map.html"
     m.save(outfile)
     return outfile
@@ -0,0 +1,165 @@
+"""
+Szybkie parsowanie pomiarów z odpowiedzi GIOŚ.
+
+Znaczniki czasu w API mają stały format "YYYY-MM-DD HH:MM:SS", więc zamiast
+datetime.strptime (wolny, ogólny parser formatu) rozbijamy tekst po pozycjach:
+część z datą i część z godziną zamieniamy na liczby raz na każdą różną wartość
+(cache), a znacznik składamy arytmetycznie. Każdy wiersz parsujemy dokładnie raz.
+
+Obsługiwane kształty odpowiedzi:
+  - data/getData:   {"Lista danych pomiarowych": [{"Data", "Wartość"}, ...]}
+  - archiwum:       {"Lista archiwalnych wyników pomiarów": [...]} (jak wyżej)
+  - lista wierszy:  [{"Data", "Wartość"}, ...]
+  - stary format:   [{"id", "key", "values": [{"date", "value"}, ...]}, ...]
+"""
+from __future__ import annotations
+from array import array
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from polair import db
+from polair.models import Measurement
+
+DATA_KEYS = ("Lista danych pomiarowych", "Lista archiwalnych wyników pomiarów")
+
+# cache części daty ("YYYY-MM-DD") i godziny ("HH:MM:SS"): tekst -> (sekundy, składowe);
+# w typowej odpowiedzi jest kilka dni i 24 godziny, więc prawie każdy wiersz to dwa trafienia w słownik
+_days: dict[str, tuple[int, tuple[int, int, int]]] = {}
+_times: dict[str, tuple[int, tuple[int, int, int]]] = {}
+_CACHE_MAX = 100_000
+
+
+def _day(day: str) -> tuple[int, tuple[int, int, int]]:
+    hit = _days.get(day)
+    if hit is None:
+        if len(day) != 10 or day[4] != "-" or day[7] != "-":
+            raise ValueError(day)
+        # datetime() sprawdza poprawność daty (np. 2025-02-30)
+        ymd = (int(day[:4]), int(day[5:7]), int(day[8:10]))
+        hit = (db.to_epoch(datetime(*ymd)), ymd)
+        if len(_days) >= _CACHE_MAX:
+            _days.clear()
+        _days[day] = hit
+    return hit
+
+
+def _time(tod: str) -> tuple[int, tuple[int, int, int]]:
+    hit = _times.get(tod)
+    if hit is None:
+        if len(tod) != 8 or tod[2] != ":" or tod[5] != ":":
+            raise ValueError(tod)
+        hms = (int(tod[:2]), int(tod[3:5]), int(tod[6:8]))
+        if not (0 <= hms[0] < 24 and 0 <= hms[1] < 60 and 0 <= hms[2] < 60):
+            raise ValueError(tod)
+        hit = (hms[0] * 3600 + hms[1] * 60 + hms[2], hms)
+        if len(_times) >= _CACHE_MAX:
+            _times.clear()
+        _times[tod] = hit
+    return hit
+
+
+def parse_ts(s: Any) -> Optional[int]:
+    """'YYYY-MM-DD HH:MM:SS' (lub z 'T') -> sekundy epoki; inne formaty ISO przez fromisoformat; błąd -> None."""
+    try:
+        if len(s) == 19 and s[10] in " T":
+            return _day(s[:10])[0] + _time(s[11:])[0]
+        return db.to_epoch(datetime.fromisoformat(s))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_dt(s: Any) -> Optional[datetime]:
+    try:
+        if len(s) == 19 and s[10] in " T":
+            return datetime(*_day(s[:10])[1], *_time(s[11:])[1])
+        return db.from_epoch(db.to_epoch(datetime.fromisoformat(s)))
+    except (TypeError, ValueError):
+        return None
+
+
+def _value(v: Any) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_raw(data: Any, sensor_id: Optional[int] = None) -> Iterator[Tuple[Optional[int], Any, Any]]:
+    """(sensor_id, tekst daty, surowa wartość) dla każdego wiersza – niezależnie od kształtu odpowiedzi."""
+    if isinstance(data, dict):
+        rows = next((data[k] for k in DATA_KEYS if k in data), None)
+        data = rows if rows is not None else [data]
+    if not isinstance(data, list):
+        return
+    for rec in data:
+        if not isinstance(rec, dict):
+            continue
+        if "values" in rec:
+            sid = rec.get("id") or sensor_id
+            for v in rec.get("values") or []:
+                if isinstance(v, dict):
+                    yield sid, v.get("date"), v.get("value")
+        elif "Data" in rec:
+            yield sensor_id, rec["Data"], rec.get("Wartość")
+
+
+def parse_row(rec: Any, sensor_id: Optional[int] = None) -> Optional[Measurement]:
+    """Jeden wiersz {"Data", "Wartość"} -> Measurement; None, gdy brak wartości lub błędna data."""
+    if not isinstance(rec, dict):
+        return None
+    val = _value(rec.get("Wartość"))
+    if val is None:
+        return None
+    dt = parse_dt(rec.get("Data"))
+    return None if dt is None else Measurement(sensor_id=sensor_id, dt=dt, value=val)
+
+
+def iter_parse(rows: Iterable[Any], sensor_id: Optional[int] = None) -> Iterator[Measurement]:
+    """Jak parse(), ale leniwie – dla dowolnego iterowalnego źródła wierszy (np. jsonstream)."""
+    for rec in rows:
+        m = parse_row(rec, sensor_id)
+        if m is not None:
+            yield m
+
+
+def parse(data: Any, sensor_id: Optional[int] = None) -> List[Measurement]:
+    """Measurement-y z prawdziwymi datetime; pomija wiersze bez wartości lub z błędną datą."""
+    out = []
+    for sid, d, v in iter_raw(data, sensor_id):
+        val = _value(v)
+        if val is None:
+            continue
+        dt = parse_dt(d)
+        if dt is None:
+            continue
+        out.append(Measurement(sensor_id=sid, dt=dt, value=val))
+    return out
+
+
+def parse_arrays(data: Any, keep_missing: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (ts int64, values float64) bez tworzenia obiektów na wiersz. Wiersze z błędną datą
+    są pomijane; brak wartości -> pomijany albo NaN (keep_missing=True).
+    """
+    ts, vs = array("q"), array("d")
+    nan = float("nan")
+    for _, d, v in iter_raw(data):
+        val = _value(v)
+        if val is None and not keep_missing:
+            continue
+        t = parse_ts(d)
+        if t is None:
+            continue
+        ts.append(t)
+        vs.append(nan if val is None else val)
+    return np.frombuffer(ts, dtype=np.int64), np.frombuffer(vs, dtype=np.float64)
+
+
+def parse_series(data: Any, sensor_id: Optional[int] = None, keep_missing: bool = False):
+    from polair.series import MeasurementSeries
+    ts, vs = parse_arrays(data, keep_missing)
+    if sensor_id is None:
+        sensor_id = next((sid for sid, _, _ in iter_raw(data) if sid is not None), None)
+    return MeasurementSeries(ts, vs, sensor_id)
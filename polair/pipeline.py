@@ -0,0 +1,168 @@
+"""
+Równoległy backfill archiwum wielu czujników.
+
+Trzy etapy:
+  1. pobieranie – wątki (I/O, GIL zwalniany na gniazdach) ściągają surowe bajty stron,
+  2. dekodowanie – pula procesów zamienia bajty na tablice (json + polair.parsing),
+     więc parsowanie nie blokuje wątków pobierających,
+  3. zapis – jeden wątek (wywołujący) zapisuje wiersze do SQLite.
+
+Liczba zadań w locie jest ograniczona, a po każdym etapie zbierane są metryki
+(liczba zadań, bajty/wiersze, czas pracy), żeby dobrać liczbę wątków i procesów.
+"""
+from __future__ import annotations
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Deque, Iterable, Optional
+import numpy as np
+from polair import api, archive, parsing, repository
+from polair.utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+IO_WORKERS = env_int("POLAIR_PIPELINE_IO_WORKERS", 16)
+PARSE_WORKERS = env_int("POLAIR_PIPELINE_PARSE_WORKERS", max(1, (os.cpu_count() or 2) - 1))
+PAGE_SIZE = env_int("POLAIR_PIPELINE_PAGE_SIZE", 1000)
+REPORT_EVERY = 30.0  # s – okresowy raport metryk w logu
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    tasks: int = 0
+    rows: int = 0
+    bytes: int = 0
+    busy: float = 0.0          # suma czasu pracy wszystkich wykonawców etapu [s]
+    errors: int = 0
+
+    def record(self, seconds: float, rows: int = 0, nbytes: int = 0) -> None:
+        self.tasks += 1
+        self.rows += rows
+        self.bytes += nbytes
+        self.busy += seconds
+
+    def utilization(self, wall: float) -> float:
+        """Średnie obciążenie wykonawców etapu (1.0 – wszyscy zajęci przez cały czas)."""
+        return self.busy / (wall * self.workers) if wall > 0 and self.workers else 0.0
+
+
+@dataclass
+class PipelineMetrics:
+    download: StageStats
+    parse: StageStats
+    write: StageStats
+    started: float = field(default_factory=time.perf_counter)
+    finished: Optional[float] = None
+
+    @property
+    def wall(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def report(self) -> str:
+        wall = self.wall
+        lines = [f"czas: {wall:.1f} s, zapisano {self.write.rows} wierszy ({self.write.rows / wall if wall else 0:,.0f}/s)"]
+        for st in (self.download, self.parse, self.write):
+            lines.append(
+                f"  {st.name:<10} wykonawców {st.workers:>3}  zadań {st.tasks:>6}  wierszy {st.rows:>9}  "
+                f"MB {st.bytes / 2**20:>8.1f}  obciążenie {st.utilization(wall):5.0%}  błędów {st.errors}")
+        return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class _Page:
+    sensor_id: int
+    start: object
+    end: object
+    page: int
+
+
+def _decode(payload: bytes, sensor_id: int, page: int) -> tuple[int, np.ndarray, np.ndarray, int, bool]:
+    """Etap 2 (w procesie potomnym): bajty -> (sensor_id, ts, values, totalPages lub 0, czy jest następna strona)."""
+    data = json.loads(payload)
+    rows, more = api._archival_page(data, page)
+    ts, vs = parsing.parse_arrays(rows)
+    return sensor_id, ts, vs, int(data.get("totalPages") or 0), more
+
+
+def _download(client: api.GiosClient, p: _Page, page_size: int) -> tuple[bytes, float]:
+    t0 = time.perf_counter()
+    payload = client.get_archival_raw(p.sensor_id, p.start, p.end, page=p.page, size=page_size)
+    return payload, time.perf_counter() - t0
+
+
+def _timed_decode(payload: bytes, sensor_id: int, page: int):
+    t0 = time.perf_counter()
+    res = _decode(payload, sensor_id, page)
+    return res, time.perf_counter() - t0
+
+
+def backfill_many(conn: sqlite3.Connection, sensor_ids: Iterable[int], date_from, date_to,
+                  io_workers: int = IO_WORKERS, parse_workers: int = PARSE_WORKERS,
+                  page_size: int = PAGE_SIZE, chunk_days: int = archive.CHUNK_DAYS,
+                  client: api.GiosClient | None = None) -> PipelineMetrics:
+    """
+    Archiwum wielu czujników z [date_from, date_to] do bazy. parse_workers=0 – dekodowanie
+    w wątkach zamiast procesów (np. na maszynie z jednym rdzeniem). Zwraca metryki etapów.
+    """
+    client = client or api.get_client()
+    windows = archive.split_range(date_from, date_to, timedelta(days=chunk_days))
+    todo: Deque[_Page] = deque(_Page(int(sid), s, e, 0) for sid in sensor_ids for s, e in windows)
+    metrics = PipelineMetrics(StageStats("pobieranie", io_workers), StageStats("dekodowanie", max(1, parse_workers)),
+                              StageStats("zapis", 1))
+    # ograniczenie pamięci: nie więcej stron w locie (pobieranych + dekodowanych) niż to
+    max_inflight = io_workers + 2 * max(1, parse_workers)
+
+    io = ThreadPoolExecutor(max_workers=max(1, io_workers), thread_name_prefix="polair-pipeline-io")
+    # forkserver/spawn zamiast fork: fork procesu z działającymi wątkami pobierającymi grozi zakleszczeniem
+    ctx = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                                      else "spawn")
+    cpu = (ProcessPoolExecutor(max_workers=parse_workers, mp_context=ctx) if parse_workers > 0
+           else ThreadPoolExecutor(max_workers=1, thread_name_prefix="polair-pipeline-parse"))
+    pending: dict[Future, tuple[str, _Page]] = {}
+    last_report = time.perf_counter()
+    try:
+        while todo or pending:
+            while todo and len(pending) < max_inflight:
+                p = todo.popleft()
+                pending[io.submit(_download, client, p, page_size)] = ("download", p)
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, p = pending.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    (metrics.download if stage == "download" else metrics.parse).errors += 1
+                    logger.warning("Archiwum czujnika %s (%s – %s, strona %d): %s", p.sensor_id, p.start, p.end, p.page, e)
+                    continue
+                if stage == "download":
+                    payload, seconds = res
+                    metrics.download.record(seconds, nbytes=len(payload))
+                    pending[cpu.submit(_timed_decode, payload, p.sensor_id, p.page)] = ("parse", p)
+                    continue
+                (sid, ts, vs, total_pages, more), seconds = res
+                metrics.parse.record(seconds, rows=len(ts))
+                if p.page == 0 and total_pages > 1:
+                    # znana liczba stron – pozostałe pobieramy od razu równolegle
+                    todo.extend(_Page(p.sensor_id, p.start, p.end, n) for n in range(1, total_pages))
+                elif not total_pages and more and len(ts):
+                    todo.append(_Page(p.sensor_id, p.start, p.end, p.page + 1))
+                t0 = time.perf_counter()
+                n = repository.upsert_measurement_rows(conn, zip([sid] * len(ts), ts.tolist(), vs.tolist()))
+                metrics.write.record(time.perf_counter() - t0, rows=n)
+            if time.perf_counter() - last_report >= REPORT_EVERY:
+                last_report = time.perf_counter()
+                logger.info("Backfill w toku:\n%s", metrics.report())
+    finally:
+        io.shutdown(wait=True, cancel_futures=True)
+        cpu.shutdown(wait=True, cancel_futures=True)
+        metrics.finished = time.perf_counter()
+    logger.info("Backfill zakończony:\n%s", metrics.report())
+    return metrics
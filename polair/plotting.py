@@ -15,10 +15,16 @@ from __future__ import annotations
 #     return fig, ax
 
 def plot_series(measurements, title="Pomiary"):
+    """`measurements`: MeasurementSeries albo lista słowników {"dt", "value"}."""
     import matplotlib.pyplot as plt
+    from polair.series import MeasurementSeries
 
-    xs = [m["dt"] for m in measurements if m.get("value") is not None]
-    ys = [m["value"] for m in measurements if m.get("value") is not None]
+    if isinstance(measurements, MeasurementSeries):
+        s = measurements.dropna()
+        xs, ys = s.times, s.values
+    else:
+        xs = [m["dt"] for m in measurements if m.get("value") is not None]
+        ys = [m["value"] for m in measurements if m.get("value") is not None]
 
     fig, ax = plt.subplots()
     ax.plot(xs, ys, marker="o")
@@ -0,0 +1,153 @@
+"""
+Wspólny (procesowy) ogranicznik zapytań do API GIOŚ.
+
+Token bucket (zapytania/s) + limit równoległych zapytań. Tempo jest adaptacyjne:
+spada o połowę przy 429/5xx/błędach sieci i rośnie liniowo przy sukcesach (AIMD).
+Nagłówek Retry-After wstrzymuje wszystkie zapytania do wskazanego momentu.
+"""
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from polair.utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+RATE = env_int("POLAIR_RATE_LIMIT", 10)              # zapytań na sekundę
+MAX_CONCURRENCY = env_int("POLAIR_MAX_CONCURRENCY", 8)
+MIN_RATE = 0.5
+RETRY_AFTER_MAX = 120.0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After jako liczba sekund lub data HTTP; zwraca sekundy albo None."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimiter:
+    def __init__(self, rate: float = RATE, max_concurrency: int = MAX_CONCURRENCY,
+                 burst: float | None = None, min_rate: float = MIN_RATE):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.burst = float(burst or max(1.0, rate))
+        self.max_concurrency = max_concurrency
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = 0
+        self.counters = {"requests": 0, "successes": 0, "throttled": 0, "errors": 0,
+                         "retry_after_pauses": 0, "waited_s": 0.0}
+
+    def reserve(self) -> float:
+        """Rezerwuje jeden token; zwraca czas (s), który trzeba odczekać przed wysłaniem zapytania."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1.0
+            delay = max(-self._tokens / self.rate if self._tokens < 0 else 0.0, self._pause_until - now)
+            self.counters["requests"] += 1
+            self.counters["waited_s"] += delay
+            return delay
+
+    def _enter(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def _exit(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    @contextmanager
+    def slot(self):
+        """Blokuje wątek do czasu, aż wolno wysłać zapytanie (limit tempa i równoległości)."""
+        with self._slots:
+            delay = self.reserve()
+            if delay > 0:
+                time.sleep(delay)
+            self._enter()
+            try:
+                yield
+            finally:
+                self._exit()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Wersja dla asyncio – tempo wspólne z wątkami, równoległość ogranicza semafor klienta."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._enter()
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.counters["successes"] += 1
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        """429/5xx: zmniejsz tempo i – jeśli serwer podał Retry-After – wstrzymaj wszystkie zapytania."""
+        with self._lock:
+            self.counters["throttled"] += 1
+            self._decrease()
+            if retry_after:
+                self.counters["retry_after_pauses"] += 1
+                self._pause_until = max(self._pause_until, time.monotonic() + min(retry_after, RETRY_AFTER_MAX))
+
+    def on_error(self) -> None:
+        with self._lock:
+            self.counters["errors"] += 1
+            self._decrease()
+
+    def _decrease(self) -> None:
+        old = self.rate
+        self.rate = max(self.min_rate, self.rate / 2)
+        if self.rate != old:
+            logger.warning("Ograniczenie tempa zapytań: %.2f -> %.2f/s", old, self.rate)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, rate=self.rate, max_rate=self.max_rate,
+                        in_flight=self._in_flight, max_concurrency=self.max_concurrency)
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
+
+
+def set_limiter(limiter: RateLimiter | None) -> None:
+    global _limiter
+    with _limiter_lock:
+        _limiter = limiter
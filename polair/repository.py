@@ -1,12 +1,15 @@
 from __future__ import annotations
 import sqlite3
-from typing import Iterable, Sequence, List, Optional
-from .models import Station, Sensor, Measurement
+from typing import Iterable, Iterator, Sequence, List, Optional
+from .models import Station, Sensor, Measurement, AirIndex
 from .db import executemany
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import json
+import math
 from . import db
 
-def upsert_stations(conn: sqlite3.Connection, stations: Iterable[Station]) -> None:
+def upsert_stations(conn: sqlite3.Connection, stations: Iterable[Station]) -> int:
     sql = """
     INSERT INTO stations (id, code, name, lat, lon, city_id, city_name, commune, district, province, street)
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -16,10 +19,10 @@ def upsert_stations(conn: sqlite3.Connection, stations: Iterable[Station]) -> No
         commune=excluded.commune, district=excluded.district,
         province=excluded.province, street=excluded.street;
     """
-    rows = [(s.id, s.code, s.name, s.lat, s.lon, s.city_id, s.city_name, s.commune, s.district, s.province, s.street) for s in stations]
-    executemany(conn, sql, rows)
+    rows = ((s.id, s.code, s.name, s.lat, s.lon, s.city_id, s.city_name, s.commune, s.district, s.province, s.street) for s in stations)
+    return executemany(conn, sql, rows)
 
-def upsert_sensors(conn: sqlite3.Connection, sensors: Iterable[Sensor]) -> None:
+def upsert_sensors(conn: sqlite3.Connection, sensors: Iterable[Sensor]) -> int:
     sql = """
     INSERT INTO sensors (id, station_id, param_name, param_formula, param_code, param_id)
     VALUES (?, ?, ?, ?, ?, ?)
@@ -27,55 +30,402 @@ def upsert_sensors(conn: sqlite3.Connection, sensors: Iterable[Sensor]) -> None:
         station_id=excluded.station_id, param_name=excluded.param_name,
         param_formula=excluded.param_formula, param_code=excluded.param_code, param_id=excluded.param_id;
     """
-    rows = [(x.id, x.station_id, x.param_name, x.param_formula, x.param_code, x.param_id) for x in sensors]
-    executemany(conn, sql, rows)
+    rows = ((x.id, x.station_id, x.param_name, x.param_formula, x.param_code, x.param_id) for x in sensors)
+    return executemany(conn, sql, rows)
+
+def upsert_measurements(conn: sqlite3.Connection, ms: Iterable[Measurement], batch_size: int = db.BATCH_SIZE) -> int:
+    """
+    Zapis strumieniowy: `ms` może być generatorem, zapis porcjami po `batch_size` w transakcjach.
+    Wartości niebędące liczbą (np. "" z GUI) zapisujemy jako NULL.
+    """
+    rows = ((m.sensor_id, db.to_epoch(m.dt), _number(m.value)) for m in ms if m.dt is not None)
+    return upsert_measurement_rows(conn, rows, batch_size)
 
-def upsert_measurements(conn: sqlite3.Connection, ms: Iterable[Measurement]) -> None:
+def _number(v) -> Optional[float]:
+    if v is None or isinstance(v, (int, float)):
+        return v
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def upsert_measurement_rows(conn: sqlite3.Connection, rows: Iterable[tuple[int, int, Optional[float]]],
+                            batch_size: int = db.BATCH_SIZE) -> int:
+    """Jak upsert_measurements, ale z gotowych krotek (sensor_id, dt w sekundach epoki, value)."""
     sql = """
     INSERT INTO measurements (sensor_id, dt, value) VALUES (?, ?, ?)
     ON CONFLICT(sensor_id, dt) DO UPDATE SET value=excluded.value;
     """
-    rows = [(m.sensor_id, m.dt.isoformat(), m.value) for m in ms]
-    executemany(conn, sql, rows)
+    return executemany(conn, sql, rows, batch_size)
 
 def ensure_schema(conn):
     return db.ensure_schema(conn)
 
-def get_stations(conn: sqlite3.Connection, city_name_like: Optional[str] = None) -> list[Station]:
-    cur = conn.cursor()
+_STATION_COLS = "id, code, name, lat, lon, city_id, city_name, commune, district, province, street"
+_SENSOR_COLS = "id, station_id, param_name, param_formula, param_code, param_id"
+
+def _stream(cur: sqlite3.Cursor, batch_size: int) -> Iterator[list]:
+    """Wiersze kursora porcjami po `batch_size` (fetchmany) – bez fetchall()."""
+    try:
+        while rows := cur.fetchmany(max(1, batch_size)):
+            yield rows
+    finally:
+        cur.close()
+
+def iter_stations(conn: sqlite3.Connection, city_name_like: Optional[str] = None,
+                  batch_size: int = db.READ_BATCH_SIZE, tuples: bool = False) -> Iterator[Station | tuple]:
     if city_name_like:
-        cur.execute("SELECT id, code, name, lat, lon, city_id, city_name, commune, district, province, street FROM stations WHERE city_name LIKE ? ORDER BY city_name, name", (f"%{city_name_like}%",))
+        cur = conn.execute(f"SELECT {_STATION_COLS} FROM stations WHERE city_name LIKE ? ORDER BY city_name, name",
+                           (f"%{city_name_like}%",))
     else:
-        cur.execute("SELECT id, code, name, lat, lon, city_id, city_name, commune, district, province, street FROM stations ORDER BY province, city_name, name")
-    rows = cur.fetchall()
-    return [Station(*row) for row in rows]
+        cur = conn.execute(f"SELECT {_STATION_COLS} FROM stations ORDER BY province, city_name, name")
+    for rows in _stream(cur, batch_size):
+        yield from (rows if tuples else (Station(*row) for row in rows))
+
+def iter_sensors_by_station(conn: sqlite3.Connection, station_id: int, batch_size: int = db.READ_BATCH_SIZE,
+                            tuples: bool = False) -> Iterator[Sensor | tuple]:
+    cur = conn.execute(f"SELECT {_SENSOR_COLS} FROM sensors WHERE station_id=? ORDER BY param_code", (station_id,))
+    for rows in _stream(cur, batch_size):
+        yield from (rows if tuples else (Sensor(*row) for row in rows))
+
+def get_stations(conn: sqlite3.Connection, city_name_like: Optional[str] = None) -> list[Station]:
+    return list(iter_stations(conn, city_name_like))
 
 def get_sensors_by_station(conn: sqlite3.Connection, station_id: int) -> list[Sensor]:
-    cur = conn.cursor()
-    cur.execute("SELECT id, station_id, param_name, param_formula, param_code, param_id FROM sensors WHERE station_id=? ORDER BY param_code", (station_id,))
-    rows = cur.fetchall()
-    return [Sensor(*row) for row in rows]
-
-def get_measurements(conn: sqlite3.Connection, sensor_id: int, since_iso: Optional[str] = None) -> list[Measurement]:
-    cur = conn.cursor()
-    if since_iso:
-        cur.execute("SELECT sensor_id, dt, value FROM measurements WHERE sensor_id=? AND dt>=? ORDER BY dt", (sensor_id, since_iso))
-    else:
-        cur.execute("SELECT sensor_id, dt, value FROM measurements WHERE sensor_id=? ORDER BY dt", (sensor_id,))
-    rows = cur.fetchall()
-    from datetime import datetime
-    return [Measurement(sensor_id=row[0], dt=datetime.fromisoformat(row[1]), value=row[2]) for row in rows]
-
-def upsert_air_index(conn, indexes: list[AirIndex]):
-    c = conn.cursor()
-    for idx in indexes:
-        c.execute("""
-            INSERT INTO air_index (station_id, param, value, category, calc_date)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(station_id, param) DO UPDATE SET
-                value=excluded.value,
-                category=excluded.category,
-                calc_date=excluded.calc_date
-        """, (idx.station_id, idx.param, idx.value, idx.category, idx.calc_date.isoformat() if idx.calc_date else None))
+    return list(iter_sensors_by_station(conn, station_id))
+
+def get_sensor_ids(conn: sqlite3.Connection) -> list[int]:
+    return [r[0] for r in conn.execute("SELECT id FROM sensors ORDER BY id")]
+
+def _measurement_rows(cur: sqlite3.Cursor, batch_size: int, mode: str) -> Iterator:
+    if mode not in ("objects", "tuples", "columns"):
+        raise ValueError(f"Nieznany tryb odczytu: {mode}")
+    for rows in _stream(cur, batch_size):
+        if mode == "objects":
+            yield from (Measurement(sensor_id=r[0], dt=db.from_epoch(r[1]), value=r[2]) for r in rows)
+        elif mode == "tuples":
+            yield from rows
+        else:
+            yield tuple(list(col) for col in zip(*rows))
+
+def iter_measurements(conn: sqlite3.Connection, sensor_id: int, start: datetime | str | None = None,
+                      end: datetime | str | None = None, batch_size: int = db.READ_BATCH_SIZE,
+                      mode: str = "objects") -> Iterator:
+    """
+    Pomiary czujnika z [start, end) rosnąco po czasie, czytane porcjami po `batch_size`.
+    mode: "objects" – Measurement; "tuples" – (sensor_id, dt, value) z dt w sekundach
+    epoki (db.from_epoch); "columns" – jedna krotka list (sensor_ids, dts, values) na porcję.
+    """
+    cur = conn.execute("SELECT sensor_id, dt, value FROM measurements WHERE sensor_id=:sid AND dt>=:a AND dt<:b "
+                       "ORDER BY dt", {"sid": sensor_id, **_bounds(start, end)})
+    return _measurement_rows(cur, batch_size, mode)
+
+def iter_range(conn: sqlite3.Connection, sensor_ids: Optional[Iterable[int]] = None,
+               start: datetime | str | None = None, end: datetime | str | None = None,
+               batch_size: int = db.READ_BATCH_SIZE, mode: str = "objects") -> Iterator:
+    """
+    Pomiary wielu czujników (None – wszystkich) jednym zapytaniem, uporządkowane po
+    (sensor_id, dt) – kolejność klucza głównego, więc bez sortowania. Tryby jak w iter_measurements.
+    """
+    params = _bounds(start, end)
+    where = "dt>=:a AND dt<:b"
+    if sensor_ids is not None:
+        # lista identyfikatorów jako jeden parametr JSON – bez limitu liczby parametrów SQLite
+        params["ids"] = json.dumps(sorted({int(s) for s in sensor_ids}))
+        where = f"sensor_id IN (SELECT value FROM json_each(:ids)) AND {where}"
+    cur = conn.execute(f"SELECT sensor_id, dt, value FROM measurements WHERE {where} ORDER BY sensor_id, dt", params)
+    return _measurement_rows(cur, batch_size, mode)
+
+def get_measurements(conn: sqlite3.Connection, sensor_id: int, since_iso: Optional[str | datetime] = None) -> list[Measurement]:
+    return list(iter_measurements(conn, sensor_id, start=since_iso or None))
+
+def get_series(conn: sqlite3.Connection, sensor_id: int, start: datetime | str | None = None,
+               end: datetime | str | None = None, batch_size: int = db.READ_BATCH_SIZE):
+    """Pomiary czujnika jako MeasurementSeries – z porcji kolumnowych, bez obiektów Measurement."""
+    import numpy as np
+    from .series import MeasurementSeries
+    parts = list(iter_measurements(conn, sensor_id, start, end, batch_size=batch_size, mode="columns"))
+    if not parts:
+        return MeasurementSeries.empty(sensor_id)
+    ts = np.concatenate([np.asarray(p[1], dtype=np.int64) for p in parts])
+    vs = np.concatenate([np.asarray(p[2], dtype=np.float64) for p in parts])
+    return MeasurementSeries(ts, vs, sensor_id, is_sorted=True)
+
+def latest_dt(conn: sqlite3.Connection, sensor_id: int) -> Optional[datetime]:
+    row = conn.execute("SELECT MAX(dt) FROM measurements WHERE sensor_id=?", (sensor_id,)).fetchone()
+    return db.from_epoch(row[0]) if row and row[0] is not None else None
+
+def recent_dts(conn: sqlite3.Connection, sensor_id: int, limit: int = 48) -> list[datetime]:
+    """Ostatnie `limit` znaczników czasu pomiarów czujnika, rosnąco."""
+    rows = conn.execute("SELECT dt FROM measurements WHERE sensor_id=? ORDER BY dt DESC LIMIT ?",
+                        (sensor_id, limit)).fetchall()
+    return [db.from_epoch(r[0]) for r in reversed(rows)]
+
+def get_schedules(conn: sqlite3.Connection) -> dict[int, dict]:
+    out = {}
+    for sid, period_s, lag_s, misses, next_due in conn.execute(
+            "SELECT sensor_id, period_s, lag_s, misses, next_due FROM sensor_schedule"):
+        out[sid] = {"period_s": period_s, "lag_s": lag_s, "misses": misses,
+                    "next_due": datetime.fromisoformat(next_due) if next_due else None}
+    return out
+
+def upsert_schedules(conn: sqlite3.Connection, schedules: dict[int, dict]) -> None:
+    sql = """
+    INSERT INTO sensor_schedule (sensor_id, period_s, lag_s, misses, next_due) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(sensor_id) DO UPDATE SET
+        period_s=excluded.period_s, lag_s=excluded.lag_s, misses=excluded.misses, next_due=excluded.next_due;
+    """
+    rows = [(sid, s["period_s"], s["lag_s"], s["misses"], s["next_due"].isoformat() if s["next_due"] else None)
+            for sid, s in schedules.items()]
+    executemany(conn, sql, rows)
+
+def get_sync_state(conn: sqlite3.Connection, sensor_id: int) -> Optional[dict]:
+    row = conn.execute("SELECT high_water, last_sync_at, last_new, last_updated FROM sync_state WHERE sensor_id=?",
+                       (sensor_id,)).fetchone()
+    if not row:
+        return None
+    return {
+        "high_water": datetime.fromisoformat(row[0]) if row[0] else None,
+        "last_sync_at": datetime.fromisoformat(row[1]) if row[1] else None,
+        "last_new": row[2], "last_updated": row[3],
+    }
+
+def set_sync_state(conn: sqlite3.Connection, sensor_id: int, high_water: Optional[datetime],
+                   synced_at: datetime, new: int, updated: int) -> None:
+    conn.execute("""
+        INSERT INTO sync_state (sensor_id, high_water, last_sync_at, last_new, last_updated)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(sensor_id) DO UPDATE SET
+            high_water=excluded.high_water, last_sync_at=excluded.last_sync_at,
+            last_new=excluded.last_new, last_updated=excluded.last_updated
+    """, (sensor_id, high_water.isoformat() if high_water else None, synced_at.isoformat(), new, updated))
+    conn.commit()
+
+def upsert_air_index(conn: sqlite3.Connection, indexes: Iterable[AirIndex]) -> int:
+    sql = """
+    INSERT INTO air_index (station_id, param, value, category, calc_date)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(station_id, param) DO UPDATE SET
+        value=excluded.value,
+        category=excluded.category,
+        calc_date=excluded.calc_date
+    """
+    rows = ((idx.station_id, idx.param, idx.value, idx.category, idx.calc_date.isoformat() if idx.calc_date else None)
+            for idx in indexes)
+    return executemany(conn, sql, rows)
+
+def station_categories(conn: sqlite3.Connection) -> dict[int, str]:
+    """Ogólna kategoria indeksu stacji = kategoria najgorszego (najwyższego) indeksu wskaźnika."""
+    out: dict[int, str] = {}
+    for station_id, category in conn.execute("""
+            SELECT station_id, category FROM air_index
+            WHERE category IS NOT NULL AND value IS NOT NULL
+            ORDER BY station_id, value DESC, calc_date DESC"""):
+        out.setdefault(station_id, category)
+    return out
+
+
+def get_geocode(conn: sqlite3.Connection, query: str) -> Optional[tuple[Optional[float], Optional[float], datetime]]:
+    """(lat, lon, kiedy zapisano) z cache geokodowania; lat/lon None – zapamiętany brak wyniku."""
+    row = conn.execute("SELECT lat, lon, created_at FROM geocode_cache WHERE query=?", (query,)).fetchone()
+    return (row[0], row[1], datetime.fromisoformat(row[2])) if row else None
+
+def put_geocode(conn: sqlite3.Connection, query: str, coords: Optional[tuple[float, float]], source: str) -> None:
+    lat, lon = coords if coords else (None, None)
+    conn.execute("""
+        INSERT INTO geocode_cache (query, lat, lon, source, created_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(query) DO UPDATE SET
+            lat=excluded.lat, lon=excluded.lon, source=excluded.source, created_at=excluded.created_at
+    """, (query, lat, lon, source, datetime.now().isoformat(timespec="seconds")))
     conn.commit()
 
+def station_places(conn: sqlite3.Connection) -> list[tuple[str, str, float, float, int]]:
+    """
+    Nazwy miejscowości/gmin/powiatów/województw ze stacji: (rodzaj, nazwa, lat, lon, liczba stacji),
+    współrzędne to środek stacji o tej nazwie.
+    """
+    out = []
+    for kind in ("city_name", "commune", "district", "province"):
+        out += conn.execute(f"""
+            SELECT '{kind}', {kind}, AVG(lat), AVG(lon), COUNT(*) FROM stations
+            WHERE {kind} IS NOT NULL AND {kind} <> '' AND lat IS NOT NULL AND lon IS NOT NULL
+            GROUP BY {kind}
+        """).fetchall()
+    return out
+
+
+def latest_values(conn: sqlite3.Connection, param_code: str, at: datetime | str | None = None,
+                  max_age_hours: int = 3) -> list[tuple[int, float, float, float, datetime]]:
+    """
+    Ostatni pomiar parametru (np. "PM10") z każdego czujnika nie później niż `at` (domyślnie teraz)
+    i nie starszy niż max_age_hours: [(station_id, lat, lon, value, dt), ...].
+    """
+    hi = db.to_epoch(at if at is not None else datetime.now())
+    lo = hi - max_age_hours * 3600
+    rows = conn.execute(f"""
+        SELECT st.id, st.lat, st.lon, m.value, m.dt
+        FROM sensors se
+        JOIN stations st ON st.id = se.station_id
+        JOIN measurements m ON m.sensor_id = se.id AND m.dt = (
+            SELECT MAX(dt) FROM measurements
+            WHERE sensor_id = se.id AND dt BETWEEN ? AND ? AND {db.NUMERIC_VALUE})
+        WHERE se.param_code = ? AND st.lat IS NOT NULL AND st.lon IS NOT NULL
+        ORDER BY st.id
+    """, (lo, hi, param_code)).fetchall()
+    return [(sid, lat, lon, value, db.from_epoch(dt)) for sid, lat, lon, value, dt in rows]
+
+
+@dataclass(slots=True)
+class _Agg:
+    """Sumy wystarczające do min/max/średniej/odchylenia/regresji; da się je łączyć."""
+    n: int = 0
+    sum: float = 0.0
+    sumsq: float = 0.0
+    min: Optional[float] = None
+    min_dt: Optional[int] = None
+    max: Optional[float] = None
+    max_dt: Optional[int] = None
+    sum_t: float = 0.0
+    sum_tt: float = 0.0
+    sum_ty: float = 0.0
+
+    def add(self, n, sum_, sumsq, min_, min_dt, max_, max_dt, sum_t, sum_tt, sum_ty) -> None:
+        if not n:
+            return
+        self.n += n
+        self.sum += sum_
+        self.sumsq += sumsq
+        self.sum_t += sum_t
+        self.sum_tt += sum_tt
+        self.sum_ty += sum_ty
+        if self.min is None or min_ < self.min or (min_ == self.min and min_dt < self.min_dt):
+            self.min, self.min_dt = min_, min_dt
+        if self.max is None or max_ > self.max or (max_ == self.max and max_dt < self.max_dt):
+            self.max, self.max_dt = max_, max_dt
+
+    def add_value(self, dt: int, value: float) -> None:
+        t = dt / 3600.0
+        self.add(1, value, value * value, value, dt, value, dt, t, t * t, t * value)
+
+    def as_stats(self) -> dict:
+        if not self.n:
+            return {"count": 0, "min": None, "min_at": None, "max": None, "max_at": None,
+                    "avg": None, "std": None, "trend_slope": None}
+        avg = self.sum / self.n
+        var = max(self.sumsq / self.n - avg * avg, 0.0)
+        # regresja liniowa wartość ~ czas (t w godzinach) z sum: Sxx = Σt² - n·t̄², Sxy = Σty - t̄·Σy
+        t_mean = self.sum_t / self.n
+        sxx = self.sum_tt - self.n * t_mean * t_mean
+        sxy = self.sum_ty - t_mean * self.sum
+        slope = sxy / sxx if sxx > 1e-9 else 0.0
+        return {
+            "count": self.n,
+            "min": self.min, "min_at": db.from_epoch(self.min_dt),
+            "max": self.max, "max_at": db.from_epoch(self.max_dt),
+            "avg": avg, "std": math.sqrt(var), "trend_slope": slope,
+        }
+
+
+def _day_floor(dt: datetime) -> datetime:
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _day_ceil(dt: datetime) -> datetime:
+    f = _day_floor(dt)
+    return f if f == dt else f + timedelta(days=1)
+
+def _month_floor(dt: datetime) -> datetime:
+    return _day_floor(dt).replace(day=1)
+
+def _month_ceil(dt: datetime) -> datetime:
+    f = _month_floor(dt)
+    if f == dt:
+        return f
+    return f.replace(year=f.year + 1, month=1) if f.month == 12 else f.replace(month=f.month + 1)
+
+_RAW_AGG_SQL = f"""
+    SELECT COUNT(value), SUM(value), SUM(value * value),
+           MIN(value), (SELECT dt FROM measurements WHERE sensor_id=:sid AND dt>=:a AND dt<:b AND {db.NUMERIC_VALUE}
+                        ORDER BY value, dt LIMIT 1),
+           MAX(value), (SELECT dt FROM measurements WHERE sensor_id=:sid AND dt>=:a AND dt<:b AND {db.NUMERIC_VALUE}
+                        ORDER BY value DESC, dt LIMIT 1),
+           SUM(dt / 3600.0), SUM((dt / 3600.0) * (dt / 3600.0)), SUM((dt / 3600.0) * value)
+    FROM measurements WHERE sensor_id=:sid AND dt>=:a AND dt<:b AND {db.NUMERIC_VALUE}
+"""
+
+def _bounds(start, end) -> dict:
+    return {"a": db.to_epoch(start) if start is not None else -2**63,
+            "b": db.to_epoch(end) if end is not None else 2**63 - 1}
+
+def _add_raw(conn, agg: _Agg, sensor_id: int, start: datetime, end: datetime) -> None:
+    if start >= end:
+        return
+    agg.add(*conn.execute(_RAW_AGG_SQL, {"sid": sensor_id, **_bounds(start, end)}).fetchone())
+
+def _add_buckets(conn, agg: _Agg, level: str, sensor_id: int, start: datetime, end: datetime) -> None:
+    if start >= end:
+        return
+    for row in conn.execute(
+            f"SELECT n, sum, sumsq, min, min_dt, max, max_dt, sum_t, sum_tt, sum_ty FROM {db.ROLLUPS[level]} "
+            "WHERE sensor_id=? AND bucket>=? AND bucket<?",
+            (sensor_id, db.to_epoch(start), db.to_epoch(end))):
+        agg.add(*row)
+
+def range_stats(conn: sqlite3.Connection, sensor_id: int, start: datetime | str | None = None,
+                end: datetime | str | None = None) -> dict:
+    """
+    Statystyki pomiarów czujnika z zakresu [start, end): count, min/min_at, max/max_at,
+    avg, std i trend_slope (nachylenie regresji liniowej, jednostka: wartość / godzina).
+
+    Pełne miesiące i dni zakresu czytane są z tabel rollup_*, surowe pomiary tylko
+    na niepełnych dniach na brzegach – koszt zależy od liczby kubełków, nie pomiarów.
+    """
+    if start is None or end is None:
+        lo, hi = conn.execute("SELECT MIN(dt), MAX(dt) FROM measurements WHERE sensor_id=?", (sensor_id,)).fetchone()
+        if lo is None:
+            return _Agg().as_stats()
+        start = start if start is not None else db.from_epoch(lo)
+        end = end if end is not None else db.from_epoch(hi) + timedelta(seconds=1)
+    start = datetime.fromisoformat(start) if isinstance(start, str) else start
+    end = datetime.fromisoformat(end) if isinstance(end, str) else end
+    agg = _Agg()
+    d0, d1 = _day_ceil(start), _day_floor(end)
+    if d0 >= d1:
+        _add_raw(conn, agg, sensor_id, start, end)
+        return agg.as_stats()
+    m0, m1 = _month_ceil(d0), _month_floor(d1)
+    _add_raw(conn, agg, sensor_id, start, d0)
+    if m0 >= m1:
+        _add_buckets(conn, agg, "day", sensor_id, d0, d1)
+    else:
+        _add_buckets(conn, agg, "day", sensor_id, d0, m0)
+        _add_buckets(conn, agg, "month", sensor_id, m0, m1)
+        _add_buckets(conn, agg, "day", sensor_id, m1, d1)
+    _add_raw(conn, agg, sensor_id, d1, end)
+    return agg.as_stats()
+
+def aggregate_stats(conn: sqlite3.Connection, sensor_id: int, start: datetime | str | None = None,
+                    end: datetime | str | None = None) -> dict:
+    """Jak range_stats, ale liczone jednym zapytaniem wprost z surowych pomiarów (bez tabel rollup_*)."""
+    agg = _Agg()
+    agg.add(*conn.execute(_RAW_AGG_SQL, {"sid": sensor_id, **_bounds(start, end)}).fetchone())
+    return agg.as_stats()
+
+def percentiles(conn: sqlite3.Connection, sensor_id: int, qs: Sequence[float] = (0.5, 0.9, 0.98),
+                start: datetime | str | None = None, end: datetime | str | None = None) -> dict[float, Optional[float]]:
+    """
+    Percentyle wartości czujnika w [start, end) liczone w SQLite (sortowanie po stronie bazy,
+    do Pythona trafiają tylko dwie sąsiednie wartości). Interpolacja liniowa jak numpy.percentile.
+    """
+    params = {"sid": sensor_id, **_bounds(start, end)}
+    where = f"FROM measurements WHERE sensor_id=:sid AND dt>=:a AND dt<:b AND {db.NUMERIC_VALUE}"
+    n = conn.execute(f"SELECT COUNT(*) {where}", params).fetchone()[0]
+    out: dict[float, Optional[float]] = {}
+    for q in qs:
+        if not n:
+            out[q] = None
+            continue
+        pos = min(max(q, 0.0), 1.0) * (n - 1)
+        k = int(pos)
+        vals = [r[0] for r in conn.execute(f"SELECT value {where} ORDER BY value LIMIT 2 OFFSET :k", {**params, "k": k})]
+        out[q] = vals[0] if len(vals) == 1 else vals[0] + (vals[1] - vals[0]) * (pos - k)
+    return out
@@ -0,0 +1,154 @@
+"""
+Harmonogram odpytywania czujników dopasowany do godzinnego cyklu publikacji GIOŚ.
+
+Dla każdego czujnika uczymy się:
+  - okresu pomiarów (z odstępów między znacznikami czasu w tabeli measurements),
+  - opóźnienia publikacji (ile po znaczniku pomiaru dane faktycznie są w API).
+Czujnik odpytujemy chwilę po spodziewanej publikacji kolejnego pomiaru; stałe
+przesunięcie per czujnik rozkłada zapytania w czasie. Gdy danych nie ma –
+kolejne próby coraz rzadziej, a czujniki martwe sprawdzamy kilka razy na dobę.
+"""
+from __future__ import annotations
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from statistics import median
+from typing import Callable, Dict, Iterable, List, Optional
+from polair import api, repository, sync
+from polair.utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LAG = env_int("POLAIR_SYNC_MINUTE", 20) * 60       # początkowe założenie opóźnienia publikacji
+SPREAD = env_int("POLAIR_SCHEDULE_SPREAD_MIN", 10) * 60    # rozrzut zapytań między czujnikami
+RETRY_BASE = 10 * 60
+MAX_BACKOFF = 6 * 3600
+DEAD_AFTER = env_int("POLAIR_SCHEDULE_DEAD_HOURS", 72) * 3600
+DEAD_INTERVAL = 12 * 3600
+ALPHA = 0.3                                                # waga nowej obserwacji opóźnienia
+
+
+@dataclass
+class SensorPlan:
+    sensor_id: int
+    period_s: int = 3600
+    lag_s: float = DEFAULT_LAG
+    misses: int = 0
+    next_due: Optional[datetime] = None
+
+    def as_row(self) -> dict:
+        return {"period_s": self.period_s, "lag_s": self.lag_s, "misses": self.misses, "next_due": self.next_due}
+
+
+def learn_period(dts: List[datetime]) -> int:
+    """Typowy odstęp między pomiarami, zaokrąglony do pełnych godzin (domyślnie 1 h)."""
+    diffs = [(b - a).total_seconds() for a, b in zip(dts, dts[1:]) if b > a]
+    if not diffs:
+        return 3600
+    return max(1, round(median(diffs) / 3600)) * 3600
+
+
+def jitter(sensor_id: int, spread: int = SPREAD) -> float:
+    # stałe (deterministyczne) przesunięcie czujnika w oknie `spread`
+    return (sensor_id * 2654435761 % 2**32) / 2**32 * spread
+
+
+class Scheduler:
+    def __init__(self, conn: sqlite3.Connection, client: api.GiosClient | None = None,
+                 workers: int = sync.WORKERS, default_lag: float = DEFAULT_LAG):
+        self.conn = conn
+        self.client = client
+        self.workers = workers
+        self.default_lag = default_lag
+        self.plans: Dict[int, SensorPlan] = {}
+
+    def load(self, sensor_ids: Iterable[int], now: Optional[datetime] = None) -> None:
+        """Wczytuje zapisane plany; nowe czujniki (bez planu) odpytujemy od razu."""
+        now = now or datetime.now()
+        saved = repository.get_schedules(self.conn)
+        plans = {}
+        for sid in sensor_ids:
+            sid = int(sid)
+            if sid in self.plans:
+                plans[sid] = self.plans[sid]
+            elif sid in saved:
+                plans[sid] = SensorPlan(sensor_id=sid, **saved[sid])
+            else:
+                plans[sid] = SensorPlan(sensor_id=sid, period_s=learn_period(repository.recent_dts(self.conn, sid)),
+                                        lag_s=self.default_lag, next_due=now)
+        self.plans = plans
+
+    def expected_due(self, plan: SensorPlan, hwm: Optional[datetime], now: datetime) -> datetime:
+        if hwm is None:
+            base = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        else:
+            base = hwm + timedelta(seconds=plan.period_s)
+        return base + timedelta(seconds=plan.lag_s + jitter(plan.sensor_id))
+
+    def due(self, now: Optional[datetime] = None) -> List[int]:
+        now = now or datetime.now()
+        return sorted(sid for sid, p in self.plans.items() if p.next_due is None or p.next_due <= now)
+
+    def next_wakeup(self) -> Optional[datetime]:
+        dues = [p.next_due for p in self.plans.values() if p.next_due is not None]
+        return min(dues) if dues else None
+
+    def update(self, plan: SensorPlan, res: sync.SyncResult, now: datetime) -> None:
+        hwm = res.high_water
+        if res.error is None and res.new > 0 and hwm is not None:
+            observed = (now - hwm).total_seconds()
+            # obserwacja jest tylko górnym ograniczeniem (nie wiemy, kiedy dokładnie dane się pojawiły),
+            # więc przy spóźnionym odpytaniu nie wierzymy jej powyżej jednego okresu
+            observed = min(max(observed, 0.0), float(plan.period_s))
+            plan.lag_s = (1 - ALPHA) * plan.lag_s + ALPHA * observed
+            plan.misses = 0
+            plan.next_due = max(self.expected_due(plan, hwm, now), now + timedelta(seconds=60))
+            return
+        plan.misses += 1
+        if hwm is None or (now - hwm).total_seconds() > DEAD_AFTER:
+            plan.next_due = now + timedelta(seconds=DEAD_INTERVAL)
+        else:
+            backoff = min(RETRY_BASE * 2 ** (plan.misses - 1), MAX_BACKOFF)
+            plan.next_due = now + timedelta(seconds=backoff)
+
+    def run_pending(self, now: Optional[datetime] = None) -> List[sync.SyncResult]:
+        """Synchronizuje czujniki, których termin minął, i planuje ich następne odpytanie."""
+        now = now or datetime.now()
+        ids = self.due(now)
+        if not ids:
+            return []
+        results = sync.sync_sensors(self.conn, ids, now=now.replace(second=0, microsecond=0),
+                                    workers=self.workers, client=self.client)
+        for res in results:
+            self.update(self.plans[res.sensor_id], res, now)
+        repository.upsert_schedules(self.conn, {sid: self.plans[sid].as_row() for sid in ids})
+        late = sum(1 for sid in ids if self.plans[sid].misses)
+        logger.info("Odpytano %d czujników (%d bez nowych danych); następne: %s", len(ids), late,
+                    self.next_wakeup())
+        return results
+
+    def run_forever(self, max_sleep: float = 300.0, refresh: Optional[Callable[[], Iterable[int]]] = None,
+                    refresh_every: timedelta = timedelta(hours=24), once: bool = False) -> None:
+        """
+        Pętla odpytywania. refresh() – wywoływane na starcie i co refresh_every, zwraca aktualne
+        ID czujników (np. po odświeżeniu stacji z API); once – jeden przebieg i koniec.
+        """
+        last_refresh: Optional[datetime] = None
+        while True:
+            now = datetime.now()
+            if refresh is not None and (last_refresh is None or now - last_refresh >= refresh_every):
+                self.load(refresh(), now)
+                last_refresh = now
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.warning("Synchronizacja pomiarów nie powiodła się: %s", e)
+            if once:
+                return
+            wakes = [self.next_wakeup(), last_refresh + refresh_every if last_refresh else None]
+            wake = min(filter(None, wakes), default=None)
+            if wake is not None:
+                logger.info("Następne odpytanie: %s", wake.isoformat(sep=" ", timespec="minutes"))
+            delay = max_sleep if wake is None else (wake - datetime.now()).total_seconds()
+            time.sleep(min(max(delay, 1.0), max_sleep))
@@ -0,0 +1,154 @@
+"""
+Kolumnowy szereg pomiarów jednego czujnika.
+
+Zamiast listy obiektów Measurement (ok. 100+ B na pomiar) trzymamy dwie tablice:
+znaczniki czasu int64 (sekundy epoki, jak w bazie – db.to_epoch) i wartości float64
+(NaN = brak wartości), zawsze posortowane rosnąco po czasie. Wycinanie po czasie
+to wyszukiwanie binarne (searchsorted) i zwraca widoki, bez kopiowania danych.
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Iterable, Iterator, Optional
+import numpy as np
+from polair import db
+from polair.models import Measurement
+
+_DT_KEYS = ("dt", "Data", "date", "Date")
+_VALUE_KEYS = ("value", "Wartość", "val")
+
+
+def _epoch(dt: Any) -> Optional[int]:
+    if isinstance(dt, datetime):
+        return db.to_epoch(dt)
+    if isinstance(dt, str) and dt:
+        try:
+            return db.to_epoch(dt)
+        except ValueError:
+            return None
+    return None
+
+
+def _float(v: Any) -> float:
+    if v is None or v == "":
+        return np.nan
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class MeasurementSeries:
+    __slots__ = ("sensor_id", "ts", "values")
+
+    def __init__(self, ts, values, sensor_id: Optional[int] = None, is_sorted: bool = False):
+        ts = np.asarray(ts, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if ts.shape != values.shape or ts.ndim != 1:
+            raise ValueError("ts i values muszą być jednowymiarowymi tablicami tej samej długości")
+        if not is_sorted and ts.size > 1 and (np.diff(ts) < 0).any():
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+        self.sensor_id = sensor_id
+        self.ts = ts
+        self.values = values
+
+    # --- tworzenie
+
+    @classmethod
+    def empty(cls, sensor_id: Optional[int] = None) -> "MeasurementSeries":
+        return cls(np.empty(0, np.int64), np.empty(0, np.float64), sensor_id, is_sorted=True)
+
+    @classmethod
+    def from_measurements(cls, ms: Iterable, sensor_id: Optional[int] = None) -> "MeasurementSeries":
+        """Z obiektów z polami sensor_id/dt/value (Measurement, SimpleNamespace); dt: datetime lub ISO."""
+        ts, vs = [], []
+        for m in ms:
+            t = _epoch(m.dt)
+            if t is None:
+                continue
+            if sensor_id is None:
+                sensor_id = getattr(m, "sensor_id", None)
+            ts.append(t)
+            vs.append(_float(m.value))
+        return cls(ts, vs, sensor_id)
+
+    @classmethod
+    def from_records(cls, items: Iterable, sensor_id: Optional[int] = None) -> "MeasurementSeries":
+        """
+        Z dowolnej mieszanki słowników ({"Data", "Wartość"}, {"dt", "value"}, ...) i obiektów
+        z atrybutami dt/value. Rekordy bez poprawnej daty są pomijane.
+        """
+        ts, vs = [], []
+        for item in items:
+            if isinstance(item, dict):
+                dt = next((item[k] for k in _DT_KEYS if item.get(k) is not None), None)
+                val = next((item[k] for k in _VALUE_KEYS if k in item), None)
+                sid = item.get("sensor_id") or item.get("sensorId")
+            else:
+                dt, val = getattr(item, "dt", None), getattr(item, "value", None)
+                sid = getattr(item, "sensor_id", None)
+            t = _epoch(dt)
+            if t is None:
+                continue
+            if sensor_id is None and sid is not None:
+                sensor_id = int(sid)
+            ts.append(t)
+            vs.append(_float(val))
+        return cls(ts, vs, sensor_id)
+
+    # --- dostęp
+
+    def __len__(self) -> int:
+        return int(self.ts.size)
+
+    def __iter__(self) -> Iterator[Measurement]:
+        return iter(self.to_measurements())
+
+    def __repr__(self) -> str:
+        span = f"{self.start} – {self.end}" if len(self) else "pusty"
+        return f"MeasurementSeries(sensor_id={self.sensor_id}, n={len(self)}, {span})"
+
+    @property
+    def start(self) -> Optional[datetime]:
+        return db.from_epoch(int(self.ts[0])) if len(self) else None
+
+    @property
+    def end(self) -> Optional[datetime]:
+        return db.from_epoch(int(self.ts[-1])) if len(self) else None
+
+    @property
+    def times(self) -> np.ndarray:
+        """Znaczniki czasu jako datetime64[s] (np. dla matplotlib/pandas)."""
+        return self.ts.astype("datetime64[s]")
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.ts.nbytes + self.values.nbytes)
+
+    def datetimes(self) -> list[datetime]:
+        return self.times.astype(object).tolist()
+
+    def to_measurements(self) -> list[Measurement]:
+        return [Measurement(sensor_id=self.sensor_id, dt=dt, value=None if np.isnan(v) else float(v))
+                for dt, v in zip(self.datetimes(), self.values.tolist())]
+
+    def to_records(self) -> list[dict]:
+        """Postać używana przez GUI: [{"dt": datetime, "value": float | None, "sensor_id": ...}]."""
+        return [{"dt": m.dt, "value": m.value, "sensor_id": m.sensor_id} for m in self.to_measurements()]
+
+    # --- operacje
+
+    def between(self, start=None, end=None) -> "MeasurementSeries":
+        """Pomiary z [start, end) – wyszukiwanie binarne, wynik współdzieli pamięć z oryginałem."""
+        lo = 0 if start is None else int(np.searchsorted(self.ts, db.to_epoch(start), side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.ts, db.to_epoch(end), side="left"))
+        return MeasurementSeries(self.ts[lo:hi], self.values[lo:hi], self.sensor_id, is_sorted=True)
+
+    def dropna(self) -> "MeasurementSeries":
+        ok = ~np.isnan(self.values)
+        return MeasurementSeries(self.ts[ok], self.values[ok], self.sensor_id, is_sorted=True)
+
+    def stats(self, slope_unit: str = "reading") -> dict:
+        """analytics.describe dla szeregu (min_at/max_at jako datetime)."""
+        from polair import analytics
+        return analytics.describe(self.values, self.ts, slope_unit)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from typing import List, Iterable, Tuple, Optional
-from statistics import mean
-from .models import Station, Sensor, Measurement
+from .models import AirIndex, Station, Sensor, Measurement
+from . import parsing, repository
 from dataclasses import dataclass
 from types import SimpleNamespace
 from datetime import datetime
@@ -63,69 +63,72 @@ def parse_sensor(rec: dict) -> Sensor:
         param_formula=rec.get("Wskaźnik - wzór"),
     )
 
-def parse_measurements(data, sensor_id=None):
-    ms = []
-    if not data:
-        return ms
-
-
-    if isinstance(data, list):
-        records = data
-    else:
-        records = [data]
-
-    for rec in records:
-        if not isinstance(rec, dict):
+def parse_measurements(data, sensor_id: int | None = None) -> List[Measurement]:
+    """
+    Odpowiedź data/getData i archiwum (wiersze {"Data", "Wartość"}) oraz starszy format
+    [{"id", "key", "values": [{"date", "value"}]}]. dt jako datetime; pomija wartości puste i błędne daty.
+    """
+    return parsing.parse(data, sensor_id)
+
+
+# dawna nazwa – oba formaty obsługuje ten sam parser
+parse_data_rows = parse_measurements
+
+
+def parse_air_index(data, station_id: int) -> List[AirIndex]:
+    """
+    Odpowiedź aqindex/getIndex -> indeks per wskaźnik (klucze "... dla wskaźnika PM10").
+    GIOŚ pisze klucz kategorii z literówką ("wskażnika") – akceptujemy obie formy.
+    """
+    aq = data.get("AqIndex") if isinstance(data, dict) else None
+    if isinstance(aq, list):
+        aq = aq[0] if aq else None
+    if not isinstance(aq, dict):
+        return []
+    out = []
+    prefix = "Wartość indeksu dla wskaźnika "
+    for key, value in aq.items():
+        if not key.startswith(prefix):
             continue
+        param = key[len(prefix):]
+        category = aq.get(f"Nazwa kategorii indeksu dla wskażnika {param}",
+                          aq.get(f"Nazwa kategorii indeksu dla wskaźnika {param}"))
+        calc_date = aq.get(f"Data wykonania obliczeń indeksu dla wskaźnika {param}")
+        out.append(AirIndex(station_id=int(station_id), param=param,
+                            value=float(value) if value is not None else None, category=category,
+                            calc_date=datetime.fromisoformat(calc_date) if calc_date else None))
+    return out
 
-        vals = rec.get("values") or []
-        key = rec.get("key") or rec.get("code") or "unknown"
-
-        for v in vals:
-            val = v.get("value")
-            dt = v.get("date")
 
-            if val is None:
-                continue
+def sensor_stats(conn, sensor_id: int, start=None, end=None, qs: Tuple[float, ...] = (0.5, 0.9, 0.98)) -> dict:
+    """
+    Statystyki czujnika z bazy liczone po stronie SQLite (bez wczytywania pomiarów):
+    klucze jak w simple_stats oraz count, std i percentiles {q: wartość}.
+    trend_slope – nachylenie w jednostkach wartość / godzina.
+    """
+    stats = repository.range_stats(conn, sensor_id, start, end)
+    stats["percentiles"] = repository.percentiles(conn, sensor_id, qs, start, end)
+    return stats
 
-            # 🔹 sprawdzenie poprawności daty
-            try:
-                datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
-            except Exception:
-                continue
 
-            m = Measurement(
-                sensor_id=rec.get("id") or sensor_id,
-                dt=dt,
-                value=val,
-                # jeśli zdecydujesz się dodać:
-                # code=key
-            )
-            ms.append(m)
-
-    return ms
+def parse_series(data, sensor_id: int | None = None):
+    """Odpowiedź getData/archiwum ({"Data", "Wartość"}) lub starszy format "values" -> MeasurementSeries."""
+    return parsing.parse_series(data, sensor_id)
 
 
 def simple_stats(ms: Iterable[Measurement]) -> dict:
+    from . import analytics
+    from .series import MeasurementSeries
+    if isinstance(ms, MeasurementSeries):
+        st = ms.stats()
+        return {k: st[k] for k in ("min", "min_at", "max", "max_at", "avg", "trend_slope")}
     filt = [m for m in ms if m.value is not None]
     if not filt:
         return {"min": None, "min_at": None, "max": None, "max_at": None, "avg": None, "trend_slope": None}
-    min_m = min(filt, key=lambda m: m.value)
-    max_m = max(filt, key=lambda m: m.value)
-    avg = mean(m.value for m in filt)
-
-
-    xs = list(range(len(filt)))
-    ys = [m.value for m in filt]
-    n = len(xs)
-    sumx = sum(xs); sumy = sum(ys)
-    sumxy = sum(x*y for x,y in zip(xs, ys))
-    sumx2 = sum(x*x for x in xs)
-    denom = n*sumx2 - sumx*sumx
-    slope = (n*sumxy - sumx*sumy)/denom if denom != 0 else 0.0
-
+    # obliczenia wektorowo (polair.analytics); nachylenie liczone względem numeru pomiaru
+    st = analytics.describe([m.value for m in filt])
     return {
-        "min": min_m.value, "min_at": min_m.dt,
-        "max": max_m.value, "max_at": max_m.dt,
-        "avg": avg, "trend_slope": slope
+        "min": st["min"], "min_at": filt[st["argmin"]].dt,
+        "max": st["max"], "max_at": filt[st["argmax"]].dt,
+        "avg": st["avg"], "trend_slope": st["trend_slope"]
     }
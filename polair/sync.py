@@ -0,0 +1,122 @@
+"""
+Przyrostowa synchronizacja pomiarów.
+
+Dla każdego czujnika pamiętamy w tabeli sync_state najnowszy zapisany pomiar
+(high-water mark). Z archiwum pobieramy tylko brakujący zakres – od tego
+momentu (z niewielką zakładką na korekty GIOŚ) do teraz – i zapisujemy
+wyłącznie wiersze nowe lub zmienione.
+"""
+from __future__ import annotations
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from polair import api, archive, repository
+from polair.models import Measurement
+from polair.utils import env_int, get_logger
+
+logger = get_logger(__name__)
+
+# ile godzin przed high-water mark pobieramy ponownie (GIOŚ poprawia świeże wartości)
+REVISE_HOURS = env_int("POLAIR_SYNC_REVISE_HOURS", 3)
+# zakres pierwszej synchronizacji czujnika bez historii w bazie
+INITIAL_DAYS = env_int("POLAIR_SYNC_INITIAL_DAYS", 3)
+WORKERS = env_int("POLAIR_SYNC_WORKERS", 8)
+
+
+@dataclass
+class SyncResult:
+    sensor_id: int
+    new: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    high_water: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+_MISSING = object()
+
+
+def high_water_mark(conn: sqlite3.Connection, sensor_id: int) -> Optional[datetime]:
+    """Najnowszy zapisany pomiar: z sync_state, a gdy brak – z tabeli measurements."""
+    state = repository.get_sync_state(conn, sensor_id)
+    if state and state["high_water"]:
+        return state["high_water"]
+    return repository.latest_dt(conn, sensor_id)
+
+
+def sync_window(hwm: Optional[datetime], now: datetime, since: Optional[datetime] = None) -> tuple[datetime, datetime]:
+    if since is not None:
+        return since, now
+    if hwm is None:
+        return now - timedelta(days=INITIAL_DAYS), now
+    return min(hwm, now) - timedelta(hours=REVISE_HOURS), now
+
+
+def fetch_gap(sensor_id: int, start: datetime, end: datetime,
+              client: api.GiosClient | None = None) -> List[Measurement]:
+    return list(archive.iter_archival(sensor_id, start, end, workers=1, client=client))
+
+
+def apply(conn: sqlite3.Connection, sensor_id: int, fetched: Iterable[Measurement], start: datetime,
+          now: datetime, hwm: Optional[datetime] = None) -> SyncResult:
+    """Porównuje pobrane pomiary z bazą i zapisuje tylko nowe/zmienione; aktualizuje sync_state."""
+    existing = {m.dt: m.value for m in repository.get_measurements(conn, sensor_id, since_iso=start.isoformat())}
+    res = SyncResult(sensor_id=sensor_id, high_water=hwm)
+    changed = []
+    for m in fetched:
+        old = existing.get(m.dt, _MISSING)
+        if old is _MISSING:
+            res.new += 1
+        elif old != m.value:
+            res.updated += 1
+        else:
+            res.unchanged += 1
+            continue
+        changed.append(m)
+        if res.high_water is None or m.dt > res.high_water:
+            res.high_water = m.dt
+    if changed:
+        repository.upsert_measurements(conn, changed)
+    repository.set_sync_state(conn, sensor_id, res.high_water, now, res.new, res.updated)
+    return res
+
+
+def sync_sensor(conn: sqlite3.Connection, sensor_id: int, now: Optional[datetime] = None,
+                since: Optional[datetime] = None, client: api.GiosClient | None = None) -> SyncResult:
+    """`since` wymusza pobranie od podanej chwili zamiast od high-water mark."""
+    now = now or datetime.now().replace(minute=0, second=0, microsecond=0)
+    hwm = high_water_mark(conn, sensor_id)
+    start, end = sync_window(hwm, now, since)
+    return apply(conn, sensor_id, fetch_gap(sensor_id, start, end, client), start, now, hwm)
+
+
+def sync_sensors(conn: sqlite3.Connection, sensor_ids: Iterable[int], now: Optional[datetime] = None,
+                 since: Optional[datetime] = None, workers: int = WORKERS,
+                 client: api.GiosClient | None = None) -> List[SyncResult]:
+    """
+    Synchronizuje wiele czujników: pobieranie równolegle w wątkach,
+    zapis do bazy w wątku wywołującym (jedno połączenie SQLite).
+    """
+    now = now or datetime.now().replace(minute=0, second=0, microsecond=0)
+    plans = {}
+    for sid in sensor_ids:
+        hwm = high_water_mark(conn, int(sid))
+        plans[int(sid)] = (hwm, *sync_window(hwm, now, since))
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="polair-sync") as pool:
+        futs = {pool.submit(fetch_gap, sid, start, end, client): sid for sid, (_, start, end) in plans.items()}
+        for fut in as_completed(futs):
+            sid = futs[fut]
+            hwm, start, _ = plans[sid]
+            try:
+                results.append(apply(conn, sid, fut.result(), start, now, hwm))
+            except Exception as e:
+                logger.warning("Synchronizacja czujnika %s nie powiodła się: %s", sid, e)
+                results.append(SyncResult(sensor_id=sid, high_water=hwm, error=str(e)))
+    new = sum(r.new for r in results)
+    updated = sum(r.updated for r in results)
+    logger.info("Synchronizacja %d czujników: %d nowych, %d zmienionych", len(results), new, updated)
+    return results
@@ -0,0 +1,19 @@
+import pytest
+from polair import ratelimit
+from tests.fake_gios import FakeGios
+
+
+@pytest.fixture(autouse=True)
+def fast_limiter():
+    # testy nie powinny czekać na domyślne 10 zapytań/s
+    limiter = ratelimit.RateLimiter(rate=10_000, max_concurrency=64)
+    ratelimit.set_limiter(limiter)
+    yield limiter
+    ratelimit.set_limiter(None)
+
+
+@pytest.fixture
+def fake_gios():
+    server = FakeGios().start()
+    yield server
+    server.stop()
@@ -0,0 +1,148 @@
+"""
+Lokalny, minimalny serwer udający REST GIOŚ (pjp-api/v1/rest) do testów offline.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import re
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+STATIONS = [
+    {"Identyfikator stacji": 1, "Kod stacji": "DsWrocWisA", "Nazwa stacji": "Wrocław, ul. Wiśniowa",
+     "WGS84 φ N": "51.086225", "WGS84 λ E": "17.012689", "Identyfikator miasta": 1064, "Nazwa miasta": "Wrocław",
+     "Gmina": "Wrocław", "Powiat": "Wrocław", "Województwo": "DOLNOŚLĄSKIE", "Ulica": "ul. Wiśniowa"},
+    {"Identyfikator stacji": 2, "Kod stacji": "MzWarMarsz", "Nazwa stacji": "Warszawa, ul. Marszałkowska",
+     "WGS84 φ N": "52.225161", "WGS84 λ E": "21.014556", "Identyfikator miasta": 1006, "Nazwa miasta": "Warszawa",
+     "Gmina": "Warszawa", "Powiat": "Warszawa", "Województwo": "MAZOWIECKIE", "Ulica": "ul. Marszałkowska"},
+    {"Identyfikator stacji": 3, "Kod stacji": "MpKrakAlKras", "Nazwa stacji": "Kraków, Al. Krasińskiego",
+     "WGS84 φ N": "50.057678", "WGS84 λ E": "19.926189", "Identyfikator miasta": 415, "Nazwa miasta": "Kraków",
+     "Gmina": "Kraków", "Powiat": "Kraków", "Województwo": "MAŁOPOLSKIE", "Ulica": "al. Krasińskiego"},
+]
+
+
+def sensors_for(station_id: int) -> list[dict]:
+    return [{"Identyfikator stanowiska": station_id * 10 + i, "Identyfikator stacji": station_id,
+             "Wskaźnik": name, "Wskaźnik - wzór": code, "Wskaźnik - kod": code, "Id wskaźnika": i}
+            for i, (code, name) in enumerate([("PM10", "pył zawieszony PM10"), ("NO2", "dwutlenek azotu")])]
+
+
+def hourly_rows(sensor_id: int, end: datetime, hours: int) -> list[dict]:
+    # wartość zależy tylko od czujnika i godziny pomiaru – kolejne zapytania są spójne
+    stamps = [end - timedelta(hours=h) for h in range(hours)]
+    return [{"Kod stanowiska": f"S{sensor_id}", "Data": t.strftime("%Y-%m-%d %H:%M:%S"),
+             "Wartość": float(sensor_id % 7 + t.hour % 5)} for t in stamps]
+
+
+class FakeGios:
+    """Serwer uruchamiany w wątku; `requests` – lista obsłużonych ścieżek, `failures` – wstrzykiwane błędy."""
+
+    def __init__(self):
+        self.requests: list[str] = []
+        self.headers: list[dict] = []
+        # port klienta dla każdego zapytania – pozwala policzyć otwarte połączenia
+        self.peers: list[int] = []
+        # prefiks ścieżki -> lista (status, nagłówki) zwracanych przed prawidłową odpowiedzią
+        self.failures: dict[str, list[tuple[int, dict]]] = {}
+        self.now = datetime(2025, 8, 20, 12, 0, 0)
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def base(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/pjp-api/v1/rest"
+
+    def start(self) -> "FakeGios":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def route(self, path: str, q: dict) -> tuple[int, object]:
+        page = int(q.get("page", ["0"])[0])
+        size = int(q.get("size", ["20"])[0])
+        if path.endswith("/station/findAll"):
+            # dwie strony po 2 stacje niezależnie od `size`
+            chunk = STATIONS[page * 2:(page + 1) * 2]
+            links = {"self": f"page={page}"}
+            if (page + 1) * 2 < len(STATIONS):
+                links["next"] = f"page={page + 1}"
+            return 200, {"Lista stacji pomiarowych": chunk, "links": links, "totalPages": 2}
+        m = re.search(r"/station/sensors/(\d+)$", path)
+        if m:
+            return 200, {"Lista stanowisk pomiarowych dla podanej stacji": sensors_for(int(m.group(1))),
+                         "links": {"self": "x"}, "totalPages": 1}
+        m = re.search(r"/data/getData/(\d+)$", path)
+        if m:
+            sid = int(m.group(1))
+            if sid % 10 == 9:
+                return 400, {"error_result": "Brak danych", "error_code": "API-ERR-100003"}
+            return 200, {"Lista danych pomiarowych": hourly_rows(sid, self.now, 3), "links": {}, "totalPages": 1}
+        m = re.search(r"/aqindex/getIndex/(\d+)$", path)
+        if m:
+            return 200, {"AqIndex": {"Identyfikator stacji pomiarowej": int(m.group(1)),
+                                     "Wartość indeksu dla wskaźnika PM10": 1,
+                                     "Nazwa kategorii indeksu dla wskażnika PM10": "Dobry",
+                                     "Data wykonania obliczeń indeksu dla wskaźnika PM10": "2025-08-20 12:20:00"}}
+        m = re.search(r"/archivalData/getDataBySensor/(\d+)$", path)
+        if m:
+            sid = int(m.group(1))
+            date_from = datetime.strptime(q["dateFrom"][0], "%Y-%m-%d %H:%M")
+            date_to = datetime.strptime(q["dateTo"][0], "%Y-%m-%d %H:%M")
+            hours = int((date_to - date_from).total_seconds() // 3600) + 1
+            rows = hourly_rows(sid, date_to, hours)
+            total_pages = max(1, -(-len(rows) // size))
+            chunk = rows[page * size:(page + 1) * size]
+            links = {"self": f"page={page}"}
+            if page + 1 < total_pages:
+                links["next"] = f"page={page + 1}"
+            return 200, {"Lista archiwalnych wyników pomiarów": chunk, "links": links,
+                         "totalPages": total_pages}
+        return 404, {"error_result": "Not found"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                u = urlparse(self.path)
+                with fake.lock:
+                    fake.requests.append(u.path)
+                    fake.headers.append(dict(self.headers))
+                    fake.peers.append(self.client_address[1])
+                    injected = None
+                    for prefix, queue in fake.failures.items():
+                        if prefix in u.path and queue:
+                            injected = queue.pop(0)
+                            break
+                if injected:
+                    status, headers = injected
+                    body = json.dumps({"error_result": "injected"}).encode()
+                else:
+                    status, payload = fake.route(u.path, parse_qs(u.query))
+                    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                    etag = '"%s"' % hashlib.md5(body).hexdigest()
+                    headers = {"ETag": etag}
+                    if status == 200 and self.headers.get("If-None-Match") == etag:
+                        status, body = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
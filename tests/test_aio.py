@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from polair import services
+
+pytest.importorskip("aiohttp")
+from polair.aio import AsyncGiosClient
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_async_stations_and_sensors(fake_gios):
+    async def main():
+        async with AsyncGiosClient(base=fake_gios.base) as client:
+            stations = [services.parse_station(r) async for r in client.iter_all_stations()]
+            sensors = await asyncio.gather(*(client.get_sensors(s.id) for s in stations))
+            return stations, sensors
+
+    stations, sensors = run(main())
+    assert [s.id for s in stations] == [1, 2, 3]
+    parsed = [services.parse_sensor(r) for recs in sensors for r in recs]
+    assert sorted(s.id for s in parsed) == [10, 11, 20, 21, 30, 31]
+
+
+def test_async_measurements_respect_concurrency(fake_gios):
+    async def main():
+        async with AsyncGiosClient(base=fake_gios.base, concurrency=4) as client:
+            return [m async for m in client.iter_measurements(range(10, 30))]
+
+    ms = run(main())
+    # czujniki *9 zwracają error_result – brak pomiarów
+    assert len(ms) == 3 * 18
+    assert len(fake_gios.requests) == 20
+
+
+def test_async_index_and_archival(fake_gios):
+    async def main():
+        async with AsyncGiosClient(base=fake_gios.base) as client:
+            idx = await client.get_air_index(1)
+            arch = await client.get_archival_measurements(10, "2025-08-01", "2025-08-02")
+            return idx, arch
+
+    idx, arch = run(main())
+    assert idx["AqIndex"]["Nazwa kategorii indeksu dla wskażnika PM10"] == "Dobry"
+    assert len(services.parse_data_rows(arch, 10)) == 25
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from polair import analytics, db, services
+from polair.models import Measurement
+
+START = datetime(2025, 8, 20)
+MS = [Measurement(1, START + timedelta(hours=h), None if h % 11 == 0 else float((h * 17) % 23) + 0.5)
+      for h in range(200)]
+
+
+def test_describe_matches_simple_stats():
+    ref = services.simple_stats(MS)
+    ts, vs = analytics.to_arrays(MS)
+    st = analytics.describe(vs, ts)
+    assert st["count"] == sum(m.value is not None for m in MS)
+    for k in ("min", "max", "min_at", "max_at"):
+        assert st[k] == ref[k]
+    assert st["avg"] == pytest.approx(ref["avg"])
+    assert st["trend_slope"] == pytest.approx(ref["trend_slope"])
+    # nachylenie w czasie (jak analiza w GUI) – zmiana jednostki to tylko skala
+    assert analytics.slope(vs, ts, unit="hour") == pytest.approx(analytics.slope(vs, ts, unit="second") * 3600)
+
+
+def test_rolling_percentiles_exceedances():
+    ts, vs = analytics.to_arrays(MS)
+    roll = analytics.rolling_mean(ts, vs, window_hours=3)
+    assert roll[2] == pytest.approx(np.nanmean(vs[0:3]))
+    assert roll[50] == pytest.approx(np.nanmean(vs[48:51]))
+    p = analytics.percentiles(vs, (0.5, 0.9))
+    assert p[0.5] == pytest.approx(np.median(vs[~np.isnan(vs)]))
+    assert analytics.exceedances(vs, 20) == sum(1 for m in MS if m.value is not None and m.value > 20)
+    assert analytics.percentiles(np.array([np.nan]))[0.5] is None
+
+
+def test_describe_many_matches_single_sensor():
+    ts, vs = analytics.to_arrays(MS)
+    sids = np.concatenate([np.full(ts.size, 1), np.full(ts.size, 2)])
+    df = analytics.describe_many(sids, np.concatenate([ts, ts]), np.concatenate([vs, vs * 2]),
+                                 threshold={1: 20.0, 2: 1000.0})
+    one = analytics.describe(vs, ts)
+    row = df.loc[1]
+    assert row["count"] == one["count"] and row["min_at"] == one["min_at"]
+    assert row["trend_slope"] == pytest.approx(one["trend_slope"])
+    assert df.loc[2, "avg"] == pytest.approx(2 * one["avg"])
+    assert df.loc[1, "exceedances"] == analytics.exceedances(vs, 20.0) and df.loc[2, "exceedances"] == 0
+    assert df.loc[1, "p50"] == pytest.approx(analytics.percentiles(vs)[0.5])
+
+
+def test_load_columns(tmp_path):
+    from polair import repository
+    from polair.models import Sensor, Station
+    conn = db.get_conn(str(tmp_path / "a.db"))
+    db.init_db(conn)
+    repository.upsert_stations(conn, [Station(1, "X", "x", 52.0, 21.0, None, None, None, None, None, None)])
+    repository.upsert_sensors(conn, [Sensor(1, 1, "pył", "PM10", "PM10", 3)])
+    repository.upsert_measurements(conn, MS)
+    sids, ts, vs = analytics.load_columns(conn, [1], batch_size=64)
+    assert ts.size == len(MS) and np.isnan(vs).sum() == sum(m.value is None for m in MS)
+    assert analytics.describe(vs, ts)["max_at"] == services.simple_stats(MS)["max_at"]
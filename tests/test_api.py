@@ -0,0 +1,34 @@
+from polair import api, services
+
+
+def test_client_iterates_all_station_pages(fake_gios):
+    with api.GiosClient(base=fake_gios.base) as client:
+        stations = [services.parse_station(r) for r in client.iter_all_stations()]
+    assert [s.id for s in stations] == [1, 2, 3]
+    assert stations[0].city_name == "Wrocław"
+
+
+def test_client_reuses_connection(fake_gios):
+    with api.GiosClient(base=fake_gios.base) as client:
+        for sid in (1, 2, 3):
+            client.get_sensors(sid)
+    # keep-alive: trzy zapytania przez jedno połączenie TCP
+    assert len(fake_gios.requests) == 3
+    assert len(set(fake_gios.peers)) == 1
+
+
+def test_measurements_and_error_result(fake_gios):
+    client = api.GiosClient(base=fake_gios.base)
+    rows = client.get_measurements(10)
+    assert len(services.parse_data_rows(rows, 10)) == 3
+    # czujnik bez bieżących danych – API zwraca error_result, który przekazujemy dalej
+    assert "error_result" in client.get_measurements(19)
+
+
+def test_module_functions_use_default_client(fake_gios):
+    api.set_client(api.GiosClient(base=fake_gios.base))
+    try:
+        assert len(api.get_sensors(2)) == 2
+        assert "AqIndex" in api.get_air_index(2)
+    finally:
+        api.set_client(None)
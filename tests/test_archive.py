@@ -0,0 +1,45 @@
+from datetime import datetime
+from polair import api, archive, db, repository, services
+from polair.services import Sensor
+from tests.fake_gios import STATIONS
+
+
+def test_iter_archival_walks_all_pages_and_windows(fake_gios):
+    client = api.GiosClient(base=fake_gios.base)
+    ms = list(archive.iter_archival(10, "2025-08-01", "2025-08-11", chunk_days=3, page_size=50,
+                                    workers=3, client=client))
+    # 10 dni co godzinę, oba końce włącznie, bez powtórzeń na stykach okien
+    assert len(ms) == 10 * 24 + 1
+    assert len({m.dt for m in ms}) == len(ms)
+    assert ms[0].dt == datetime(2025, 8, 1, 0, 0)
+    assert ms[-1].dt == datetime(2025, 8, 11, 0, 0)
+    assert all(a.dt < b.dt for a, b in zip(ms, ms[1:]))
+    # 4 okna (3+3+3+1 dni), po kilka stron każde
+    assert len(fake_gios.requests) > 4
+
+
+def test_backfill_streams_into_db(fake_gios, tmp_path):
+    conn = db.get_conn(str(tmp_path / "t.db"))
+    db.init_db(conn)
+    repository.upsert_stations(conn, [services.parse_station(STATIONS[0])])
+    repository.upsert_sensors(conn, [Sensor(id=10, station_id=1, param_code="PM10", param_name="pył")])
+    client = api.GiosClient(base=fake_gios.base)
+    n = archive.backfill(conn, 10, "2025-08-01", "2025-08-03", batch_size=7, page_size=10, client=client)
+    assert n == 49
+    assert len(repository.get_measurements(conn, 10)) == 49
+
+
+def test_stream_archival_matches_buffered(fake_gios, tmp_path):
+    client = api.GiosClient(base=fake_gios.base, cache=None)
+    buffered = list(archive.iter_archival(10, "2025-08-01", "2025-08-08", chunk_days=3, page_size=40,
+                                          workers=2, client=client))
+    streamed = list(archive.stream_archival(10, "2025-08-01", "2025-08-08", chunk_days=3, page_size=40,
+                                            client=client))
+    # kolejność jak w API (w oknie od najnowszych), ale te same pomiary i bez powtórzeń na stykach
+    assert sorted((m.dt, m.value) for m in streamed) == [(m.dt, m.value) for m in buffered]
+
+    conn = db.get_conn(str(tmp_path / "s.db"))
+    db.init_db(conn)
+    repository.upsert_stations(conn, [services.parse_station(STATIONS[0])])
+    repository.upsert_sensors(conn, [Sensor(id=10, station_id=1, param_code="PM10", param_name="pył")])
+    assert archive.backfill(conn, 10, "2025-08-01", "2025-08-03", stream=True, workers=4, client=client) == 49
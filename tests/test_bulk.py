@@ -0,0 +1,50 @@
+import time
+from polair import bulk
+
+
+class FakeClient:
+    """Udaje GiosClient – każde wywołanie trwa 50 ms."""
+
+    def __init__(self, stations):
+        self.stations = stations
+
+    def get_sensors(self, station_id):
+        time.sleep(0.05)
+        return [{"id": station_id * 10 + i, "stationId": station_id,
+                 "param": {"paramCode": "PM10", "paramName": "pył", "idParam": 3}} for i in range(2)]
+
+    def get_measurements(self, sensor_id):
+        time.sleep(0.05)
+        if sensor_id % 10 == 1:
+            return {"error_result": "brak danych"}
+        return {"Lista danych pomiarowych": [
+            {"Kod stanowiska": "X", "Data": "2025-08-20 12:00:00", "Wartość": 10.5},
+            {"Kod stanowiska": "X", "Data": "2025-08-20 13:00:00", "Wartość": None},
+        ]}
+
+
+def test_fetch_network_concurrent():
+    client = FakeClient(stations=range(1, 21))
+    t0 = time.perf_counter()
+    out = list(bulk.fetch_network(range(1, 21), workers=20, client=client))
+    elapsed = time.perf_counter() - t0
+
+    sensors = [o for o in out if hasattr(o, "param_code")]
+    ms = [o for o in out if hasattr(o, "dt")]
+    assert len(sensors) == 40
+    # czujniki *1 zwracają error_result, wiersz bez wartości jest pomijany
+    assert sorted(m.sensor_id for m in ms) == sorted(s * 10 for s in range(1, 21))
+    assert all(m.value == 10.5 for m in ms)
+    # 60 wywołań po 50 ms – sekwencyjnie ~3 s
+    assert elapsed < 1.0
+
+
+def test_fetch_measurements_skips_failing_sensor():
+    class Broken(FakeClient):
+        def get_measurements(self, sensor_id):
+            if sensor_id == 2:
+                raise RuntimeError("boom")
+            return super().get_measurements(sensor_id)
+
+    ms = list(bulk.fetch_measurements([2, 3], client=Broken([])))
+    assert [m.sensor_id for m in ms] == [3]
@@ -0,0 +1,64 @@
+import time
+from polair import api
+from polair.cache import ResponseCache
+
+
+def make_client(fake_gios, tmp_path, ttls, **kw):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), ttls=ttls, **kw)
+    return api.GiosClient(base=fake_gios.base, cache=cache), cache
+
+
+def test_fresh_entry_served_from_disk(fake_gios, tmp_path):
+    client, cache = make_client(fake_gios, tmp_path, {"/station/sensors/": (3600, 0)})
+    first = client.get_sensors(1)
+    # nowy klient z tym samym plikiem – jak po restarcie aplikacji
+    client2 = api.GiosClient(base=fake_gios.base, cache=ResponseCache(path=cache.path, ttls=cache.ttls))
+    assert client2.get_sensors(1) == first
+    assert len(fake_gios.requests) == 1
+
+
+def test_expired_entry_revalidated_with_etag(fake_gios, tmp_path):
+    client, cache = make_client(fake_gios, tmp_path, {"/station/sensors/": (0, 0)})
+    first = client.get_sensors(2)
+    assert client.get_sensors(2) == first
+    assert len(fake_gios.requests) == 2
+    assert fake_gios.headers[1].get("If-None-Match")
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_stale_while_revalidate_returns_immediately(fake_gios, tmp_path):
+    client, cache = make_client(fake_gios, tmp_path, {"/station/sensors/": (0, 3600)})
+    first = client.get_sensors(3)
+    assert client.get_sensors(3) == first
+    assert cache.stats()["stale_hits"] == 1
+    client.close()  # czeka na odświeżenie w tle
+    assert len(fake_gios.requests) == 2
+
+
+def test_lru_eviction_by_size(fake_gios, tmp_path):
+    client, cache = make_client(fake_gios, tmp_path, {"/station/sensors/": (3600, 0)}, max_bytes=1200)
+    for sid in (1, 2, 3):
+        client.get_sensors(sid)
+        time.sleep(0.01)
+    stats = cache.stats()
+    assert stats["bytes"] <= 1200
+    assert stats["evicted"] >= 1
+    # najnowszy wpis został
+    assert cache.get(cache.key(f"{fake_gios.base}/station/sensors/3", {"page": 0, "size": 200}))
+
+
+def test_uncached_endpoint_goes_to_network(fake_gios, tmp_path):
+    client, _ = make_client(fake_gios, tmp_path, {"/station/sensors/": (3600, 0)})
+    client.get_measurements(10)
+    client.get_measurements(10)
+    assert len(fake_gios.requests) == 2
+
+
+def test_default_policy_caches_only_metadata(fake_gios, tmp_path):
+    client, cache = make_client(fake_gios, tmp_path, None)
+    for _ in range(2):
+        client.get_measurements(10)
+        client.get_archival_raw(10, "2025-08-01", "2025-08-02")
+        client.get_sensors(1)
+    assert len(fake_gios.requests) == 5
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,49 @@
+import sqlite3
+from datetime import datetime, timedelta
+from polair import api, cli
+
+
+def test_cli_full_refresh(fake_gios, tmp_path):
+    path = str(tmp_path / "cli.db")
+    api.set_client(api.GiosClient(base=fake_gios.base))
+    try:
+        assert cli.main(["--db", path, "sync-stations"]) == 0
+        assert cli.main(["sync-sensors", "--db", path, "--workers", "2"]) == 0
+        since = (datetime.now() - timedelta(hours=6)).strftime("%Y-%m-%d %H:00")
+        assert cli.main(["--db", path, "sync-measurements", "--since", since, "--sensor", "10"]) == 0
+        assert cli.main(["--db", path, "backfill", "--from", "2025-08-01", "--to", "2025-08-02", "--sensor", "20"]) == 0
+    finally:
+        api.set_client(None)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM stations").fetchone()[0] == 3
+    assert conn.execute("SELECT COUNT(*) FROM sensors").fetchone()[0] == 6
+    counts = dict(conn.execute("SELECT sensor_id, COUNT(*) FROM measurements GROUP BY sensor_id"))
+    assert counts[20] == 25
+    assert 6 <= counts[10] <= 7
+    assert conn.execute("SELECT COUNT(*) FROM sync_state").fetchone()[0] == 1
+
+
+def test_cli_schedule_once(fake_gios, tmp_path):
+    path = str(tmp_path / "cli.db")
+    api.set_client(api.GiosClient(base=fake_gios.base))
+    try:
+        assert cli.main(["--db", path, "schedule", "--once"]) == 0
+    finally:
+        api.set_client(None)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM sensor_schedule").fetchone()[0] == 6
+    assert conn.execute("SELECT COUNT(DISTINCT sensor_id) FROM measurements").fetchone()[0] == 6
+
+
+def test_cli_backfill_stream_fails_when_all_sensors_fail(fake_gios, tmp_path):
+    path = str(tmp_path / "cli.db")
+    api.set_client(api.GiosClient(base=fake_gios.base))
+    try:
+        assert cli.main(["--db", path, "sync-stations"]) == 0
+        args = ["--db", path, "backfill", "--from", "2025-08-01", "--stream", "--sensor", "20"]
+        assert cli.build_parser().parse_args(args).date_to is None
+        fake_gios.failures["/pjp-api/v1/rest/archivalData"] = [(500, {})] * 50
+        assert cli.main(args) == 1
+    finally:
+        api.set_client(None)
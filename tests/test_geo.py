@@ -0,0 +1,179 @@
+import random
+import sqlite3
+import pytest
+from geopy.distance import geodesic
+from polair import db, geo, repository
+from polair.models import Station
+
+
+def _stations(n: int, seed: int = 1) -> list[Station]:
+    rnd = random.Random(seed)
+    return [Station(i, f"ST{i}", f"Stacja {i}", rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1),
+                    None, None, None, None, None, None) for i in range(n)]
+
+
+def _linear_knn(stations, center, k, max_km=None):
+    d = sorted((geodesic((s.lat, s.lon), center).km, s.id) for s in stations)
+    return [sid for km, sid in d if max_km is None or km <= max_km][:k]
+
+
+@pytest.mark.parametrize("radius", [5.0, 30.0, 120.0, 2000.0])
+def test_within_matches_linear_scan(radius):
+    stations = _stations(200)
+    index = geo.StationIndex(stations, cell_km=20.0)
+    rnd = random.Random(radius)
+    for _ in range(8):
+        center = (rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1))
+        expected = {s.id for s in stations if geodesic((s.lat, s.lon), center).km <= radius}
+        got = index.within(center, radius)
+        assert {s.id for _, s in got} == expected
+        assert [d for d, _ in got] == sorted(d for d, _ in got)
+        assert geo.nearest_within(index, center, radius) == [s for _, s in got]
+
+
+@pytest.mark.parametrize("k,max_km", [(1, None), (5, None), (20, None), (5, 25.0), (200, None)])
+def test_nearest_matches_linear_scan(k, max_km):
+    stations = _stations(150, seed=2)
+    index = geo.StationIndex(stations)
+    rnd = random.Random(k)
+    for _ in range(8):
+        center = (rnd.uniform(48.5, 55.0), rnd.uniform(13.5, 24.5))
+        got = [s.id for _, s in index.nearest(center, k, max_km=max_km)]
+        assert set(got) == set(_linear_knn(stations, center, k, max_km))
+
+
+def test_returned_distances_are_geodesic():
+    stations = _stations(200, seed=6)
+    index = geo.StationIndex(stations)
+    rnd = random.Random(6)
+    for _ in range(8):
+        center = (rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1))
+        expected = sorted((geodesic((s.lat, s.lon), center).km, s.id) for s in stations)
+        for got, n in ((index.nearest(center, 10), 10), (index.within(center, 150.0), None)):
+            want = expected[:n] if n else [e for e in expected if e[0] <= 150.0]
+            assert [s.id for _, s in got] == [sid for _, sid in want]
+            assert [d for d, _ in got] == pytest.approx([d for d, _ in want], rel=1e-9)
+
+
+def test_boundary_station_uses_geodesic():
+    # na tej szerokości kula zaniża odległość wschód-zachód o ok. 0,3%
+    center = (52.0, 19.0)
+    s = Station(1, "A", "A", 52.0, 19.0 + 50.05 / 68.7, None, None, None, None, None, None)
+    exact = geodesic((s.lat, s.lon), center).km
+    index = geo.StationIndex([s])
+    assert index.within(center, exact + 0.01)[0][0] == pytest.approx(exact)
+    assert index.within(center, exact - 0.01) == []
+
+
+def test_from_db_and_empty_index():
+    conn = sqlite3.connect(":memory:")
+    db.init_db(conn)
+    assert geo.StationIndex.from_db(conn).nearest((52.0, 21.0), 3) == []
+    repository.upsert_stations(conn, _stations(10))
+    index = geo.StationIndex.from_db(conn)
+    assert len(index) == 10 and len(index.nearest((52.0, 21.0), 3)) == 3
+
+
+def test_distance_matrix_methods_agree_with_geodesic(monkeypatch):
+    rnd = random.Random(3)
+    points = [(rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1)) for _ in range(7)]
+    targets = [(rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1)) for _ in range(11)]
+    exact = geo.distance_matrix(points, targets, method="geodesic")
+    assert exact.shape == (7, 11)
+    assert exact[2, 5] == pytest.approx(geodesic(points[2], targets[5]).km)
+    monkeypatch.setattr(geo, "BLOCK", 16)   # kilka bloków wierszy
+    hav = geo.distance_matrix(points, targets)
+    assert abs(hav / exact - 1).max() <= geo.SPHERE_ERROR
+    err = abs(geo.distance_matrix(points, targets, method="equirectangular") / exact - 1)
+    assert err[exact < 300].max() < 0.02 and err.max() < 0.035
+    with pytest.raises(ValueError):
+        geo.distance_matrix(points, targets, method="manhattan")
+
+
+@pytest.mark.parametrize("method", ["haversine", "geodesic"])
+def test_nearest_many_matches_per_point_queries(method):
+    stations = _stations(120, seed=4)
+    index = geo.StationIndex(stations)
+    rnd = random.Random(5)
+    points = [(rnd.uniform(49.0, 54.8), rnd.uniform(14.1, 24.1)) for _ in range(30)]
+    idx, dist = index.nearest_many(points, k=4, method=method)
+    assert idx.shape == dist.shape == (30, 4)
+    assert (dist[:, :-1] <= dist[:, 1:]).all()
+    for row, p in zip(idx, points):
+        expected = _linear_knn(stations, p, 4) if method == "geodesic" else [s.id for _, s in index.nearest(p, 4)]
+        assert {index.stations[i].id for i in row} == set(expected)
+    assert index.nearest_many([(52.0, 21.0)], k=500)[0].shape == (1, 120)
+    if method == "geodesic":
+        p, i = points[0], int(idx[0, 0])
+        assert dist[0, 0] == pytest.approx(geodesic(p, (index.lat[i], index.lon[i])).km, rel=1e-12)
+    assert "geodesic" not in geo.METHODS and "geodesic" in geo.DISTANCE_METHODS
+
+
+def test_normalize_place_polish_names():
+    assert geo.normalize_place("  Bielsko-Biała, Polska ") == "bielsko biala"
+    assert geo.normalize_place("m. st. Warszawa") == geo.normalize_place("WARSZAWA") == "warszawa"
+    assert geo.normalize_place("gmina Łódź") == "lodz"
+    assert geo.normalize_place("woj. Śląskie") == "slaskie"
+
+
+@pytest.fixture
+def geo_conn():
+    conn = sqlite3.connect(":memory:")
+    db.init_db(conn)
+    repository.upsert_stations(conn, [
+        Station(1, "A", "Kraków, Bujaka", 50.0, 19.9, 1, "Kraków", "Kraków", "Kraków", "MAŁOPOLSKIE", None),
+        Station(2, "B", "Kraków, Bulwarowa", 50.1, 20.1, 1, "Kraków", "Kraków", "Kraków", "MAŁOPOLSKIE", None),
+        Station(3, "C", "Zakopane", 49.3, 19.95, 2, "Zakopane", "Zakopane", "tatrzański", "MAŁOPOLSKIE", None),
+    ])
+    yield conn
+    geo.set_backend(None)
+
+
+def test_geocode_uses_gazetteer_then_persistent_cache(geo_conn):
+    backend = geo.StaticBackend({"Gdańsk": (54.35, 18.65)})
+    geo.set_backend(backend)
+    assert geo.geocode("krakow", geo_conn) == pytest.approx((50.05, 20.0))
+    assert geo.geocode("Powiat Tatrzański", geo_conn) == (49.3, 19.95)
+    assert backend.calls == 0   # gazeter ze stacji – bez backendu
+
+    assert geo.geocode("Gdańsk, Polska", geo_conn) == (54.35, 18.65)
+    with pytest.raises(ValueError):
+        geo.geocode("Atlantyda", geo_conn)
+    assert geo.geocode("GDANSK", geo_conn) == (54.35, 18.65)
+    assert backend.calls == 2
+
+    # nowy proces: pamięć pusta, ale wynik i brak wyniku są w geocode_cache
+    geo.set_backend(backend)
+    assert geo.geocode("gdańsk", geo_conn) == (54.35, 18.65)
+    with pytest.raises(ValueError):
+        geo.geocode("atlantyda", geo_conn)
+    assert backend.calls == 2
+    rows = geo_conn.execute("SELECT query, lat, source FROM geocode_cache ORDER BY query").fetchall()
+    assert rows == [("atlantyda", None, "static"), ("gdansk", 54.35, "static")]
+
+
+def test_geocode_retries_expired_miss(geo_conn):
+    repository.put_geocode(geo_conn, "hel", None, "static")
+    geo_conn.execute("UPDATE geocode_cache SET created_at='2000-01-01T00:00:00'")
+    backend = geo.StaticBackend({"Hel": (54.6, 18.8)})
+    geo.set_backend(backend)
+    assert geo.geocode("Hel", geo_conn) == (54.6, 18.8) and backend.calls == 1
+
+
+def test_geocoder_does_not_hold_lock_during_backend_call():
+    import threading
+    both = threading.Barrier(2, timeout=5)
+
+    def backend(q):
+        both.wait()                 # oba zapytania muszą być w backendzie naraz
+        return (50.0, 20.0) if q == "a" else None
+
+    g = geo.Geocoder(backend=backend, gazetteer={})
+    out = {}
+    threads = [threading.Thread(target=lambda q=q: out.__setitem__(q, g.lookup(q))) for q in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert out == {"a": (50.0, 20.0), "b": None}
+    assert geo.get_geocoder() is geo.get_geocoder()
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import sqlite3
+import numpy as np
+import pytest
+from polair import db, interpolate, repository
+from polair.models import Measurement, Sensor, Station
+
+AT = datetime(2025, 8, 20, 12)
+
+
+def _field(points):
+    # liniowy gradient: rośnie na północ i wschód
+    return 10 + (points[:, 0] - 49) * 5 + (points[:, 1] - 14) * 2
+
+
+@pytest.fixture(scope="module")
+def interp():
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([rng.uniform(49.2, 54.6, 150), rng.uniform(14.3, 24.0, 150)])
+    return interpolate.Interpolator(range(150), coords, interpolate.Grid.regular(step_km=25))
+
+
+@pytest.mark.parametrize("method,tol", [("idw", 1.5), ("kriging", 0.5)])
+def test_surface_reproduces_smooth_field(interp, method, tol):
+    values = _field(interp.coords)
+    values[::5] = np.nan    # brakujące pomiary – sąsiedzi wybierani z zapasu
+    s = interp.surface(values, "PM10", method)
+    assert s.values.shape == interp.grid.shape and s.stations == 120
+    flat = s.values.ravel()
+    ok = ~np.isnan(flat)
+    assert ok.mean() > 0.9
+    assert np.abs(flat[ok] - _field(interp.grid.points)[ok]).mean() < tol
+    if method == "kriging":
+        assert s.variogram is not None and s.variogram.sill > 0
+
+
+def test_cells_far_from_stations_are_nan():
+    interp = interpolate.Interpolator([1, 2], [(52.0, 21.0), (52.1, 21.2)], max_km=30)
+    s = interp.surface(np.array([10.0, 20.0]))
+    assert s.value_at(52.05, 21.1) is not None and 10 <= s.value_at(52.05, 21.1) <= 20
+    assert s.value_at(54.5, 15.0) is None
+    assert all(len(p) == 3 and 0 < p[2] <= 1 for p in s.to_heatmap())
+    assert np.isnan(interp.surface(np.array([np.nan, np.nan]), method="kriging").values).all()
+    with pytest.raises(ValueError):
+        interp.surface(np.array([1.0, 2.0]), method="spline")
+
+
+def test_latest_surfaces_from_db():
+    conn = sqlite3.connect(":memory:")
+    db.init_db(conn)
+    stations = [Station(i, f"S{i}", f"S{i}", 50 + i * 0.5, 16 + i, None, None, None, None, None, None)
+                for i in range(1, 7)]
+    repository.upsert_stations(conn, stations)
+    repository.upsert_sensors(conn, [Sensor(10 + s.id, s.id, "pył zawieszony PM10", "PM10", "PM10", 3) for s in stations])
+    ms = [Measurement(10 + s.id, AT - timedelta(hours=h), s.id * 10.0 + h) for s in stations for h in range(3)]
+    ms.append(Measurement(16, AT, None))                        # brak wartości – bierzemy wcześniejszą
+    ms.append(Measurement(11, AT + timedelta(hours=1), 999.0))  # po `at` – pomijana
+    repository.upsert_measurements(conn, ms)
+
+    rows = repository.latest_values(conn, "PM10", AT)
+    assert [(r[0], r[3]) for r in rows] == [(1, 10.0), (2, 20.0), (3, 30.0), (4, 40.0), (5, 50.0), (6, 61.0)]
+    assert rows[0][4] == AT
+    assert repository.latest_values(conn, "PM10", AT + timedelta(hours=10)) == []
+
+    out = interpolate.latest_surfaces(conn, ["PM10", "NO2"], AT, method="kriging")
+    assert out["PM10"].stations == 6 and out["PM10"].at == AT
+    assert np.isnan(out["NO2"].values).all()
+
+
+def test_render_map_with_heatmap_layer(tmp_path, monkeypatch):
+    from polair import map as mapmod
+    monkeypatch.chdir(tmp_path)
+    interp = interpolate.Interpolator([1, 2], [(52.0, 21.0), (50.0, 20.0)], interpolate.Grid.regular(step_km=50))
+    s = interp.surface(np.array([10.0, 40.0]), "PM10")
+    out = mapmod.render_map([(1, "A", "Warszawa", 52.0, 21.0)], surface=s)
+    html = (tmp_path / out).read_text(encoding="utf-8")
+    assert "heatLayer" in html and "PM10 (idw)" in html
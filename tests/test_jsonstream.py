@@ -0,0 +1,33 @@
+import json
+import pytest
+from polair.jsonstream import StreamedObject
+
+DOC = {
+    "links": {"self": "a", "next": "b"},
+    "Lista archiwalnych wyników pomiarów": [
+        {"Kod stanowiska": "ŁódźCzernik-PM10", "Data": f"2025-08-01 {h:02d}:00:00", "Wartość": h * 1.25 if h % 3 else None}
+        for h in range(24)],
+    "totalPages": 12345,
+    "empty": [],
+}
+
+
+def chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 1 << 20])
+def test_streamed_items_and_meta_match_json_loads(size):
+    raw = json.dumps(DOC, ensure_ascii=False, indent=1).encode("utf-8")
+    doc = StreamedObject(chunks(raw, size), "Lista archiwalnych wyników pomiarów")
+    assert list(doc) == DOC["Lista archiwalnych wyników pomiarów"]
+    # liczba na końcu porcji nie może zostać ucięta (12345 -> 1)
+    assert doc.meta == {"links": DOC["links"], "totalPages": 12345, "empty": []}
+
+
+def test_missing_key_and_truncated_document():
+    doc = StreamedObject([b'{"a": 1}'], "x")
+    assert list(doc) == [] and doc.meta == {"a": 1}
+    with pytest.raises(ValueError):
+        list(StreamedObject([b'{"x": [{"a": 1}, {"b"'], "x"))
@@ -0,0 +1,76 @@
+import json
+import re
+import sqlite3
+from datetime import datetime
+import pytest
+from polair import api, cli, db, map as mapmod, repository, services
+from polair.models import AirIndex
+
+ITEMS = [(1, "Kraków, Bujaka", "Kraków", 50.01, 19.95), ("2", "Zakopane </script>", "Zakopane", 49.29, 19.96)]
+
+
+def _stations_json(html: str) -> dict:
+    return json.loads(re.search(r"var stations = (\{.*?\});\n", html).group(1))
+
+
+def test_geojson_mode_reuses_template_and_colors_categories(tmp_path):
+    out = mapmod.render_map(ITEMS, outfile=str(tmp_path / "a.html"), mode="geojson",
+                            categories={1: "Dostateczny", 2: "bardzo dobry"}, info={1: "PM10: 52 µg/m³"})
+    html = open(out, encoding="utf-8").read()
+    assert "markerClusterGroup" in html and "leaflet.markercluster" in html
+    assert "</script>\"" not in html            # nazwa nie zamyka znacznika <script>
+    features = _stations_json(html)["features"]
+    assert [f["properties"]["color"] for f in features] == ["#e58100", "#57b108"]
+    assert features[0]["geometry"]["coordinates"] == [19.95, 50.01]
+    assert features[0]["properties"]["info"] == "PM10: 52 µg/m³"
+
+    hits = mapmod._template.cache_info().hits
+    mapmod.render_map(ITEMS[:1], outfile=str(tmp_path / "b.html"), mode="geojson")
+    assert mapmod._template.cache_info().hits == hits + 1
+    b = _stations_json((tmp_path / "b.html").read_text(encoding="utf-8"))["features"]
+    assert len(b) == 1 and b[0]["properties"]["color"] == mapmod.NO_INDEX_COLOR
+
+
+def test_markers_mode_and_unknown_mode(tmp_path):
+    out = mapmod.render_map(ITEMS, outfile=str(tmp_path / "m.html"))
+    assert "circle_marker" in open(out, encoding="utf-8").read()
+    with pytest.raises(ValueError):
+        mapmod.render_map(ITEMS, outfile=str(tmp_path / "x.html"), mode="svg")
+
+
+def test_station_categories_take_worst_index():
+    conn = sqlite3.connect(":memory:")
+    db.init_db(conn)
+    t = datetime(2025, 8, 20, 12)
+    repository.upsert_air_index(conn, [
+        AirIndex(1, "PM10", 1, "Dobry", t), AirIndex(1, "O3", 3, "Dostateczny", t),
+        AirIndex(2, "NO2", 0, "Bardzo dobry", t), AirIndex(3, "PM10", None, None, t),
+    ])
+    assert repository.station_categories(conn) == {1: "Dostateczny", 2: "Bardzo dobry"}
+
+
+def test_synced_index_colors_station_in_geojson(fake_gios, tmp_path):
+    path = str(tmp_path / "idx.db")
+    api.set_client(api.GiosClient(base=fake_gios.base))
+    try:
+        assert cli.main(["--db", path, "sync-stations"]) == 0
+        assert cli.main(["--db", path, "sync-index", "--station", "3"]) == 0
+    finally:
+        api.set_client(None)
+    conn = sqlite3.connect(path)
+    categories = repository.station_categories(conn)
+    assert categories == {3: "Dobry"}
+    items = [(s.id, s.name, s.city_name, s.lat, s.lon) for s in repository.get_stations(conn)]
+    colors = {f["properties"]["id"]: f["properties"]["color"]
+              for f in mapmod.stations_geojson(items, categories)["features"]}
+    assert colors == {1: mapmod.NO_INDEX_COLOR, 2: mapmod.NO_INDEX_COLOR, 3: mapmod.AQ_COLORS["Dobry"]}
+
+
+def test_parse_air_index_accepts_both_key_spellings():
+    payload = {"AqIndex": [{"Wartość indeksu dla wskaźnika O3": 3,
+                            "Nazwa kategorii indeksu dla wskaźnika O3": "Dostateczny",
+                            "Data wykonania obliczeń indeksu dla wskaźnika O3": "2025-08-20 12:20:00"}]}
+    [idx] = services.parse_air_index(payload, 7)
+    assert (idx.station_id, idx.param, idx.value, idx.category) == (7, "O3", 3.0, "Dostateczny")
+    assert idx.calc_date == datetime(2025, 8, 20, 12, 20)
+    assert services.parse_air_index({"AqIndex": []}, 7) == []
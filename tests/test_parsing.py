@@ -0,0 +1,26 @@
+from datetime import datetime
+import numpy as np
+from polair import db, parsing, services
+
+
+def test_parse_ts_fast_path_and_fallback():
+    assert parsing.parse_dt("2025-08-20 12:30:05") == datetime(2025, 8, 20, 12, 30, 5)
+    assert parsing.parse_dt("2025-08-20T12:30:05") == datetime(2025, 8, 20, 12, 30, 5)
+    assert parsing.parse_dt("2025-08-20 12:30") == datetime(2025, 8, 20, 12, 30)
+    assert parsing.parse_ts("2025-08-20 12:30:05") == db.to_epoch(datetime(2025, 8, 20, 12, 30, 5))
+    for bad in ("2025-02-30 01:00:00", "2025-08-20 24:00:00", "2025-08-20 1a:00:00", "", None, 123):
+        assert parsing.parse_ts(bad) is None and parsing.parse_dt(bad) is None
+
+
+def test_all_payload_shapes():
+    rows = [{"Data": "2025-08-20 01:00:00", "Wartość": 12.5}, {"Data": "2025-08-20 02:00:00", "Wartość": None},
+            {"Data": "zła", "Wartość": 1}, {"Data": "2025-08-20 03:00:00", "Wartość": "7"}]
+    for shape in (rows, {"Lista danych pomiarowych": rows}, {"Lista archiwalnych wyników pomiarów": rows}):
+        ms = services.parse_data_rows(shape, 5)
+        assert [(m.dt.hour, m.value, m.sensor_id) for m in ms] == [(1, 12.5, 5), (3, 7.0, 5)]
+    legacy = [{"id": 9, "key": "PM10", "values": [{"date": "2025-08-20 04:00:00", "value": 3}]}]
+    assert [(m.sensor_id, m.dt, m.value) for m in services.parse_measurements(legacy)] == [(9, datetime(2025, 8, 20, 4), 3.0)]
+
+    ts, vs = parsing.parse_arrays(rows, keep_missing=True)
+    assert ts.dtype == np.int64 and len(ts) == 3 and np.isnan(vs[1])
+    assert parsing.parse_series(legacy).sensor_id == 9
@@ -0,0 +1,21 @@
+import pytest
+from polair import api, db, pipeline, repository, services
+from polair.services import Sensor
+from tests.fake_gios import STATIONS
+
+
+@pytest.mark.parametrize("parse_workers", [0, 2])
+def test_backfill_many_writes_all_sensors(fake_gios, tmp_path, parse_workers):
+    conn = db.get_conn(str(tmp_path / "p.db"))
+    db.init_db(conn)
+    repository.upsert_stations(conn, [services.parse_station(STATIONS[0])])
+    repository.upsert_sensors(conn, [Sensor(id=s, station_id=1, param_code="PM10", param_name="pył") for s in (10, 11)])
+    client = api.GiosClient(base=fake_gios.base, cache=None)
+    m = pipeline.backfill_many(conn, [10, 11], "2025-08-01", "2025-08-05", io_workers=4,
+                               parse_workers=parse_workers, page_size=20, chunk_days=2, client=client)
+    counts = dict(conn.execute("SELECT sensor_id, COUNT(*) FROM measurements GROUP BY sensor_id"))
+    assert counts == {10: 4 * 24 + 1, 11: 4 * 24 + 1}
+    # strony z obu okien (po 49 wierszy -> 3 strony) dla 2 czujników
+    assert m.download.tasks == m.parse.tasks == 2 * 2 * 3
+    assert m.write.rows == 2 * 2 * 49 and m.download.bytes > 0
+    assert "pobieranie" in m.report()
@@ -0,0 +1,51 @@
+import time
+import pytest
+from polair import api
+from polair.ratelimit import RateLimiter, parse_retry_after
+
+
+def test_token_bucket_spaces_requests():
+    limiter = RateLimiter(rate=20, max_concurrency=4, burst=1)
+    t0 = time.perf_counter()
+    for _ in range(6):
+        with limiter.slot():
+            pass
+    # pierwszy token od ręki, kolejne co 50 ms
+    assert time.perf_counter() - t0 >= 0.24
+    assert limiter.stats()["requests"] == 6
+
+
+def test_rate_adapts_down_and_up():
+    limiter = RateLimiter(rate=8, min_rate=1)
+    limiter.on_throttle()
+    limiter.on_error()
+    assert limiter.rate == 2
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == 8
+    stats = limiter.stats()
+    assert stats["throttled"] == 1 and stats["errors"] == 1 and stats["successes"] == 100
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("nonsense") is None
+
+
+def test_client_honors_429_and_retries(fake_gios, fast_limiter):
+    fake_gios.failures["/station/sensors/1"] = [(429, {"Retry-After": "0"}), (503, {"Retry-After": "0"})]
+    client = api.GiosClient(base=fake_gios.base)
+    assert len(client.get_sensors(1)) == 2
+    stats = fast_limiter.stats()
+    assert stats["throttled"] == 2
+    assert len(fake_gios.requests) == 3
+
+
+def test_client_does_not_retry_plain_4xx(fake_gios):
+    client = api.GiosClient(base=fake_gios.base)
+    fake_gios.failures["/aqindex/"] = [(404, {})]
+    with pytest.raises(Exception):
+        client.get_air_index(1)
+    assert len(fake_gios.requests) == 1
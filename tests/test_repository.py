@@ -0,0 +1,273 @@
+import pytest
+import socket
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from polair import db, repository
+from polair.models import Measurement, Sensor, Station
+
+
+def _conn(tmp_path):
+    conn = db.get_conn(str(tmp_path / "r.db"))
+    db.init_db(conn)
+    repository.upsert_stations(conn, [Station(1, "X", "x", 52.0, 21.0, None, None, None, None, None, None)])
+    repository.upsert_sensors(conn, [Sensor(10, 1, "pył", "PM10", "PM10", 3)])
+    return conn
+
+
+def test_upsert_measurements_streams_generator_in_batches(tmp_path):
+    conn = _conn(tmp_path)
+    start = datetime(2024, 1, 1)
+    gen = (Measurement(10, start + timedelta(hours=h), float(h)) for h in range(2500))
+    assert repository.upsert_measurements(conn, gen, batch_size=1000) == 2500
+    assert not conn.in_transaction
+    # ponowny zapis nadpisuje wartości zamiast dublować wiersze
+    repository.upsert_measurements(conn, [Measurement(10, start, 99.0)])
+    other = sqlite3.connect(str(tmp_path / "r.db"))
+    assert other.execute("SELECT COUNT(*), MAX(value) FROM measurements").fetchone() == (2500, 2499.0)
+    assert other.execute("SELECT value FROM measurements WHERE dt=?", (db.to_epoch(start),)).fetchone() == (99.0,)
+
+
+def test_executemany_joins_callers_transaction(tmp_path):
+    conn = _conn(tmp_path)
+    conn.execute("INSERT INTO sync_state (sensor_id, last_new) VALUES (10, 1)")
+    assert conn.in_transaction
+    repository.upsert_measurements(conn, (Measurement(10, datetime(2024, 1, 1, h), 1.0) for h in range(5)),
+                                   batch_size=2)
+    assert conn.in_transaction              # bez commitu za plecami wywołującego
+    conn.rollback()
+    assert conn.execute("SELECT (SELECT COUNT(*) FROM sync_state), (SELECT COUNT(*) FROM measurements)"
+                        ).fetchone() == (0, 0)
+
+
+def test_bulk_load_restores_pragmas(tmp_path):
+    conn = _conn(tmp_path)
+    before = [conn.execute(f"PRAGMA {p}").fetchone()[0] for p in ("synchronous", "cache_size", "temp_store")]
+    with db.bulk_load(conn, cache_mb=32):
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 0
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -32 * 1024
+        repository.upsert_measurements(conn, [Measurement(10, datetime(2024, 1, 1), 1.0)])
+    after = [conn.execute(f"PRAGMA {p}").fetchone()[0] for p in ("synchronous", "cache_size", "temp_store")]
+    assert after == before
+
+
+def _rollups(conn):
+    return [conn.execute(f"SELECT * FROM {t} ORDER BY sensor_id, bucket").fetchall() for t in db.ROLLUPS.values()]
+
+
+def test_bulk_load_defers_rollups_and_rebuilds_touched_buckets(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "REBUILD_BATCH", 2)     # kilka porcji przeliczenia
+    conn = _conn(tmp_path)
+    repository.upsert_sensors(conn, [Sensor(11, 1, "pył", "PM2.5", "PM2.5", 4)])
+    start = datetime(2024, 1, 30)
+    repository.upsert_measurements(conn, (Measurement(s, start + timedelta(hours=h), float(h % 17))
+                                          for s in (10, 11) for h in range(24 * 5)))
+    before = _rollups(conn)
+    with db.bulk_load(conn):
+        # nowe dni, nadpisanie wartości w starym dniu i usunięcie pomiaru w innym miesiącu
+        repository.upsert_measurements(conn, (Measurement(10, start + timedelta(hours=h), float(h % 23) - 3)
+                                              for h in range(24 * 4, 24 * 9)))
+        repository.upsert_measurements(conn, [Measurement(10, start + timedelta(hours=5), 100.0)])
+        conn.execute("DELETE FROM measurements WHERE sensor_id = 10 AND dt = ?",
+                     (db.to_epoch(start + timedelta(days=3, hours=2)),))
+        conn.commit()
+        assert _rollups(conn) == before
+        assert conn.execute("SELECT COUNT(*) FROM rollup_dirty").fetchone()[0] == 1 + 5 + 1
+    assert conn.execute("SELECT (SELECT COUNT(*) FROM rollup_dirty), (SELECT COUNT(*) FROM bulk_load_state)"
+                        ).fetchone() == (0, 0)
+    incremental = _rollups(conn)
+    assert incremental != before
+    db.rebuild_rollups(conn)
+    assert _rollups(conn) == incremental
+
+
+def test_other_connection_writes_during_bulk_load_reach_rollups(tmp_path):
+    conn = _conn(tmp_path)
+    repository.upsert_sensors(conn, [Sensor(11, 1, "pył", "PM2.5", "PM2.5", 4)])
+    start = datetime(2024, 3, 1)
+    other = db.get_conn(str(tmp_path / "r.db"))
+    with db.bulk_load(conn):
+        repository.upsert_measurements(conn, (Measurement(10, start + timedelta(hours=h), 1.0) for h in range(48)))
+        repository.upsert_measurements(other, (Measurement(11, start + timedelta(hours=h), 2.0) for h in range(2160)))
+        db.init_db(other)           # trwające ładowanie to nie przerwane – nic nie przelicza
+        assert other.execute("SELECT COUNT(*) FROM bulk_load_state").fetchone()[0] == 1
+    # zapis już po ładowaniu – znów przyrostowo
+    repository.upsert_measurements(other, [Measurement(11, start + timedelta(days=200), 5.0)])
+    assert repository.range_stats(other, 11)["count"] == 2161
+    assert repository.range_stats(other, 10)["count"] == 48
+    incremental = _rollups(conn)
+    db.rebuild_rollups(conn)
+    assert _rollups(conn) == incremental
+
+
+def test_init_db_recovers_interrupted_bulk_load(tmp_path):
+    conn = _conn(tmp_path)
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    conn.execute("INSERT INTO bulk_load_state (host, pid, started_at) VALUES (?, ?, '2024-01-01T00:00:00')",
+                 (socket.gethostname(), dead.pid))
+    conn.commit()
+    repository.upsert_measurements(conn, [Measurement(10, datetime(2024, 1, 1), 4.0)])
+    assert conn.execute("SELECT COUNT(*) FROM rollup_daily").fetchone()[0] == 0
+    db.init_db(conn)
+    assert conn.execute("SELECT n, sum FROM rollup_daily").fetchall() == [(1, 4.0)]
+    assert conn.execute("SELECT COUNT(*) FROM bulk_load_state").fetchone()[0] == 0
+
+
+def test_init_db_migrates_text_timestamps(tmp_path):
+    path = str(tmp_path / "old.db")
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE measurements (sensor_id INTEGER NOT NULL, dt TEXT NOT NULL, value REAL, "
+                "PRIMARY KEY (sensor_id, dt))")
+    old.executemany("INSERT INTO measurements VALUES (?, ?, ?)",
+                    [(10, "2024-01-01T00:00:00", 1.5), (10, "2024-01-01 01:00:00", None), (10, "zła data", 3.0)])
+    old.commit()
+    old.close()
+
+    conn = db.get_conn(path)
+    db.init_db(conn)
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name='measurements'").fetchone()[0]
+    assert "WITHOUT ROWID" in sql
+    assert conn.execute("SELECT typeof(dt) FROM measurements").fetchall() == [("integer",), ("integer",)]
+    ms = repository.get_measurements(conn, 10, since_iso="2024-01-01T01:00:00")
+    assert [(m.dt, m.value) for m in ms] == [(datetime(2024, 1, 1, 1), None)]
+    assert repository.latest_dt(conn, 10) == datetime(2024, 1, 1, 1)
+    assert not db.migrate_measurements(conn)
+
+
+def test_epoch_roundtrip():
+    dt = datetime(2025, 3, 30, 2, 0)
+    assert db.from_epoch(db.to_epoch(dt)) == dt
+    assert db.to_epoch("2025-03-30T02:00:00") == db.to_epoch(dt)
+    assert db.to_epoch(datetime.fromisoformat("2025-03-30T03:00:00+01:00")) == db.to_epoch(dt)
+
+
+def test_init_db_records_schema_version_once(tmp_path):
+    conn = _conn(tmp_path)
+    assert db.schema_version(conn) == db.SCHEMA_VERSION
+    db.init_db(conn)
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(db.MIGRATIONS)
+    plan = " ".join(r[-1] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM sensors WHERE station_id=? ORDER BY param_code", (1,)))
+    assert "ix_sensors_station" in plan
+
+
+def test_upsert_air_index(tmp_path):
+    from polair.models import AirIndex
+    conn = _conn(tmp_path)
+    calc = datetime(2025, 1, 1, 12)
+    repository.upsert_air_index(conn, [AirIndex(1, "PM10", 2.0, "Dobry", calc), AirIndex(1, "NO2", None, None, None)])
+    repository.upsert_air_index(conn, [AirIndex(1, "PM10", 4.0, "Umiarkowany", calc)])
+    rows = conn.execute("SELECT param, value, category FROM air_index ORDER BY param").fetchall()
+    assert rows == [("NO2", None, None), ("PM10", 4.0, "Umiarkowany")]
+
+
+def _reference_stats(rows, start, end):
+    sel = [(dt, v) for dt, v in rows if start <= dt < end and v is not None]
+    ts = [db.to_epoch(dt) / 3600.0 for dt, _ in sel]
+    vs = [v for _, v in sel]
+    n = len(vs)
+    tm, vm = sum(ts) / n, sum(vs) / n
+    slope = sum((t - tm) * (v - vm) for t, v in zip(ts, vs)) / sum((t - tm) ** 2 for t in ts)
+    lo = min(sel, key=lambda r: (r[1], r[0]))
+    hi = min(sel, key=lambda r: (-r[1], r[0]))
+    return {"count": n, "min": lo[1], "min_at": lo[0], "max": hi[1], "max_at": hi[0], "avg": vm, "trend_slope": slope}
+
+
+def test_range_stats_combines_rollups_with_raw_edges(tmp_path):
+    conn = _conn(tmp_path)
+    start = datetime(2024, 1, 20)
+    rows = [(start + timedelta(hours=h), None if h % 37 == 0 else float((h * 7919) % 113) + h / 100)
+            for h in range(24 * 75)]
+    repository.upsert_measurements(conn, (Measurement(10, dt, v) for dt, v in rows))
+    # korekta i usunięcie wartości – triggery muszą przeliczyć kubełki
+    rows[100] = (rows[100][0], 500.0)
+    rows[200] = (rows[200][0], None)
+    repository.upsert_measurements(conn, [Measurement(10, rows[100][0], 500.0), Measurement(10, rows[200][0], None)])
+
+    for a, b in [(datetime(2024, 1, 20, 5, 30), datetime(2024, 3, 30, 17)),   # miesiące + dni + brzegi
+                 (datetime(2024, 1, 25), datetime(2024, 2, 3)),                 # same dni
+                 (datetime(2024, 2, 1, 3), datetime(2024, 2, 1, 20))]:          # w obrębie dnia
+        got, want = repository.range_stats(conn, 10, a, b), _reference_stats(rows, a, b)
+        for k, v in want.items():
+            assert got[k] == (v if isinstance(v, datetime) else pytest.approx(v, rel=1e-6)), k
+    assert repository.range_stats(conn, 10)["count"] == sum(v is not None for _, v in rows)
+
+    conn.execute("DELETE FROM measurements WHERE dt=?", (db.to_epoch(rows[100][0]),))
+    conn.commit()
+    assert repository.range_stats(conn, 10)["max"] < 500.0
+    daily = conn.execute("SELECT SUM(n) FROM rollup_daily").fetchone()[0]
+    monthly = conn.execute("SELECT SUM(n) FROM rollup_monthly").fetchone()[0]
+    assert daily == monthly == sum(v is not None for _, v in rows) - 1
+
+
+def test_text_values_do_not_enter_stats(tmp_path):
+    conn = _conn(tmp_path)
+    start = datetime(2024, 3, 1)
+    ms = [Measurement(10, start + timedelta(hours=h), float(h)) for h in range(5)]
+    repository.upsert_measurements(conn, ms + [Measurement(10, start + timedelta(hours=5), "")])
+    assert conn.execute("SELECT value FROM measurements WHERE dt=?",
+                        (db.to_epoch(start + timedelta(hours=5)),)).fetchone()[0] is None
+    # tekst zapisany z pominięciem repozytorium też nie trafia do agregatów
+    with conn:
+        conn.execute("INSERT INTO measurements VALUES (10, ?, '')", (db.to_epoch(start + timedelta(hours=6)),))
+    st = repository.range_stats(conn, 10)
+    assert (st["count"], st["max"], st["avg"]) == (5, 4.0, pytest.approx(2.0))
+    assert conn.execute("SELECT n, max FROM rollup_monthly").fetchall() == [(5, 4.0)]
+
+
+def test_migration_clears_text_values(tmp_path):
+    conn = _conn(tmp_path)
+    with conn:
+        conn.execute("INSERT INTO measurements VALUES (10, ?, '')", (db.to_epoch(datetime(2024, 3, 1)),))
+        conn.execute("DELETE FROM schema_version WHERE version >= 6")
+    db.init_db(conn)
+    assert conn.execute("SELECT value FROM measurements").fetchall() == [(None,)]
+    assert db.schema_version(conn) == db.SCHEMA_VERSION
+
+
+def test_sql_aggregates_match_python(tmp_path):
+    import numpy as np
+    from polair import services
+    conn = _conn(tmp_path)
+    start = datetime(2024, 5, 1)
+    ms = [Measurement(10, start + timedelta(hours=h), float((h * 37) % 61)) for h in range(500)]
+    repository.upsert_measurements(conn, ms)
+    a, b = start + timedelta(hours=10), start + timedelta(hours=400)
+    window = [m for m in ms if a <= m.dt < b]
+
+    got = repository.aggregate_stats(conn, 10, a, b)
+    ref = services.simple_stats(window)   # okres 1 h -> nachylenie na pomiar == na godzinę
+    for k in ("min", "min_at", "max", "max_at"):
+        assert got[k] == ref[k]
+    assert got["avg"] == pytest.approx(ref["avg"])
+    assert got["trend_slope"] == pytest.approx(ref["trend_slope"])
+    assert got["count"] == len(window)
+
+    qs = (0.0, 0.25, 0.5, 0.9, 1.0)
+    want = np.percentile([m.value for m in window], [q * 100 for q in qs])
+    assert list(repository.percentiles(conn, 10, qs, a, b).values()) == pytest.approx(list(want))
+    stats = services.sensor_stats(conn, 10, a, b)
+    assert stats["avg"] == pytest.approx(ref["avg"]) and set(stats["percentiles"]) == {0.5, 0.9, 0.98}
+    assert repository.percentiles(conn, 99)[0.5] is None
+
+
+def test_streaming_readers(tmp_path):
+    conn = _conn(tmp_path)
+    repository.upsert_sensors(conn, [Sensor(11, 1, "pył", "PM2.5", "PM2.5", 69), Sensor(12, 1, "ozon", "O3", "O3", 5)])
+    start = datetime(2024, 1, 1)
+    repository.upsert_measurements(conn, (Measurement(sid, start + timedelta(hours=h), float(h))
+                                          for sid in (12, 10, 11) for h in range(25)))
+
+    it = repository.iter_measurements(conn, 10, start + timedelta(hours=5), start + timedelta(hours=20), batch_size=4)
+    assert [m.value for m in it] == [float(h) for h in range(5, 20)]
+    cols = list(repository.iter_measurements(conn, 10, batch_size=10, mode="columns"))
+    assert [len(c[1]) for c in cols] == [10, 10, 5]
+    assert db.from_epoch(cols[0][1][0]) == start
+
+    rows = list(repository.iter_range(conn, [12, 10], end=start + timedelta(hours=2), batch_size=3, mode="tuples"))
+    assert [(sid, db.from_epoch(dt).hour) for sid, dt, _ in rows] == [(10, 0), (10, 1), (12, 0), (12, 1)]
+    assert sum(1 for _ in repository.iter_range(conn, batch_size=7)) == 75
+    assert [s.id for s in repository.iter_sensors_by_station(conn, 1, batch_size=1)] == [12, 10, 11]
+    assert next(repository.iter_stations(conn, tuples=True))[0] == 1
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from polair import api, db, repository, scheduler, services, sync
+from polair.services import Sensor
+from tests.fake_gios import STATIONS
+
+
+def make_db(tmp_path):
+    conn = db.get_conn(str(tmp_path / "t.db"))
+    db.init_db(conn)
+    repository.upsert_stations(conn, [services.parse_station(STATIONS[0])])
+    repository.upsert_sensors(conn, [Sensor(id=s, station_id=1, param_code="PM10", param_name="pył") for s in (10, 11)])
+    return conn
+
+
+def test_learn_period():
+    t0 = datetime(2025, 8, 1)
+    assert scheduler.learn_period([t0 + timedelta(hours=h) for h in range(10)]) == 3600
+    assert scheduler.learn_period([t0 + timedelta(days=d) for d in range(5)]) == 86400
+    assert scheduler.learn_period([]) == 3600
+
+
+def test_polls_after_expected_publication(fake_gios, tmp_path):
+    conn = make_db(tmp_path)
+    sched = scheduler.Scheduler(conn, client=api.GiosClient(base=fake_gios.base))
+    now = datetime(2025, 8, 20, 12, 25)
+    sched.load([10, 11], now)
+    assert sched.due(now) == [10, 11]
+
+    results = sched.run_pending(now)
+    assert all(r.new > 0 for r in results)
+    plan = sched.plans[10]
+    # najnowszy pomiar 12:00 -> kolejny 13:00 + wyuczone opóźnienie + przesunięcie czujnika
+    assert datetime(2025, 8, 20, 13, 0) < plan.next_due < datetime(2025, 8, 20, 14, 0)
+    assert sched.due(now + timedelta(minutes=5)) == []
+    # plan przetrwał restart
+    again = scheduler.Scheduler(conn)
+    again.load([10, 11], now)
+    assert again.plans[10].next_due == plan.next_due
+
+
+def test_backoff_and_dead_sensors():
+    sched = scheduler.Scheduler(conn=None)
+    now = datetime(2025, 8, 20, 12, 30)
+    plan = scheduler.SensorPlan(sensor_id=1)
+    late = sync.SyncResult(sensor_id=1, high_water=datetime(2025, 8, 20, 11, 0))
+    sched.update(plan, late, now)
+    first = plan.next_due - now
+    sched.update(plan, late, now)
+    assert plan.next_due - now == 2 * first
+
+    dead = scheduler.SensorPlan(sensor_id=2)
+    sched.update(dead, sync.SyncResult(sensor_id=2, high_water=now - timedelta(days=10)), now)
+    assert plan.misses == 2
+    assert dead.next_due - now == timedelta(seconds=scheduler.DEAD_INTERVAL)
+
+
+def test_lag_is_learned_from_observations():
+    sched = scheduler.Scheduler(conn=None, default_lag=20 * 60)
+    plan = scheduler.SensorPlan(sensor_id=1, lag_s=20 * 60)
+    for h in range(20):
+        hwm = datetime(2025, 8, 20, 0, 0) + timedelta(hours=h)
+        sched.update(plan, sync.SyncResult(sensor_id=1, new=1, high_water=hwm), hwm + timedelta(minutes=40))
+    assert abs(plan.lag_s - 40 * 60) < 60
+
+
+def test_run_forever_refreshes_and_sleeps_until_next_due(fake_gios, tmp_path, monkeypatch):
+    conn = make_db(tmp_path)
+    sched = scheduler.Scheduler(conn, client=api.GiosClient(base=fake_gios.base))
+    refreshed, sleeps = [], []
+
+    class Stop(Exception):
+        pass
+
+    def sleep(s):
+        sleeps.append(s)
+        if len(sleeps) == 2:
+            raise Stop
+
+    monkeypatch.setattr(scheduler.time, "sleep", sleep)
+    try:
+        sched.run_forever(refresh=lambda: refreshed.append(1) or [10, 11], refresh_every=timedelta(hours=1))
+    except Stop:
+        pass
+    assert refreshed == [1]                  # drugi przebieg przed upływem refresh_every
+    assert set(sched.plans) == {10, 11} and all(p.next_due for p in sched.plans.values())
+    assert all(1.0 <= s <= 300.0 for s in sleeps)
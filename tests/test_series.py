@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+from polair import db, repository, services
+from polair.models import Measurement, Sensor, Station
+from polair.series import MeasurementSeries
+
+START = datetime(2025, 8, 20)
+
+
+def test_from_records_normalizes_and_sorts():
+    raw = [
+        {"Data": "2025-08-20 02:00:00", "Wartość": 3.0},
+        SimpleNamespace(sensor_id=7, dt=START, value=1.0),
+        {"dt": "2025-08-20T01:00:00", "value": None},
+        {"Data": "zła data", "Wartość": 9.0},
+    ]
+    s = MeasurementSeries.from_records(raw)
+    assert s.sensor_id == 7 and len(s) == 3
+    assert s.datetimes() == [START, START + timedelta(hours=1), START + timedelta(hours=2)]
+    assert np.isnan(s.values[1]) and len(s.dropna()) == 2
+    assert s.to_measurements()[1].value is None
+
+
+def test_between_is_binary_search_view():
+    ts = np.arange(1000, dtype=np.int64) * 3600 + db.to_epoch(START)
+    s = MeasurementSeries(ts, np.arange(1000, dtype=np.float64), sensor_id=1)
+    part = s.between(START + timedelta(hours=10, minutes=30), START + timedelta(hours=20))
+    assert part.values.tolist() == [float(h) for h in range(11, 20)]
+    assert np.shares_memory(part.values, s.values)
+    assert len(s.between(end=START)) == 0 and len(s.between(start=START)) == 1000
+
+
+def test_producers_and_stats_agree(tmp_path):
+    rows = [{"Data": f"2025-08-20 {h:02d}:00:00", "Wartość": float((h * 5) % 7)} for h in range(24)]
+    s = services.parse_series({"Lista danych pomiarowych": rows}, 10)
+    ms = services.parse_data_rows(rows, 10)
+    assert services.simple_stats(s) == services.simple_stats(ms)
+
+    conn = db.get_conn(str(tmp_path / "s.db"))
+    db.init_db(conn)
+    repository.upsert_stations(conn, [Station(1, "X", "x", 52.0, 21.0, None, None, None, None, None, None)])
+    repository.upsert_sensors(conn, [Sensor(10, 1, "pył", "PM10", "PM10", 3)])
+    repository.upsert_measurements(conn, ms)
+    from_db = repository.get_series(conn, 10, batch_size=5)
+    assert from_db.ts.tolist() == s.ts.tolist() and from_db.values.tolist() == s.values.tolist()
+    legacy = services.parse_series([{"key": "PM10", "values": [{"date": "2025-08-20 01:00:00", "value": 2}]}], 10)
+    assert legacy.datetimes() == [START + timedelta(hours=1)]
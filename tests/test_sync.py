@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from polair import api, db, repository, services, sync
+from polair.services import Sensor
+from tests.fake_gios import STATIONS
+
+
+def make_db(tmp_path):
+    conn = db.get_conn(str(tmp_path / "t.db"))
+    db.init_db(conn)
+    repository.upsert_stations(conn, [services.parse_station(STATIONS[0])])
+    repository.upsert_sensors(conn, [Sensor(id=s, station_id=1, param_code="PM10", param_name="pył") for s in (10, 11)])
+    return conn
+
+
+def test_incremental_sync_fetches_only_gap(fake_gios, tmp_path):
+    conn = make_db(tmp_path)
+    client = api.GiosClient(base=fake_gios.base)
+    now = datetime(2025, 8, 20, 12, 0)
+
+    first = sync.sync_sensor(conn, 10, now=now, client=client)
+    assert first.new == sync.INITIAL_DAYS * 24 + 1
+    assert first.high_water == now
+
+    later = now + timedelta(hours=2)
+    second = sync.sync_sensor(conn, 10, now=later, client=client)
+    # tylko 2 nowe godziny; zakładka korekt daje wiersze bez zmian, które nie są zapisywane
+    assert (second.new, second.updated) == (2, 0)
+    assert second.unchanged == sync.REVISE_HOURS + 1
+    assert repository.get_sync_state(conn, 10)["high_water"] == later
+
+
+def test_sync_detects_revised_values(fake_gios, tmp_path):
+    conn = make_db(tmp_path)
+    client = api.GiosClient(base=fake_gios.base)
+    now = datetime(2025, 8, 20, 12, 0)
+    sync.sync_sensor(conn, 10, now=now, client=client)
+    conn.execute("UPDATE measurements SET value = -1")
+    conn.commit()
+
+    res = sync.sync_sensor(conn, 10, now=now, client=client)
+    assert (res.new, res.updated) == (0, sync.REVISE_HOURS + 1)
+
+
+def test_sync_many_sensors(fake_gios, tmp_path):
+    conn = make_db(tmp_path)
+    client = api.GiosClient(base=fake_gios.base)
+    results = sync.sync_sensors(conn, [10, 11], now=datetime(2025, 8, 20, 12, 0), client=client)
+    assert sorted(r.sensor_id for r in results) == [10, 11]
+    assert all(r.error is None and r.new > 0 for r in results)